@@ -0,0 +1,118 @@
+"""
+语料学习的协议模板过滤测试
+用合成的历史协议（同一套条款，不同的排版换行和案件信息）学习模板签名集，
+再过滤新的协议：检查过滤后的文本相比只用关键词规则明显缩小，且案件信息行全部保留
+
+用法:
+  python benchmarks/bench_boilerplate_filter.py [--documents 30] [--rounds 5]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from boilerplate_filter import BoilerplateLearner
+from pdf_text_extractor import PDFTextExtractor
+
+# 学习签名集后过滤文本至少缩小到关键词规则结果的比例
+MAX_SIZE_RATIO = 0.5
+
+CLAUSES = [
+    '乙方向甲方提供客户服务电话、网上营业厅、手机营业厅等渠道，以便甲方了解乙方各项服务和资费信息。',
+    '甲方应当按照约定的时间和方式及时、足额交纳通信费用，逾期未交纳的乙方有权暂停提供服务。',
+    '甲方申请携号转网服务的号码应处于正常使用状态，并与携出方结清已出账的电信费用。',
+    '乙方应采取必要的技术措施保护甲方的个人信息安全，未经甲方同意不得向第三方提供。',
+    '预付费产品在约定期限内未激活的，乙方有权收回号码资源，甲方账户余额按规定退还。',
+    '甲方对交纳的通信费用有异议的，可在费用发生之日起五个月内向乙方申请查询。',
+    '因国家政策调整、监管要求变化导致协议无法继续履行的，双方均有权解除本协议。',
+    '甲方使用乙方提供的终端设备时应遵守使用说明，因甲方原因造成的损坏由甲方承担维修费用。',
+    '我们可能按照相关法律法规及监管政策的要求或经过您的授权从关联公司接收您的个人信息。',
+    '您了解并同意，我们可以通过技术手段对您的个人信息数据进行匿名化处理。',
+    '如您对本隐私政策有任何问题、投诉、意见或建议，您可前往当地营业厅或拨打客服热线联系我们。',
+    '家庭融合套餐中用户均默认充值或缴费至家庭融合套餐主账户中，由主账户统一扣费。',
+]
+
+NAMES = ['张伟', '王芳', '李娜', '刘洋', '陈静', '杨磊', '赵敏', '黄勇']
+
+
+def case_lines(rng: random.Random):
+    """一份协议中的案件信息行（号码、金额、日期、姓名、地址）"""
+    return [
+        f'客户名称：{rng.choice(NAMES)}',
+        f'办理号码：1{rng.choice("3589")}{rng.randint(100000000, 999999999)}',
+        f'套餐名称：5G畅爽冰激凌{rng.choice([129, 199, 239])}元套餐，月费{rng.choice([129, 199, 239])}.00元',
+        f'生效日期：2024-{rng.randint(1, 12):02d}-01，到期日期：2025-{rng.randint(1, 12):02d}-28',
+        f'装机地址：河南省郑州市金水区{rng.choice(["花园路", "经三路", "文化路"])}{rng.randint(1, 200)}号',
+    ]
+
+
+def build_document(rng: random.Random):
+    """合成一份协议：条款按不同宽度换行（模拟不同的PDF排版），编号和顺序随机，插入案件信息"""
+    width = rng.choice([28, 34, 40, 46])
+    lines = []
+    for number, clause in enumerate(rng.sample(CLAUSES, len(CLAUSES) - 2), 1):
+        text = f'{number}、{clause}'
+        lines.extend(text[i:i + width] for i in range(0, len(text), width))
+    cases = case_lines(rng)
+    for line in cases:
+        lines.insert(rng.randint(0, len(lines)), line)
+    return '\n'.join(lines), cases
+
+
+def timed(func, text: str, rounds: int) -> float:
+    """多次运行取最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='语料学习的协议模板过滤测试')
+    parser.add_argument('--documents', type=int, default=30, help='用于学习的历史协议份数')
+    parser.add_argument('--rounds', type=int, default=5, help='耗时测试的运行次数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    learner = BoilerplateLearner()
+    for _ in range(args.documents):
+        learner.add_text(build_document(rng)[0])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'boilerplate.npz')
+        learner.save(path)
+        keyword_only = PDFTextExtractor()
+        learned = PDFTextExtractor(boilerplate_path=path)
+
+        failed = False
+        text, cases = build_document(random.Random(args.documents + 1))
+        before = keyword_only._filter_template_content(text)
+        after = learned._filter_template_content(text)
+        ratio = len(after) / len(before)
+        print(f"签名集 {len(learned.boilerplate)}个片段；过滤后文本 {len(before)} -> {len(after)}字符（{ratio:.0%}）")
+        if ratio > MAX_SIZE_RATIO:
+            print(f"过滤后文本未缩小到关键词规则结果的 {MAX_SIZE_RATIO:.0%} 以内")
+            failed = True
+
+        kept = set(after.split('\n'))
+        missing = [line for line in cases if line not in kept]
+        if missing:
+            print(f"案件信息行被过滤: {missing}")
+            failed = True
+
+        print(f"过滤耗时: 关键词规则 {timed(keyword_only._filter_template_content, text, args.rounds):.2f}ms，"
+              f"加签名集 {timed(learned._filter_template_content, text, args.rounds):.2f}ms")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
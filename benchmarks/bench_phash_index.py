@@ -0,0 +1,86 @@
+"""
+感知哈希索引性能测试
+在10万条哈希的索引中检索，要求单次检索耗时低于1ms；
+同时检查重新压缩、轻微裁剪后的图片与原图的汉明距离
+
+用法:
+  python benchmarks/bench_phash_index.py [--entries 100000] [--image uploads/xxx.jpg]
+"""
+import argparse
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from phash_index import PerceptualHashIndex, dhash, dhash_bytes
+
+# 单次检索的耗时上限（毫秒）
+LOOKUP_BUDGET_MS = 1.0
+
+
+def bench_lookup(entries: int, rounds: int = 1000) -> float:
+    """构建索引并测量检索耗时，返回p99（毫秒）"""
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PerceptualHashIndex(tmp)
+        hashes = rng.integers(0, 2 ** 63, size=entries, dtype=np.uint64)
+        hashes.tofile(index.hash_path)
+        index.add(int(hashes[0]), "【操作指引】示例", "sample.png")
+
+        probes = rng.integers(0, 2 ** 63, size=rounds, dtype=np.uint64)
+        index.lookup(int(probes[0]))  # 预热（映射文件）
+
+        timings = []
+        for probe in probes:
+            start = time.perf_counter()
+            index.lookup(int(probe))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        match = index.lookup(int(hashes[0]) ^ 0b101)
+        print(f"索引条数: {index.size}")
+        print(f"检索耗时: p50 {np.percentile(timings, 50):.3f}ms，p99 {np.percentile(timings, 99):.3f}ms")
+        print(f"相差2位的哈希命中: {match is not None}（距离 {match['distance'] if match else '-'}）")
+        return float(np.percentile(timings, 99))
+
+
+def check_robustness(image_path: str):
+    """原图与重新压缩、裁剪、缩放后的dHash距离"""
+    data = Path(image_path).read_bytes()
+    original = dhash_bytes(data)
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert('RGB')
+        variants = {}
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=40)
+        variants['JPEG质量40'] = dhash_bytes(buffer.getvalue())
+        w, h = img.size
+        variants['四边各裁2%'] = dhash(img.crop((int(w * 0.02), int(h * 0.02), int(w * 0.98), int(h * 0.98))))
+        variants['缩小一半'] = dhash(img.resize((w // 2, h // 2)))
+    for name, value in variants.items():
+        print(f"{name}: 汉明距离 {bin(original ^ value).count('1')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='感知哈希索引性能测试')
+    parser.add_argument('--entries', type=int, default=100_000, help='索引条数')
+    parser.add_argument('--image', help='检查哈希稳定性使用的图片')
+    args = parser.parse_args()
+
+    p99 = bench_lookup(args.entries)
+    if args.image:
+        check_robustness(args.image)
+
+    if p99 > LOOKUP_BUDGET_MS:
+        print(f"检索p99 {p99:.3f}ms 超过 {LOOKUP_BUDGET_MS}ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
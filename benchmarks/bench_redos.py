@@ -0,0 +1,99 @@
+"""
+关键信息提取的对抗输入测试
+用容易使正则反复回溯的文本（长段连续汉字、重复的"省"、重复的"沃派"、逗号分隔的长数字串等）
+以及这些片段的随机拼接，测试各提取环节的耗时；任一环节每KB（UTF-8）耗时超过预算时失败
+
+用法:
+  python benchmarks/bench_redos.py [--kb 200] [--budget 10] [--seed 0]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from entity_scanner import clear_scan_cache, scan
+from page_relevance import PageRelevanceScorer
+from pdf_text_extractor import PDFTextExtractor
+from three_dimension_validator import ImageInfoExtractor
+
+# 每KB文本的耗时预算（毫秒），线性时间的实现远低于该值，平方时间的实现在200KB时超出数百倍
+DEFAULT_BUDGET_MS = 10.0
+
+# 对抗片段：每个都会让对应的原正则在每个起点扫描到片段末尾
+UNITS = {
+    '连续汉字': '中国联通客户服务协议条款',
+    '重复省': '省',
+    '省省市': '河南省',
+    '重复沃派': '沃派',
+    '逗号数字': '1,',
+    '小数点数字': '1.',
+    '长数字': '1',
+    '数字空格': '1 ',
+    '日期片段': '2024-1',
+    '时间片段': '12:3',
+}
+
+FUZZ_PIECES = list(UNITS.values()) + ['套餐', '资费', '业务', '市', '区', '元', '¥', '\n', '，', '13800138000']
+
+
+def adversarial_texts(size_kb: int, seed: int):
+    """各对抗片段重复到指定大小，另加随机拼接的混合文本"""
+    size = size_kb * 1024
+    for name, unit in UNITS.items():
+        yield name, unit * (size // len(unit.encode('utf-8')))
+
+    rng = random.Random(seed)
+    parts, length = [], 0
+    while length < size:
+        piece = rng.choice(FUZZ_PIECES) * rng.randint(1, 200)
+        parts.append(piece)
+        length += len(piece.encode('utf-8'))
+    yield '随机拼接', ''.join(parts)
+
+
+def extractors():
+    """被测的提取环节（名称, 函数）；关键信息扫描有进程内缓存，每次调用前清空"""
+    pdf_extractor = PDFTextExtractor()
+    image_extractor = ImageInfoExtractor(None)
+    scorer = PageRelevanceScorer()
+    return [
+        ('关键信息扫描', lambda text: scan(text).classify_phones()),
+        ('PDF关键信息', pdf_extractor._extract_key_information),
+        ('PDF模板过滤', pdf_extractor._filter_template_content),
+        ('图片关键信息', lambda text: image_extractor._extract_key_info(text, 1, '1-附件.jpg')),
+        ('页面相关性评分', scorer.score_text),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='关键信息提取的对抗输入测试')
+    parser.add_argument('--kb', type=int, default=200, help='每段对抗文本的大小（KB）')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help='每KB耗时预算（毫秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机拼接文本的种子')
+    args = parser.parse_args()
+
+    failures = []
+    for text_name, text in adversarial_texts(args.kb, args.seed):
+        size_kb = len(text.encode('utf-8')) / 1024
+        timings = []
+        for name, func in extractors():
+            clear_scan_cache()
+            start = time.perf_counter()
+            func(text)
+            per_kb = (time.perf_counter() - start) * 1000 / size_kb
+            timings.append(f"{name} {per_kb:.2f}")
+            if per_kb > args.budget:
+                failures.append(f"{text_name}/{name}: {per_kb:.2f}ms/KB")
+        print(f"{text_name}（{size_kb:.0f}KB，ms/KB）: " + '，'.join(timings))
+
+    if failures:
+        print(f"超出每KB {args.budget}ms 的预算: " + '；'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
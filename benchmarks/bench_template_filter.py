@@ -0,0 +1,148 @@
+"""
+PDF协议模板过滤性能测试
+用合成的多页协议文本比较关键词匹配器（get_matcher 按关键词数量选择自动机或子串查找）
+与逐个关键词子串查找（原实现）的过滤耗时，检查两者的过滤结果一致，
+默认关键词数量下不慢于原实现，关键词数量增加到数十倍时耗时基本不变
+
+用法:
+  python benchmarks/bench_template_filter.py [--pages 50] [--rounds 5]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from keyword_matcher import KeywordMatcher
+from pdf_text_extractor import PDFTextExtractor
+
+# 关键词数量增加到 KEYWORD_SCALE 倍时，过滤耗时允许的最大增幅
+MAX_SCALING_RATIO = 2.0
+KEYWORD_SCALE = 50
+
+# 默认关键词数量下，过滤耗时相对原实现允许的最大比值（留出计时波动的余量）
+MAX_DEFAULT_RATIO = 1.2
+
+CLAUSE_LINES = [
+    '甲方应按照本协议约定向乙方提供通信服务，双方约定的其他事项以书面形式补充。',
+    '因不可抗力导致本协议无法履行的，双方互不承担违约责任。',
+    '本协议自双方签字盖章之日起生效，协议终止后保密条款继续有效。',
+    '乙方承诺遵守国家有关法律法规，不利用通信资源从事违法活动。',
+    '争议解决：协商不成的，任何一方均可向甲方所在地人民法院提起诉讼。',
+    '通知与送达：一方变更通讯地址的，应及时书面告知另一方。',
+    '以上内容经双方充分协商一致，具有同等法律效力。',
+]
+
+DATA_LINES = [
+    '客户姓名：张某某  证件号码：110101199001011234',
+    '办理号码：13812345678  联系电话：13987654321',
+    '套餐名称：5G畅享套餐129元档，月费129.00元',
+    '办理日期：2024年03月15日  生效时间：次月1日',
+    '受理渠道：营业厅  经办人工号：A10023',
+    '本次实收金额：¥258.00',
+]
+
+NOISE_LINES = ['--------------------', '12 / 50', '3.', '第二条', '2024.03.15', 'ABCDEFGH']
+
+
+def legacy_filter(extractor: PDFTextExtractor, text: str) -> str:
+    """原实现：每行对每个关键词做一次子串查找，再逐个匹配无意义行的正则"""
+    filtered_lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        has_important = any(kw in line for kw in extractor.important_keywords)
+        is_template = any(kw in line for kw in extractor.template_keywords)
+        if len(line) < 5:
+            continue
+        if has_important:
+            filtered_lines.append(line)
+        elif not is_template and legacy_meaningful(line):
+            filtered_lines.append(line)
+    return '\n'.join(filtered_lines)
+
+
+def legacy_meaningful(line: str) -> bool:
+    patterns = [r'^[\d\s\-_\.]+$', r'^第\s*\d+\s*页', r'^\d+\s*/\s*\d+$',
+                r'^[\*\-=]{3,}$', r'^第[一二三四五六七八九十]+[条章节]', r'^\d+[\.\)]\s*$']
+    return not any(re.match(pattern, line) for pattern in patterns)
+
+
+def build_contract(pages: int, lines_per_page: int = 60) -> str:
+    """合成协议文本：以模板条款为主，夹杂业务数据和页码、分隔线等噪声行"""
+    rng = random.Random(0)
+    page_texts = []
+    for page in range(1, pages + 1):
+        lines = [f'第 {page} 页']
+        for _ in range(lines_per_page):
+            roll = rng.random()
+            source = CLAUSE_LINES if roll < 0.7 else DATA_LINES if roll < 0.85 else NOISE_LINES
+            lines.append(rng.choice(source))
+        page_texts.append('\n'.join(lines))
+    return '\n'.join(page_texts)
+
+
+def extra_keywords(count: int):
+    """生成不会出现在文本中的附加模板关键词（用于测试关键词数量的影响）"""
+    rng = random.Random(1)
+    return ['模板' + ''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(3)) for _ in range(count)]
+
+
+def timed(func, text: str, rounds: int) -> float:
+    """多次运行取最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF协议模板过滤性能测试')
+    parser.add_argument('--pages', type=int, default=50, help='合成协议的页数')
+    parser.add_argument('--rounds', type=int, default=5, help='每项测试的运行次数')
+    args = parser.parse_args()
+
+    text = build_contract(args.pages)
+    print(f"合成协议: {args.pages}页，{len(text.splitlines())}行，{len(text)}字符")
+
+    failed = False
+    timings = {}
+    base_count = len(PDFTextExtractor().template_keywords) + len(PDFTextExtractor().important_keywords)
+    for scale in (1, KEYWORD_SCALE):
+        extractor = PDFTextExtractor(extra_template_keywords=extra_keywords(base_count * (scale - 1)))
+        keyword_count = len(extractor.template_keywords) + len(extractor.important_keywords)
+        # 预先构建匹配器
+        kind = '自动机' if isinstance(extractor.keyword_matcher, KeywordMatcher) else '子串查找'
+
+        if extractor._filter_template_content(text) != legacy_filter(extractor, text):
+            print(f"关键词{keyword_count}个: 过滤结果与原实现不一致")
+            failed = True
+
+        matcher_ms = timed(extractor._filter_template_content, text, args.rounds)
+        legacy_ms = timed(lambda t: legacy_filter(extractor, t), text, args.rounds)
+        timings[scale] = matcher_ms
+        print(f"关键词{keyword_count}个: 匹配器（{kind}）{matcher_ms:.1f}ms，原实现 {legacy_ms:.1f}ms")
+
+        if scale == 1 and matcher_ms > legacy_ms * MAX_DEFAULT_RATIO:
+            print(f"默认关键词数量下比原实现慢（超过 {MAX_DEFAULT_RATIO}倍）")
+            failed = True
+
+    ratio = timings[KEYWORD_SCALE] / timings[1]
+    print(f"关键词增加到{KEYWORD_SCALE}倍，过滤耗时变化 {ratio:.2f}倍")
+    if ratio > MAX_SCALING_RATIO:
+        print(f"过滤耗时增幅超过 {MAX_SCALING_RATIO}倍")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
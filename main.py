@@ -36,6 +36,9 @@ def main():
   
   # 仅进行OCR处理
   python main.py --ocr-only --attachments ./attachments/ --output ./output/
+  
+  # 从历史协议PDF学习模板签名集（保存到PDF_BOILERPLATE_PATH或输出目录）
+  python main.py --learn-boilerplate ./历史协议/
         """
     )
     
@@ -50,6 +53,8 @@ def main():
                        help='仅进行OCR处理，不进行AI审核')
     parser.add_argument('--parse-only', action='store_true',
                        help='仅解析Word文档，不进行AI审核')
+    parser.add_argument('--learn-boilerplate', type=str, metavar='DIR',
+                       help='从目录中的历史PDF学习协议模板签名集，不进行审核')
     
     # 审核配置
     parser.add_argument('--review-type', type=str, 
@@ -84,7 +89,7 @@ def main():
         logger.debug(f"配置: {config}")
         
         # 验证配置
-        if not args.ocr_only and not args.parse_only:
+        if not args.ocr_only and not args.parse_only and not args.learn_boilerplate:
             if not config.validate():
                 logger.error("配置验证失败，请检查.env文件")
                 return 1
@@ -93,6 +98,10 @@ def main():
         print(f"配置加载失败: {str(e)}")
         return 1
     
+    # 学习协议模板签名集
+    if args.learn_boilerplate:
+        return learn_boilerplate(args.learn_boilerplate, config, output_dir)
+    
     # 执行处理流程
     try:
         # 1. OCR处理附件
@@ -185,5 +194,23 @@ def main():
         return 1
 
 
+def learn_boilerplate(pdf_dir: str, config: Config, output_dir: Path) -> int:
+    """从历史PDF学习协议模板签名集（保存到PDF_BOILERPLATE_PATH，未配置时保存到输出目录）"""
+    from boilerplate_filter import learn_from_pdfs
+    
+    output_path = config.pdf_boilerplate_path or str(output_dir / 'boilerplate_signatures.npz')
+    pdf_files = sorted(Path(pdf_dir).rglob('*.pdf'))
+    if not pdf_files:
+        logger.error(f"目录中没有PDF文件: {pdf_dir}")
+        return 1
+    
+    logger.info(f"从 {len(pdf_files)} 份PDF学习协议模板签名集...")
+    count = learn_from_pdfs(pdf_files, output_path)
+    logger.info(f"模板签名集已保存: {output_path}（{count}个片段）")
+    if not config.pdf_boilerplate_path:
+        logger.info(f"在.env中设置 PDF_BOILERPLATE_PATH={output_path} 以启用")
+    return 0
+
+
 if __name__ == '__main__':
     sys.exit(main())
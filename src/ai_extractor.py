@@ -9,6 +9,8 @@ from typing import Dict, List, Any
 import logging
 from openai import OpenAI
 
+from entity_scanner import scan
+
 logger = logging.getLogger(__name__)
 
 
@@ -91,7 +93,17 @@ class AIExtractor:
         Returns:
             图片信息提取结果（JSON格式）
         """
-        logger.info(f"使用AI提取 {len(ocr_results)} 个附件的关键信息...")
+        # 已有视觉模型结构化结果的附件直接转换，只有其余附件需要调用AI提取
+        structured_items = {
+            idx: self._structured_attachment_item(idx, ocr_result)
+            for idx, ocr_result in enumerate(ocr_results, 1)
+            if ocr_result.get('structured')
+        }
+        if len(structured_items) == len(ocr_results):
+            logger.info(f"✓ {len(ocr_results)} 个附件均有结构化识别结果，无需调用AI提取")
+            return {"图片信息提取结果": [structured_items[idx] for idx in sorted(structured_items)]}
+        
+        logger.info(f"使用AI提取 {len(ocr_results) - len(structured_items)} 个附件的关键信息...")
         
         # ========== 调试：输出OCR原始结果 ==========
         logger.info("=" * 60)
@@ -110,6 +122,8 @@ class AIExtractor:
         # 构建附件内容
         attachments_content = []
         for idx, ocr_result in enumerate(ocr_results, 1):
+            if idx in structured_items:
+                continue
             filename = ocr_result.get('file_name', f'附件{idx}')
             content = ocr_result.get('content', '')[:800]  # 限制长度
             attachments_content.append(f"附件{idx}（{filename}）内容：\n{content}")
@@ -174,6 +188,10 @@ class AIExtractor:
             logger.info("=" * 60)
             
             logger.info(f"✓ {len(ocr_results)} 个附件信息提取完成")
+            if structured_items:
+                items = extracted_info.get("图片信息提取结果", []) + list(structured_items.values())
+                items.sort(key=lambda item: int(re.sub(r'\D', '', item.get("图片变量名", "")) or 0))
+                extracted_info["图片信息提取结果"] = items
             return extracted_info
             
         except Exception as e:
@@ -182,7 +200,10 @@ class AIExtractor:
             logger.error(f"详细错误: {traceback.format_exc()}")
             # 降级到正则提取
             logger.info("【调试】降级使用正则提取...")
-            return self._regex_extract_attachments(ocr_results)
+            fallback = self._regex_extract_attachments(ocr_results)
+            for idx, item in structured_items.items():
+                fallback["图片信息提取结果"][idx - 1] = item
+            return fallback
     
     def cross_validate_with_ai(self, 
                               section1_info: Dict[str, Any],
@@ -282,9 +303,10 @@ class AIExtractor:
     
     def _regex_extract_section1(self, text: str) -> Dict[str, Any]:
         """正则提取第一部分信息（降级方案）"""
-        phones = list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', text)))
-        amounts = list(set(re.findall(r'¥?\s*\d+\.?\d*\s*元', text)))
-        dates = list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日]?', text)))
+        entities = scan(text)
+        phones = entities.phones
+        amounts = entities.amounts
+        dates = entities.dates
         
         return {
             "号码类": {
@@ -302,6 +324,36 @@ class AIExtractor:
             "用户诉求": []
         }
     
+    def _structured_attachment_item(self, idx: int, ocr_result: Dict[str, Any]) -> Dict[str, Any]:
+        """由视觉模型的结构化结果生成单个附件的提取结果（格式与AI提取结果一致）"""
+        structured = ocr_result['structured']
+        carrier_types = {
+            '业务凭证': '凭证',
+            '账单明细': '账单',
+            '记录查询': '联系记录',
+            '沟通记录': '联系记录',
+            '操作指引': '操作指引',
+        }
+        
+        phones = [f"{phone['number']}（{phone['role']}）" for phone in structured['phones']]
+        numbers = [amount['value'] for amount in structured['amounts']] + [date['value'] for date in structured['dates']]
+        has_info = bool(phones or structured['packages'] or numbers)
+        
+        return {
+            "图片变量名": f"file{idx}",
+            "对应附件": f"附件{idx}",
+            "文件名": ocr_result.get('file_name', f'附件{idx}'),
+            "图片状态": "可识别" if has_info or structured['is_operation_guide'] else "无核心业务信息",
+            "提取的关键信息": {
+                "号码类": phones or ["无"],
+                "业务类": structured['packages'] or ["无"],
+                "数字类": numbers or ["无"],
+                "载体类型": carrier_types.get(structured['type'], '其他'),
+                "内容清晰度": "可识别"
+            },
+            "异常说明": "无"
+        }
+    
     def _regex_extract_attachments(self, ocr_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """正则提取附件信息（降级方案）"""
         results = []
@@ -310,12 +362,11 @@ class AIExtractor:
             filename = ocr_result.get('file_name', f'附件{idx}')
             content = ocr_result.get('content', '')
             
-            # 提取号码
-            phones = list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content)))
-            # 提取金额
-            amounts = list(set(re.findall(r'¥?\s*\d+\.?\d*\s*元', content)))
-            # 提取日期
-            dates = list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日]?', content)))
+            # 提取号码、金额、日期
+            entities = scan(content)
+            phones = entities.phones
+            amounts = entities.amounts
+            dates = entities.dates
             
             results.append({
                 "图片变量名": f"file{idx}",
@@ -3,9 +3,11 @@
 为每个附件生成详细的关键内容核查表
 """
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 
+from entity_scanner import scan
+
 logger = logging.getLogger(__name__)
 
 
@@ -99,7 +101,7 @@ class AttachmentAnalyzer:
         logger.info(f"分析附件 {index}: {filename}")
         
         # 提取附件中的关键信息
-        att_info = self._extract_attachment_info(content)
+        att_info = self._extract_attachment_info(content, ocr_result.get('structured'))
         
         # 查找文档中对该附件的引用
         references = self._find_attachment_references(index, filename, section2, section3)
@@ -182,8 +184,12 @@ class AttachmentAnalyzer:
         
         return checklist
     
-    def _extract_attachment_info(self, content: str) -> Dict[str, Any]:
-        """从附件内容中提取关键信息"""
+    def _extract_attachment_info(self, content: str,
+                                 structured: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """从附件内容中提取关键信息（有视觉模型的结构化结果时直接使用）"""
+        if structured:
+            return self._structured_attachment_info(content, structured)
+        
         # 判断是否为操作指引类（与业务数据无关）
         is_guide = self._is_operation_guide(content)
         
@@ -195,17 +201,32 @@ class AttachmentAnalyzer:
         # 提取内容摘要
         content_summary = self._extract_content_summary(content)
         
+        entities = scan(content)
         return {
-            'phone_numbers': list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content))),
-            'business_numbers': list(set(re.findall(r'\b\d{10,15}\b', content))),
-            'amounts': list(set(re.findall(r'¥?\s*\d+\.?\d*\s*元', content))),
-            'dates': list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日]?', content))),
-            'times': list(set(re.findall(r'\d{1,2}:\d{2}(?::\d{2})?', content))),
+            'phone_numbers': entities.phones,
+            'business_numbers': entities.long_numbers,
+            'amounts': entities.amounts,
+            'dates': entities.dates,
+            'times': entities.times,
             'is_operation_guide': is_guide or content_type == '操作指引',
             'content_type': content_type,
             'content_summary': content_summary
         }
     
+    def _structured_attachment_info(self, content: str, structured: Dict[str, Any]) -> Dict[str, Any]:
+        """由视觉模型的结构化结果生成附件关键信息（业务编号、时间不在结构化字段中，仍从内容提取）"""
+        is_guide = structured['is_operation_guide'] or self._is_operation_guide(structured['summary'])
+        return {
+            'phone_numbers': [phone['number'] for phone in structured['phones']],
+            'business_numbers': scan(content).long_numbers,
+            'amounts': [amount['value'] for amount in structured['amounts']],
+            'dates': [date['value'] for date in structured['dates']],
+            'times': scan(content).times,
+            'is_operation_guide': is_guide,
+            'content_type': '操作指引' if is_guide else structured['type'],
+            'content_summary': structured['summary'] or self._extract_content_summary(content)
+        }
+    
     def _is_operation_guide(self, content: str) -> bool:
         """判断附件是否为操作指引类（与具体业务数据无关）"""
         # 检查视觉模型是否已标注
@@ -0,0 +1,249 @@
+"""
+附件数据源
+上传的附件直接以内存数据（较大的文件写入临时文件）交给PyMuPDF、Pillow和视觉模型编码，
+不必先保存到uploads目录再按路径反复读取；本地文件路径也包装为同一接口，各处理器统一使用。
+暂存的附件只存在于上传时处理请求的进程中，内存模式只支持单进程部署
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+# 超过该大小的上传写入临时文件，其余保存在内存中
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# 读取上传数据流的块大小
+READ_CHUNK_BYTES = 1024 * 1024
+
+# 暂存附件的标识前缀（上传接口返回，审核接口据此取用）
+MEMORY_SCHEME = 'mem://'
+
+
+class AttachmentNotFoundError(LookupError):
+    """附件标识不在当前进程的暂存中（已过期、已释放，或上传与审核由不同的工作进程处理）"""
+
+
+class AttachmentSource:
+    """一个附件的数据：本地文件、内存数据或上传时写入的临时文件"""
+
+    def __init__(self, name: str, path: Optional[str] = None, data: Optional[bytes] = None,
+                 temporary: bool = False):
+        """
+        初始化（一般使用 from_path / from_bytes / from_stream 创建）
+
+        Args:
+            name: 文件名（含扩展名）
+            path: 文件路径（内存数据为None）
+            data: 内存数据
+            temporary: path是否为上传时创建的临时文件（close时删除）
+        """
+        self.name = name
+        self.path = path
+        self.location = path or f"{MEMORY_SCHEME}{name}"
+        self._data = data
+        self._temporary = temporary
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> 'AttachmentSource':
+        return cls(Path(path).name, path=str(path))
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes) -> 'AttachmentSource':
+        return cls(name, data=data)
+
+    @classmethod
+    def from_stream(cls, name: str, stream: BinaryIO,
+                    spool_max_bytes: int = SPOOL_MAX_BYTES) -> 'AttachmentSource':
+        """
+        从上传数据流读取（只读取一次）
+
+        Args:
+            name: 文件名
+            stream: 数据流（如 werkzeug FileStorage.stream）
+            spool_max_bytes: 超过该大小时写入临时文件
+
+        Returns:
+            AttachmentSource
+        """
+        buffer = io.BytesIO()
+        while True:
+            chunk = stream.read(READ_CHUNK_BYTES)
+            if not chunk:
+                return cls(name, data=buffer.getvalue())
+            buffer.write(chunk)
+            if buffer.tell() > spool_max_bytes:
+                break
+
+        # 大文件：已读取的部分和剩余数据写入临时文件，按路径交给PyMuPDF、Pillow
+        with tempfile.NamedTemporaryFile(suffix=Path(name).suffix, delete=False) as spool:
+            spool.write(buffer.getbuffer())
+            buffer = None
+            while True:
+                chunk = stream.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        return cls(name, path=spool.name, temporary=True)
+
+    @property
+    def suffix(self) -> str:
+        """小写的扩展名（含点）"""
+        return Path(self.name).suffix.lower()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    def exists(self) -> bool:
+        return self._data is not None or (self.path is not None and os.path.exists(self.path))
+
+    def read_bytes(self) -> bytes:
+        """读取全部数据（内存数据直接返回，不复制）"""
+        if self._data is not None:
+            return self._data
+        return Path(self.path).read_bytes()
+
+    def open_pdf(self) -> fitz.Document:
+        """打开为PDF文档"""
+        if self._data is not None:
+            return fitz.open(stream=self._data, filetype='pdf')
+        return fitz.open(self.path)
+
+    def open_image(self) -> Image.Image:
+        """打开为图片（延迟解码，只读取文件头）"""
+        if self._data is not None:
+            return Image.open(io.BytesIO(self._data))
+        return Image.open(self.path)
+
+    def close(self):
+        """释放内存数据，删除上传时创建的临时文件"""
+        self._data = None
+        if self._temporary and self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self._temporary = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __str__(self):
+        return self.location
+
+    def __repr__(self):
+        return f"AttachmentSource({self.location!r})"
+
+
+def as_source(file: Union[str, Path, AttachmentSource]) -> AttachmentSource:
+    """文件路径或附件数据源统一为附件数据源"""
+    if isinstance(file, AttachmentSource):
+        return file
+    return AttachmentSource.from_path(file)
+
+
+class AttachmentStore:
+    """
+    暂存上传的附件（上传和审核是两次请求），超过保留时间未取用的附件自动释放
+
+    附件保存在当前进程内，多个工作进程（gunicorn -w N 等）之间不共享：
+    审核请求落到其他进程时取不到附件，resolve 会抛出 AttachmentNotFoundError
+    """
+
+    def __init__(self, ttl_seconds: float = 1800):
+        """
+        初始化
+
+        Args:
+            ttl_seconds: 附件的保留时间（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._sources: Dict[str, Tuple[float, AttachmentSource]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_token(value: str) -> bool:
+        return isinstance(value, str) and value.startswith(MEMORY_SCHEME)
+
+    def add(self, source: AttachmentSource) -> str:
+        """
+        暂存附件
+
+        Returns:
+            附件标识（mem://<id>/<文件名>）
+        """
+        self._expire()
+        token = f"{MEMORY_SCHEME}{uuid.uuid4().hex}/{source.name}"
+        source.location = token
+        with self._lock:
+            self._sources[token] = (time.monotonic(), source)
+        return token
+
+    def get(self, token: str) -> Optional[AttachmentSource]:
+        """取用暂存的附件（超过保留时间的附件先释放，不再返回）"""
+        self._expire()
+        with self._lock:
+            entry = self._sources.get(token)
+        return entry[1] if entry else None
+
+    def resolve(self, paths: List[str]) -> List[AttachmentSource]:
+        """
+        将上传接口返回的附件标识或文件路径转为附件数据源（不存在的文件路径跳过）
+
+        Args:
+            paths: 附件标识或文件路径列表
+
+        Returns:
+            按输入顺序的附件数据源
+
+        Raises:
+            AttachmentNotFoundError: 附件标识不在当前进程的暂存中
+        """
+        sources = []
+        for path in paths:
+            if self.is_token(path):
+                source = self.get(path)
+                if source is None:
+                    raise AttachmentNotFoundError(
+                        f"附件已失效: {path}（超过保留时间、已审核释放，或上传与审核由不同的工作进程处理；"
+                        f"UPLOAD_IN_MEMORY 只支持单进程部署），请重新上传"
+                    )
+            else:
+                source = AttachmentSource.from_path(path)
+            if source.exists():
+                sources.append(source)
+        return sources
+
+    def discard(self, token: str) -> bool:
+        """释放一个暂存的附件，返回是否存在"""
+        with self._lock:
+            entry = self._sources.pop(token, None)
+        if entry:
+            entry[1].close()
+        return entry is not None
+
+    def clear(self) -> int:
+        """释放全部暂存的附件，返回释放的数量"""
+        with self._lock:
+            entries, self._sources = list(self._sources.values()), {}
+        for _, source in entries:
+            source.close()
+        return len(entries)
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [token for token, (created, _) in self._sources.items() if created < deadline]
+            entries = [self._sources.pop(token) for token in expired]
+        for _, source in entries:
+            source.close()
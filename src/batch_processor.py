@@ -189,10 +189,9 @@ class BatchCaseProcessor:
         parsed_doc = parser.parse_word_document(str(doc_files['main_doc']))
         
         # 处理附件
-        ocr_results = []
-        for attachment in doc_files['attachments']:
-            result = self.vision_processor.process_file(str(attachment))
-            ocr_results.append(result)
+        ocr_results = self.vision_processor.process_files(
+            [str(attachment) for attachment in doc_files['attachments']]
+        )
         
         # 执行审核
         review_result = self.reviewer.review_complaint_document(
@@ -0,0 +1,230 @@
+"""
+账单费用明细表提取
+账单、费用明细类PDF有文字层时，用PyMuPDF的表格检测（有表格线）或文字坐标（无表格线，按表头列位置对齐）
+直接得到逐月费用明细行（月份、套餐费、其他费用、优惠减免、应收、实收），不必调用视觉模型重建表格。
+输出的行与视觉识别结构化结果中的 fee_rows 结构相同
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from keyword_matcher import get_matcher
+from vision_schema import FEE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+COLUMN_MONTH = 'month'
+
+# 账单必有的金额列（应收或实收），用于快速排除协议等非账单页
+TOTAL_COLUMNS = frozenset(('receivable', 'received'))
+
+# 各列的表头关键词（表头单元格命中多个关键词时取最长的）
+COLUMN_ALIASES = {
+    'month': ('月份', '账期', '计费月', '账单月', '出账月', '计费周期', '年月'),
+    'package_fee': ('套餐费', '套餐月费', '套餐及固定费', '月租', '基本月租', '固定费'),
+    'other_fee': ('其他费用', '其他', '增值业务费', '通信费', '代收费', '超出费'),
+    'discount': ('优惠减免', '优惠', '减免', '折扣', '抵扣'),
+    'receivable': ('应收', '应缴', '应付', '本期应'),
+    'received': ('实收', '实缴', '已缴', '实付', '已付'),
+}
+
+# 表头至少识别出的列数（含月份列）
+MIN_HEADER_COLUMNS = 3
+
+# 表头之后连续多少行不是费用行时认为表格结束（文字坐标方式）
+MAX_GAP_LINES = 3
+
+# 月份：2024-01、2024年1月、2024.01、202401（计费周期取起始月）
+MONTH_PATTERN = re.compile(r'(?<!\d)(20\d{2})\s*(?:[-年./]\s*)?(0?[1-9]|1[0-2])(?!\d)')
+MONTH_CELL_MAX_CHARS = 25
+
+AMOUNT_PATTERN = re.compile(r'^[-+]?\d+(?:\.\d+)?$')
+
+
+class BillTableExtractor:
+    """从PDF页面文字层提取逐月费用明细"""
+
+    def __init__(self, use_table_detection: bool = True):
+        """
+        初始化
+
+        Args:
+            use_table_detection: 是否先用PyMuPDF表格检测（有表格线的账单），未检测到时再按文字坐标对齐
+        """
+        self.use_table_detection = use_table_detection
+        self.matcher = get_matcher(COLUMN_ALIASES)
+
+    def is_bill_page(self, text: str) -> bool:
+        """页面文字是否包含费用明细表头（月份列、应收或实收列及其他费用列），不是时跳过表格检测"""
+        categories = self.matcher.categories(text)
+        return (COLUMN_MONTH in categories and bool(categories & TOTAL_COLUMNS)
+                and len(categories) >= MIN_HEADER_COLUMNS)
+
+    def extract_page(self, page: fitz.Page, text: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        提取一页中的费用明细行
+
+        Args:
+            page: PDF页面
+            text: 页面文字（已提取时传入，避免重复提取）
+
+        Returns:
+            [{'month': 'YYYY-MM', 'package_fee': ..., ..., 'received': ...}]，不是账单页时为空列表
+        """
+        if not self.is_bill_page(page.get_text() if text is None else text):
+            return []
+
+        if self.use_table_detection:
+            try:
+                rows = self._rows_from_tables(page)
+            except Exception as e:
+                logger.debug(f"表格检测失败，改用文字坐标: {e}")
+                rows = []
+            if rows:
+                return rows
+        return self._rows_from_words(page)
+
+    def extract(self, doc: fitz.Document) -> List[Dict[str, str]]:
+        """提取整个文档的费用明细行（按页顺序）"""
+        rows = []
+        for page in doc:
+            rows.extend(self.extract_page(page))
+        return rows
+
+    def _rows_from_tables(self, page: fitz.Page) -> List[Dict[str, str]]:
+        """PyMuPDF表格检测（按表格线）得到的表格中，表头可识别的作为费用明细表"""
+        rows = []
+        for table in page.find_tables().tables:
+            cells = [[self._clean(cell) for cell in row] for row in table.extract()]
+            for header_index, header in enumerate(cells[:3]):
+                columns = self._header_columns(header)
+                if columns:
+                    break
+            else:
+                continue
+            for row in cells[header_index + 1:]:
+                values = {}
+                for index, key in columns.items():
+                    if index < len(row):
+                        values[key] = row[index]
+                fee_row = self._fee_row(values)
+                if fee_row:
+                    rows.append(fee_row)
+        return rows
+
+    def _rows_from_words(self, page: fitz.Page) -> List[Dict[str, str]]:
+        """
+        按文字坐标对齐（无表格线的账单）：找到表头行，记录各列表头的水平位置，
+        其后每行的文字按水平位置归入最近的列
+        """
+        rows = []
+        lines = self._group_lines(self._page_words(page))
+        anchors: Optional[List[Tuple[float, str]]] = None
+        gap = 0
+
+        for words in lines:
+            header = self._header_columns([word[4] for word in words])
+            if header:
+                anchors = sorted(((words[index][0] + words[index][2]) / 2, key) for index, key in header.items())
+                gap = 0
+                continue
+            if anchors is None:
+                continue
+
+            values: Dict[str, List[str]] = {}
+            for x0, _, x1, _, word in words:
+                center = (x0 + x1) / 2
+                key = min(anchors, key=lambda anchor: abs(anchor[0] - center))[1]
+                values.setdefault(key, []).append(word)
+            fee_row = self._fee_row({key: ''.join(parts) for key, parts in values.items()})
+            if fee_row:
+                rows.append(fee_row)
+                gap = 0
+            else:
+                gap += 1
+                if gap >= MAX_GAP_LINES:
+                    anchors = None
+        return rows
+
+    @staticmethod
+    def _page_words(page: fitz.Page) -> List[Tuple[float, float, float, float, str]]:
+        """
+        按字符坐标切分单词：空白字符或水平间距超过半个字宽处断开
+        （无表格线的账单中相邻两列之间常常没有空格，按空格切分会把两列合成一个单词）
+        """
+        words = []
+        for block in page.get_text('rawdict')['blocks']:
+            for line in block.get('lines', ()):
+                for span in line['spans']:
+                    gap = span['size'] / 2
+                    chars, x0, y0, x1, y1 = [], 0.0, 0.0, 0.0, 0.0
+                    for char in span['chars']:
+                        cx0, cy0, cx1, cy1 = char['bbox']
+                        if chars and (char['c'].isspace() or cx0 - x1 > gap):
+                            words.append((x0, y0, x1, y1, ''.join(chars)))
+                            chars = []
+                        if char['c'].isspace():
+                            continue
+                        if not chars:
+                            x0, y0 = cx0, cy0
+                        chars.append(char['c'])
+                        x1, y1 = cx1, cy1
+                    if chars:
+                        words.append((x0, y0, x1, y1, ''.join(chars)))
+        return words
+
+    @staticmethod
+    def _group_lines(words: List[tuple]) -> List[List[Tuple[float, float, float, float, str]]]:
+        """将单词按垂直位置分行（垂直中心相差不超过半个字高的为同一行），行内按水平位置排序"""
+        lines: List[List[Tuple[float, float, float, float, str]]] = []
+        centers: List[float] = []
+        for x0, y0, x1, y1, word, *_ in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+            center = (y0 + y1) / 2
+            if lines and abs(center - centers[-1]) <= (y1 - y0) / 2:
+                lines[-1].append((x0, y0, x1, y1, word))
+            else:
+                lines.append([(x0, y0, x1, y1, word)])
+                centers.append(center)
+        return [sorted(line) for line in lines]
+
+    def _header_columns(self, cells: List[str]) -> Dict[int, str]:
+        """
+        识别表头：返回 {单元格序号: 列名}；没有月份列或识别出的列数不足时返回空字典
+        """
+        columns: Dict[int, str] = {}
+        for index, cell in enumerate(cells):
+            if not cell or len(cell) > 12:
+                continue
+            matches = self.matcher.find_all(cell)
+            if not matches:
+                continue
+            key = max(matches, key=lambda match: (len(match[1]), -match[0]))[2]
+            if key not in columns.values():
+                columns[index] = key
+        if COLUMN_MONTH not in columns.values() or len(columns) < MIN_HEADER_COLUMNS:
+            return {}
+        return columns
+
+    def _fee_row(self, values: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """由各列的单元格文字生成费用明细行；月份列不是月份（如合计行）时返回None"""
+        month_cell = values.get(COLUMN_MONTH, '')
+        match = MONTH_PATTERN.search(month_cell) if len(month_cell) <= MONTH_CELL_MAX_CHARS else None
+        if not match:
+            return None
+        row = {key: self._amount(values.get(key, '')) for key, _ in FEE_COLUMNS}
+        row[COLUMN_MONTH] = f"{match.group(1)}-{int(match.group(2)):02d}"
+        return row if any(row[key] for key, _ in FEE_COLUMNS if key != COLUMN_MONTH) else None
+
+    @staticmethod
+    def _amount(cell: str) -> str:
+        """金额统一为"XX元"（与视觉识别的费用明细一致），不是数字的保留原文"""
+        value = cell.replace(',', '').replace('¥', '').replace('￥', '').strip()
+        if value.endswith('元'):
+            value = value[:-1].strip()
+        return f"{value}元" if AMOUNT_PATTERN.match(value) else cell
+
+    @staticmethod
+    def _clean(cell: Any) -> str:
+        return ''.join(str(cell).split()) if cell is not None else ''
@@ -0,0 +1,216 @@
+"""
+语料学习的协议模板过滤
+固定的模板关键词只能覆盖少量条款。对历史PDF逐行切分为重叠的字节片段（shingle）并计算64位哈希，
+统计每个片段出现在多少份文档中，出现在大量文档中的片段即为运营商协议的通用条款，
+保存为排序的uint64数组（签名集）。提取文字时，片段大部分命中签名集的行视为模板条款过滤掉；
+含数字的行（号码、金额、日期等，不计行首的条款编号）总是保留，避免丢失案件信息
+"""
+import logging
+import math
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 片段长度（UTF-8字节，约8个汉字）
+SHINGLE_BYTES = 24
+
+# 判断时每隔几个字节取一个片段（学习时取全部位置，判断时抽样即可估计命中占比）
+LOOKUP_STEP = 4
+
+# 少于该字符数的行不学习、不判断（交给关键词规则）
+MIN_LINE_CHARS = 10
+
+# 片段出现在至少该比例（且不少于MIN_DOCUMENTS份）的文档中时视为模板
+MIN_DOCUMENT_RATIO = 0.3
+MIN_DOCUMENTS = 3
+
+# 行内命中签名集的片段占比达到该值时视为模板行
+MATCH_RATIO = 0.8
+
+# 签名集的片段数上限（按出现文档数保留）
+MAX_SIGNATURES = 200_000
+
+# 含数字的行可能是案件信息（号码、金额、日期），不学习也不过滤
+DIGIT_PATTERN = re.compile(r'\d')
+
+# 行首的条款编号：1、 2. (3) 4)
+CLAUSE_NUMBER_PATTERN = re.compile(r'^(?:\(\d{1,3}\)|\d{1,3}[、.)](?!\d))')
+
+
+def normalize_line(line: str) -> str:
+    """规范化一行文字：全角转半角，去掉空白（同一条款在不同PDF中的排版空格不同）和行首的条款编号"""
+    return CLAUSE_NUMBER_PATTERN.sub('', ''.join(unicodedata.normalize('NFKC', line).split()))
+
+
+def shingle_hashes(line: str, size: int = SHINGLE_BYTES, step: int = 1) -> List[int]:
+    """
+    规范化后的一行文字的片段哈希（CRC32与Adler32拼成64位，跨进程稳定）
+
+    Args:
+        line: 规范化后的文字
+        size: 片段长度（字节）
+        step: 片段起点的间隔
+    """
+    data = line.encode('utf-8')
+    if len(data) <= size:
+        pieces = [data]
+    else:
+        pieces = [data[i:i + size] for i in range(0, len(data) - size + 1, step)]
+    return [(zlib.crc32(piece) << 32) | zlib.adler32(piece) for piece in pieces]
+
+
+class BoilerplateLearner:
+    """从历史PDF文字中学习模板条款的片段签名集"""
+
+    def __init__(self,
+                 shingle_bytes: int = SHINGLE_BYTES,
+                 min_document_ratio: float = MIN_DOCUMENT_RATIO,
+                 min_documents: int = MIN_DOCUMENTS,
+                 max_signatures: int = MAX_SIGNATURES):
+        """
+        初始化
+
+        Args:
+            shingle_bytes: 片段长度（字节）
+            min_document_ratio: 片段至少出现在该比例的文档中才视为模板
+            min_documents: 片段至少出现的文档数
+            max_signatures: 签名集的片段数上限
+        """
+        self.shingle_bytes = shingle_bytes
+        self.min_document_ratio = min_document_ratio
+        self.min_documents = min_documents
+        self.max_signatures = max_signatures
+        self.documents = 0
+        self._document_counts: Counter = Counter()
+
+    def add_text(self, text: str):
+        """加入一份文档的文字（同一文档内重复的片段只计一次）"""
+        shingles = set()
+        for line in text.split('\n'):
+            line = normalize_line(line)
+            if len(line) >= MIN_LINE_CHARS and not DIGIT_PATTERN.search(line):
+                shingles.update(shingle_hashes(line, self.shingle_bytes))
+        self._document_counts.update(shingles)
+        self.documents += 1
+
+    def add_pdf(self, pdf_path: str):
+        """加入一份PDF（读取全部页面的文字层）"""
+        import fitz  # PyMuPDF
+
+        with fitz.open(pdf_path) as doc:
+            self.add_text('\n'.join(page.get_text() for page in doc))
+
+    def signatures(self) -> np.ndarray:
+        """出现文档数达到阈值的片段哈希（升序的uint64数组）"""
+        threshold = max(self.min_documents, math.ceil(self.min_document_ratio * self.documents))
+        frequent = [(count, value) for value, count in self._document_counts.items() if count >= threshold]
+        frequent.sort(reverse=True)
+        hashes = np.array([value for _, value in frequent[:self.max_signatures]], dtype=np.uint64)
+        return np.sort(hashes)
+
+    def save(self, path: str) -> int:
+        """
+        保存签名集
+
+        Returns:
+            片段数
+        """
+        hashes = self.signatures()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, hashes=hashes, shingle_bytes=self.shingle_bytes, documents=self.documents)
+        logger.info(f"模板签名集已保存: {path}（{self.documents}份文档，{len(hashes)}个片段）")
+        return len(hashes)
+
+
+class BoilerplateFilter:
+    """按签名集判断一行文字是否为学习到的模板条款"""
+
+    def __init__(self, hashes: np.ndarray, shingle_bytes: int = SHINGLE_BYTES, match_ratio: float = MATCH_RATIO):
+        """
+        初始化
+
+        Args:
+            hashes: 升序的片段哈希数组
+            shingle_bytes: 学习时的片段长度
+            match_ratio: 命中片段占比达到该值的行视为模板
+        """
+        self.hashes = hashes
+        self.shingle_bytes = shingle_bytes
+        self.match_ratio = match_ratio
+
+    @classmethod
+    def load(cls, path: str, match_ratio: float = MATCH_RATIO) -> 'BoilerplateFilter':
+        with np.load(path) as data:
+            return cls(data['hashes'], int(data['shingle_bytes']), match_ratio)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def is_boilerplate(self, line: str) -> bool:
+        """该行是否为模板条款（过短或含数字的行总是返回False）"""
+        line = normalize_line(line)
+        if len(line) < MIN_LINE_CHARS or not len(self.hashes) or DIGIT_PATTERN.search(line):
+            return False
+        values = np.array(shingle_hashes(line, self.shingle_bytes, LOOKUP_STEP), dtype=np.uint64)
+        positions = np.searchsorted(self.hashes, values)
+        positions[positions == len(self.hashes)] = 0
+        return np.count_nonzero(self.hashes[positions] == values) >= self.match_ratio * len(values)
+
+
+def load_filter(path: Optional[str]) -> Optional[BoilerplateFilter]:
+    """
+    加载签名集（同一文件未修改时在进程内只加载一次）；未配置或文件不存在时返回None
+
+    Args:
+        path: 签名集文件路径
+    """
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        logger.warning(f"模板签名集不存在，不启用语料模板过滤: {path}")
+        return None
+    return _load_filter(path, mtime)
+
+
+@lru_cache(maxsize=4)
+def _load_filter(path: str, mtime: float) -> Optional[BoilerplateFilter]:
+    try:
+        boilerplate = BoilerplateFilter.load(path)
+    except Exception as e:
+        logger.warning(f"模板签名集加载失败 {path}: {e}")
+        return None
+    logger.info(f"已加载模板签名集: {path}（{len(boilerplate)}个片段）")
+    return boilerplate
+
+
+def learn_from_pdfs(pdf_paths: Iterable[str], output_path: str, **options) -> int:
+    """
+    从历史PDF学习模板签名集并保存
+
+    Args:
+        pdf_paths: 历史PDF路径
+        output_path: 签名集保存路径
+        **options: BoilerplateLearner 的参数
+
+    Returns:
+        片段数
+    """
+    learner = BoilerplateLearner(**options)
+    for pdf_path in pdf_paths:
+        try:
+            learner.add_pdf(str(pdf_path))
+        except Exception as e:
+            logger.warning(f"读取PDF失败，跳过 {pdf_path}: {e}")
+    return learner.save(output_path)
@@ -2,11 +2,11 @@
 申诉文档专用审核器
 文本+图片+PDF
 """
-import re
 import json
 from typing import Dict, List, Any
 import logging
 from attachment_analyzer import AttachmentAnalyzer
+from entity_scanner import scan
 from three_dimension_validator import ThreeDimensionValidator, ImageInfoExtractor, PDFInfoExtractor
 
 logger = logging.getLogger(__name__)
@@ -229,9 +229,10 @@ class ComplaintReviewer:
                 continue
             
             # 提取关键信息
-            phone_numbers = list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content)))
-            amounts = list(set(re.findall(r'\d+\.?\d*元', content)))
-            dates = list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日号]?', content)))
+            entities = scan(content)
+            phone_numbers = entities.phones
+            amounts = entities.amounts
+            dates = entities.dates
             
             # 判断状态
             if result.get('error') or len(content.strip()) < 10:
@@ -283,8 +284,9 @@ class ComplaintReviewer:
             content = result.get('content', '')
             
             # 提取关键信息
-            phone_numbers = list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content)))
-            amounts = list(set(re.findall(r'\d+\.?\d*元', content)))
+            entities = scan(content)
+            phone_numbers = entities.phones
+            amounts = entities.amounts
             
             # 判断状态
             if result.get('error') or len(content.strip()) < 10:
@@ -370,17 +372,18 @@ class ComplaintReviewer:
         attachments = []
         for idx, ocr in enumerate(ocr_results, 1):
             content = ocr.get('content', '')
+            entities = scan(content)
             attachments.append({
                 'attachment_index': idx,
                 'filename': ocr.get('file_name', f'附件{idx}'),
                 'file_type': ocr.get('file_type', ''),
                 'status': '已提取' if content else '无内容',
                 'extracted_info': {
-                    'business_numbers': list(set(re.findall(r'\b\d{10,15}\b', content))),
-                    'contact_numbers': list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content))),
-                    'amounts': list(set(re.findall(r'¥?\s*\d+\.?\d*\s*元', content))),
-                    'dates': list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日]?', content))),
-                    'times': list(set(re.findall(r'\d{1,2}:\d{2}(?::\d{2})?', content))),
+                    'business_numbers': entities.long_numbers,
+                    'contact_numbers': entities.phones,
+                    'amounts': entities.amounts,
+                    'dates': entities.dates,
+                    'times': entities.times,
                     'special_terms': [],
                     'content_type': '未知',
                     'clarity': '可识别' if content else '无内容'
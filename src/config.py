@@ -48,6 +48,64 @@ class Config:
         self.output_dir = os.getenv('OUTPUT_DIR', 'output')
         self.log_level = os.getenv('LOG_LEVEL', 'INFO')
         
+        # 视觉识别配置
+        self.vision_max_workers = int(os.getenv('VISION_MAX_WORKERS', '4'))  # 同时在途的识别请求数
+        self.vision_cache_enabled = os.getenv('VISION_CACHE_ENABLED', 'true').lower() == 'true'
+        self.vision_cache_dir = os.getenv('VISION_CACHE_DIR', str(Path(self.output_dir) / 'vision_cache'))
+        self.vision_cache_max_mb = float(os.getenv('VISION_CACHE_MAX_MB', '500'))
+        self.vision_preprocess = os.getenv('VISION_PREPROCESS', 'true').lower() == 'true'
+        self.vision_max_long_edge = int(os.getenv('VISION_MAX_LONG_EDGE', '2048'))
+        self.vision_jpeg_quality = int(os.getenv('VISION_JPEG_QUALITY', '85'))
+        self.vision_grayscale_screenshots = os.getenv('VISION_GRAYSCALE_SCREENSHOTS', 'false').lower() == 'true'
+        self.vision_pdf_render_workers = int(os.getenv('VISION_PDF_RENDER_WORKERS', '2'))
+        self.vision_pack_images = os.getenv('VISION_PACK_IMAGES', 'false').lower() == 'true'
+        self.vision_pack_pixel_budget = int(os.getenv('VISION_PACK_PIXEL_BUDGET', '3000000'))
+        self.vision_pack_max_images = int(os.getenv('VISION_PACK_MAX_IMAGES', '4'))
+        self.vision_stream = os.getenv('VISION_STREAM', 'false').lower() == 'true'
+        self.vision_request_timeout = float(os.getenv('VISION_REQUEST_TIMEOUT', '60'))
+        self.vision_retry_attempts = int(os.getenv('VISION_RETRY_ATTEMPTS', '3'))
+        self.vision_retry_base_delay = float(os.getenv('VISION_RETRY_BASE_DELAY', '0.5'))
+        self.vision_retry_max_delay = float(os.getenv('VISION_RETRY_MAX_DELAY', '8'))
+        self.vision_breaker_threshold = int(os.getenv('VISION_BREAKER_THRESHOLD', '5'))
+        self.vision_breaker_reset_seconds = float(os.getenv('VISION_BREAKER_RESET_SECONDS', '30'))
+        self.vision_hedge_requests = os.getenv('VISION_HEDGE_REQUESTS', 'false').lower() == 'true'
+        self.vision_ocr_first = os.getenv('VISION_OCR_FIRST', 'false').lower() == 'true'
+        self.vision_ocr_min_confidence = float(os.getenv('VISION_OCR_MIN_CONFIDENCE', '85'))
+        self.vision_ocr_max_low_conf_ratio = float(os.getenv('VISION_OCR_MAX_LOW_CONF_RATIO', '0.15'))
+        self.vision_ocr_min_entities = int(os.getenv('VISION_OCR_MIN_ENTITIES', '1'))
+        self.vision_phash_enabled = os.getenv('VISION_PHASH_ENABLED', 'false').lower() == 'true'
+        self.vision_phash_dir = os.getenv('VISION_PHASH_DIR', str(Path(self.output_dir) / 'phash_index'))
+        self.vision_phash_max_distance = int(os.getenv('VISION_PHASH_MAX_DISTANCE', '4'))
+        self.vision_quality_check = os.getenv('VISION_QUALITY_CHECK', 'false').lower() == 'true'
+        self.vision_blur_threshold = float(os.getenv('VISION_BLUR_THRESHOLD', '50'))
+        self.vision_skip_blurry = os.getenv('VISION_SKIP_BLURRY', 'false').lower() == 'true'
+        self.vision_tile_tall_images = os.getenv('VISION_TILE_TALL_IMAGES', 'false').lower() == 'true'
+        self.vision_tile_max_aspect_ratio = float(os.getenv('VISION_TILE_MAX_ASPECT_RATIO', '3'))
+        self.vision_prompt_profile = os.getenv('VISION_PROMPT_PROFILE', 'full')  # auto / full / key_fields / classify
+        self.vision_structured_output = os.getenv('VISION_STRUCTURED_OUTPUT', 'false').lower() == 'true'
+        
+        # PDF按页路由配置（有文字层的页面直接提取，图片页交给OCR或视觉模型）
+        self.page_route_image_engine = os.getenv('PAGE_ROUTE_IMAGE_ENGINE', 'vision')  # vision / ocr
+        self.page_route_min_text_chars = int(os.getenv('PAGE_ROUTE_MIN_TEXT_CHARS', '20'))
+        self.page_route_image_coverage = float(os.getenv('PAGE_ROUTE_IMAGE_COVERAGE', '0.5'))
+        
+        # PDF文字过滤配置（在默认关键词之外追加的协议模板关键词、重要信息关键词，逗号分隔）
+        self.pdf_extra_template_keywords = self._split_list(os.getenv('PDF_EXTRA_TEMPLATE_KEYWORDS', ''))
+        self.pdf_extra_important_keywords = self._split_list(os.getenv('PDF_EXTRA_IMPORTANT_KEYWORDS', ''))
+        self.pdf_low_memory = os.getenv('PDF_LOW_MEMORY', 'false').lower() == 'true'
+        self.pdf_max_filtered_chars = int(os.getenv('PDF_MAX_FILTERED_CHARS', '20000'))
+        self.pdf_batch_workers = int(os.getenv('PDF_BATCH_WORKERS', '1'))
+        self.pdf_batch_timeout = float(os.getenv('PDF_BATCH_TIMEOUT', '0')) or None
+        self.pdf_bill_tables = os.getenv('PDF_BILL_TABLES', 'true').lower() == 'true'
+        self.pdf_page_budget = int(os.getenv('PDF_PAGE_BUDGET', '0'))
+        self.pdf_page_min_score = float(os.getenv('PDF_PAGE_MIN_SCORE', '0'))
+        self.pdf_boilerplate_path = os.getenv('PDF_BOILERPLATE_PATH', '') or None
+        
+        # 上传附件配置（内存模式下附件不写入上传目录，超过SPOOL_MAX_MB的写入临时文件）
+        self.upload_in_memory = os.getenv('UPLOAD_IN_MEMORY', 'false').lower() == 'true'
+        self.upload_spool_max_bytes = int(float(os.getenv('UPLOAD_SPOOL_MAX_MB', '8')) * 1024 * 1024)
+        self.upload_memory_ttl = int(os.getenv('UPLOAD_MEMORY_TTL', '1800'))
+        
         # 创建输出目录
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
     
@@ -88,6 +146,74 @@ class Config:
                 "或设置 USE_LOCAL_API=true 使用本地API"
             )
     
+    def get_vision_config(self) -> dict:
+        """获取视觉处理器的附加配置（与get_ai_config配合使用）"""
+        return {
+            'max_workers': self.vision_max_workers,
+            'cache_dir': self.vision_cache_dir if self.vision_cache_enabled else None,
+            'cache_max_mb': self.vision_cache_max_mb,
+            'preprocess': self.vision_preprocess,
+            'max_long_edge': self.vision_max_long_edge,
+            'jpeg_quality': self.vision_jpeg_quality,
+            'grayscale_screenshots': self.vision_grayscale_screenshots,
+            'pdf_render_workers': self.vision_pdf_render_workers,
+            'pack_images': self.vision_pack_images,
+            'pack_pixel_budget': self.vision_pack_pixel_budget,
+            'pack_max_images': self.vision_pack_max_images,
+            'stream': self.vision_stream,
+            'request_timeout': self.vision_request_timeout,
+            'retry_attempts': self.vision_retry_attempts,
+            'retry_base_delay': self.vision_retry_base_delay,
+            'retry_max_delay': self.vision_retry_max_delay,
+            'breaker_threshold': self.vision_breaker_threshold,
+            'breaker_reset_seconds': self.vision_breaker_reset_seconds,
+            'hedge_requests': self.vision_hedge_requests,
+            'ocr_first': self.vision_ocr_first,
+            'ocr_min_confidence': self.vision_ocr_min_confidence,
+            'ocr_max_low_conf_ratio': self.vision_ocr_max_low_conf_ratio,
+            'ocr_min_entities': self.vision_ocr_min_entities,
+            'tesseract_path': self.tesseract_path,
+            'phash_dir': self.vision_phash_dir if self.vision_phash_enabled else None,
+            'phash_max_distance': self.vision_phash_max_distance,
+            'quality_check': self.vision_quality_check,
+            'blur_threshold': self.vision_blur_threshold,
+            'skip_blurry': self.vision_skip_blurry,
+            'tile_tall_images': self.vision_tile_tall_images,
+            'tile_max_aspect_ratio': self.vision_tile_max_aspect_ratio,
+            'prompt_profile': self.vision_prompt_profile,
+            'structured_output': self.vision_structured_output,
+            'page_budget': self.pdf_page_budget,
+            'page_min_score': self.pdf_page_min_score,
+        }
+    
+    def get_page_router_config(self) -> dict:
+        """获取PDF按页路由的配置"""
+        return {
+            'image_route': self.page_route_image_engine,
+            'min_text_chars': self.page_route_min_text_chars,
+            'image_coverage_threshold': self.page_route_image_coverage,
+        }
+    
+    def get_pdf_text_config(self) -> dict:
+        """获取PDF文字过滤的配置"""
+        return {
+            'extra_template_keywords': self.pdf_extra_template_keywords,
+            'extra_important_keywords': self.pdf_extra_important_keywords,
+            'low_memory': self.pdf_low_memory,
+            'max_filtered_chars': self.pdf_max_filtered_chars,
+            'batch_workers': self.pdf_batch_workers,
+            'batch_timeout': self.pdf_batch_timeout,
+            'bill_tables': self.pdf_bill_tables,
+            'page_budget': self.pdf_page_budget,
+            'page_min_score': self.pdf_page_min_score,
+            'boilerplate_path': self.pdf_boilerplate_path,
+        }
+    
+    @staticmethod
+    def _split_list(value: str) -> list:
+        """解析逗号分隔的列表（兼容中文逗号）"""
+        return [item.strip() for item in value.replace('，', ',').split(',') if item.strip()]
+    
     def validate(self) -> bool:
         """验证配置是否有效"""
         try:
@@ -0,0 +1,208 @@
+"""
+关键信息扫描
+用一个预编译的正则一次扫描文本，得到手机号、长号码（业务编号）、金额、日期、时间及其位置；
+再用关键词自动机记录"办理""联系"等关键词的位置，按号码与关键词的距离区分业务号码和联系号码。
+同一段文本的扫描结果在进程内缓存（按文本摘要索引，缓存中不保留原文），附件分析、信息提取、审核各环节共用
+"""
+import hashlib
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from keyword_matcher import get_matcher
+
+# 关键信息类型
+ENTITY_PHONE = 'phone'
+ENTITY_NUMBER = 'number'
+ENTITY_AMOUNT = 'amount'
+ENTITY_DATE = 'date'
+ENTITY_TIME = 'time'
+
+# 长号码（业务编号、账号等）的位数范围，11位手机号同时计入
+LONG_NUMBER_DIGITS = (10, 15)
+
+# 独立的11位手机号（不从更长的数字串中截取），结构化输出校验号码时同样使用
+PHONE_REGEX = r'(?<!\d)1[3-9]\d{9}(?!\d)'
+PHONE_PATTERN = re.compile(PHONE_REGEX)
+
+# 各类信息合并为一个正则，在每个位置按手机号、日期、金额、时间、数字串的顺序尝试。
+# 独立的11位手机号最先尝试，后面紧跟"元"或金额关键词时仍识别为手机号而不是金额。
+# "XX元"金额的整数部分限制长度：逗号分隔的长数字串（1,1,1,...）中每个逗号后都是一个起点，
+# 不限长度时每个起点都扫描到串尾，整体为平方时间
+ENTITY_PATTERN = re.compile(
+    rf'(?P<phone>{PHONE_REGEX})'
+    r'|(?P<date>(?<!\d)\d{4}(?:[-年]\d{1,2}[-月]\d{1,2}[日号]?|\.\d{1,2}\.\d{1,2}|/\d{1,2}/\d{1,2}))'
+    r'|(?P<amount>(?:[¥￥]|人民币)\s*\d[\d,]*(?:\.\d+)?(?:\s*元)?|(?<![\d.])\d[\d,]{0,20}(?:\.\d+)?\s*元)'
+    r'|(?P<time>(?<!\d)\d{1,2}:\d{2}(?::\d{2})?(?!\d))'
+    r'|(?P<digits>\d+)'
+)
+
+# 号码角色关键词：号码前后 ROLE_KEYWORD_DISTANCE 个字符内（同一行）出现时确定角色
+BUSINESS_KEYWORDS = ('业务', '签约', '办理', '开通', '套餐')
+CONTACT_KEYWORDS = ('联系', '备用', '家人', '沟通')
+ROLE_BUSINESS = 'business'
+ROLE_CONTACT = 'contact'
+ROLE_KEYWORD_DISTANCE = 20
+
+# 扫描结果缓存的条目数
+SCAN_CACHE_SIZE = 256
+
+
+class Entity:
+    """一条关键信息"""
+
+    __slots__ = ('kind', 'text', 'start', 'end')
+
+    def __init__(self, kind: str, text: str, start: int, end: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Entity({self.kind}, {self.text!r}, {self.start}-{self.end})"
+
+
+class ScanResult:
+    """一段文本的扫描结果（只读，可在多个模块间共用；不保留原文）"""
+
+    def __init__(self, text: str):
+        entities = []
+        for match in ENTITY_PATTERN.finditer(text):
+            kind = match.lastgroup
+            value = match.group().strip()
+            if kind == 'digits':
+                if not LONG_NUMBER_DIGITS[0] <= len(value) <= LONG_NUMBER_DIGITS[1]:
+                    continue
+                kind = ENTITY_NUMBER
+            entities.append(Entity(kind, value, match.start(), match.end()))
+        self.entities: Tuple[Entity, ...] = tuple(entities)
+        # 号码角色判断所需的关键词位置和换行位置（没有手机号时不需要）
+        has_phone = any(entity.kind == ENTITY_PHONE for entity in entities)
+        self._role_index = self._build_role_index(text) if has_phone else {}
+        self._newlines = [i for i, char in enumerate(text) if char == '\n'] if has_phone else []
+
+    def values(self, kind: str) -> List[str]:
+        """某类信息的取值（按出现顺序去重）"""
+        return list(dict.fromkeys(entity.text for entity in self.entities if entity.kind == kind))
+
+    @property
+    def phones(self) -> List[str]:
+        """手机号（独立的11位号码，不从长数字串中截取）"""
+        return self.values(ENTITY_PHONE)
+
+    @property
+    def long_numbers(self) -> List[str]:
+        """10-15位的号码（业务编号、账号、手机号）"""
+        return list(dict.fromkeys(entity.text for entity in self.entities
+                                  if entity.kind in (ENTITY_PHONE, ENTITY_NUMBER)))
+
+    @property
+    def amounts(self) -> List[str]:
+        return self.values(ENTITY_AMOUNT)
+
+    @property
+    def dates(self) -> List[str]:
+        return self.values(ENTITY_DATE)
+
+    @property
+    def times(self) -> List[str]:
+        return self.values(ENTITY_TIME)
+
+    def count(self, *kinds: str) -> int:
+        """某几类信息的出现次数（不去重）"""
+        return sum(1 for entity in self.entities if entity.kind in kinds)
+
+    def classify_phones(self) -> Tuple[List[str], List[str]]:
+        """
+        区分业务号码和联系号码
+
+        号码任一次出现的前后（同一行）ROLE_KEYWORD_DISTANCE 字符内有业务关键词的为业务号码，
+        否则有联系关键词的为联系号码；都没有时，还没有业务号码则作为业务号码，否则作为联系号码
+
+        Returns:
+            (业务号码, 联系号码)
+        """
+        business, contact = [], []
+        occurrences: Dict[str, List[Entity]] = {}
+        for entity in self.entities:
+            if entity.kind == ENTITY_PHONE:
+                occurrences.setdefault(entity.text, []).append(entity)
+
+        for phone, entities in occurrences.items():
+            if any(self._near_keyword(entity, ROLE_BUSINESS) for entity in entities):
+                business.append(phone)
+            elif any(self._near_keyword(entity, ROLE_CONTACT) for entity in entities):
+                contact.append(phone)
+            elif not business:
+                business.append(phone)
+            else:
+                contact.append(phone)
+        return business, contact
+
+    def _near_keyword(self, entity: Entity, role: str) -> bool:
+        """号码前后是否有该角色的关键词（关键词与号码之间不超过距离且不跨行）"""
+        starts, ends = self._role_index[role]
+
+        # 号码之前：关键词结束位置在 [号码起点-距离, 号码起点]
+        left = bisect_left(ends, entity.start - ROLE_KEYWORD_DISTANCE)
+        right = bisect_right(ends, entity.start)
+        if any(self._same_line(ends[i], entity.start) for i in range(left, right)):
+            return True
+
+        # 号码之后：关键词起始位置在 [号码终点, 号码终点+距离]
+        left = bisect_left(starts, entity.end)
+        right = bisect_right(starts, entity.end + ROLE_KEYWORD_DISTANCE)
+        return any(self._same_line(entity.end, starts[i]) for i in range(left, right))
+
+    def _same_line(self, start: int, end: int) -> bool:
+        """文本区间 [start, end) 中没有换行"""
+        return bisect_left(self._newlines, start) == bisect_left(self._newlines, end)
+
+    @staticmethod
+    def _build_role_index(text: str) -> Dict[str, Tuple[List[int], List[int]]]:
+        """一次扫描得到各角色关键词的起止位置（分别排序，用于二分查找）"""
+        matcher = get_matcher({ROLE_BUSINESS: BUSINESS_KEYWORDS, ROLE_CONTACT: CONTACT_KEYWORDS})
+        positions: Dict[str, Tuple[List[int], List[int]]] = {ROLE_BUSINESS: ([], []), ROLE_CONTACT: ([], [])}
+        for start, keyword, role in matcher.find_all(text):
+            positions[role][0].append(start)
+            positions[role][1].append(start + len(keyword))
+        return {role: (sorted(starts), sorted(ends)) for role, (starts, ends) in positions.items()}
+
+
+_scan_cache: "OrderedDict[bytes, ScanResult]" = OrderedDict()
+_scan_cache_lock = threading.Lock()
+
+
+def scan(text: str) -> ScanResult:
+    """
+    扫描文本中的关键信息（同一文本只扫描一次，最近 SCAN_CACHE_SIZE 个结果按文本摘要缓存）
+
+    Args:
+        text: 识别内容或提取的文字
+
+    Returns:
+        ScanResult
+    """
+    text = text or ''
+    key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    with _scan_cache_lock:
+        result = _scan_cache.get(key)
+        if result is not None:
+            _scan_cache.move_to_end(key)
+            return result
+
+    result = ScanResult(text)
+    with _scan_cache_lock:
+        _scan_cache[key] = result
+        if len(_scan_cache) > SCAN_CACHE_SIZE:
+            _scan_cache.popitem(last=False)
+    return result
+
+
+def clear_scan_cache():
+    """清空扫描结果缓存（基准测试中使每次计时都实际扫描）"""
+    with _scan_cache_lock:
+        _scan_cache.clear()
@@ -0,0 +1,118 @@
+"""
+图片预处理器
+在上传视觉模型之前对图片做规范化：限制长边、修正EXIF方向、重新编码压缩，
+可选将纯文字截图转为灰度，以减小请求体积
+"""
+import io
+from typing import Dict, Any, Tuple
+from PIL import Image, ImageOps, ImageStat
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePreprocessor:
+    """图片规范化处理器"""
+
+    # 判定为纯文字截图的饱和度均值阈值（0-255）
+    GRAYSCALE_SATURATION_THRESHOLD = 18
+
+    # EXIF方向标签
+    EXIF_ORIENTATION = 0x0112
+
+    def __init__(self,
+                 max_long_edge: int = 2048,
+                 jpeg_quality: int = 85,
+                 grayscale_screenshots: bool = False):
+        """
+        初始化预处理器
+
+        Args:
+            max_long_edge: 长边像素上限，超出时等比缩小
+            jpeg_quality: 重新编码的JPEG质量（1-95）
+            grayscale_screenshots: 是否将低饱和度的文字截图转为灰度
+        """
+        self.max_long_edge = max_long_edge
+        self.jpeg_quality = jpeg_quality
+        self.grayscale_screenshots = grayscale_screenshots
+
+    @property
+    def signature(self) -> str:
+        """预处理参数签名（参数变化会影响识别输入，用于区分缓存）"""
+        return f"edge{self.max_long_edge}-q{self.jpeg_quality}-gray{int(self.grayscale_screenshots)}"
+
+    def normalize(self, image_data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        规范化图片
+
+        Args:
+            image_data: 原始图片二进制数据
+
+        Returns:
+            (规范化后的图片数据, 处理统计)；若处理后没有变小且无需旋转缩放，返回原始数据
+        """
+        img = Image.open(io.BytesIO(image_data))
+        original_format = img.format
+        original_size = img.size
+
+        # JPEG草稿模式：解码时直接按2的幂缩小，大图解码更快、占用内存更少
+        if img.format == 'JPEG' and max(img.size) > self.max_long_edge:
+            scale = self.max_long_edge / max(img.size)
+            img.draft('RGB', (int(img.width * scale), int(img.height * scale)))
+
+        # 按EXIF方向信息旋转（手机拍照常见）
+        rotated = img.getexif().get(self.EXIF_ORIENTATION, 1) != 1
+        if rotated:
+            img = ImageOps.exif_transpose(img)
+
+        img = self._to_rgb(img)
+
+        resized = max(img.size) > self.max_long_edge
+        if resized:
+            img.thumbnail((self.max_long_edge, self.max_long_edge), Image.LANCZOS)
+
+        grayscale = self.grayscale_screenshots and self._is_text_screenshot(img)
+        if grayscale:
+            img = img.convert('L')
+
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+        normalized = buffer.getvalue()
+
+        # 没有缩放/旋转且重新编码后反而更大（如已压缩过的小图），保留原图
+        if not resized and not rotated and len(normalized) >= len(image_data) \
+                and original_format in ('JPEG', 'PNG'):
+            normalized = image_data
+            grayscale = False
+
+        stats = {
+            'original_format': original_format,
+            'original_size': list(original_size),
+            'normalized_size': list(img.size),
+            'original_bytes': len(image_data),
+            'normalized_bytes': len(normalized),
+            'saved_bytes': len(image_data) - len(normalized),
+            'resized': resized,
+            'rotated': rotated,
+            'grayscale': grayscale,
+        }
+
+        return normalized, stats
+
+    def _to_rgb(self, img: Image.Image) -> Image.Image:
+        """转换为RGB模式（透明背景填充为白色）"""
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            return background
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        return img
+
+    def _is_text_screenshot(self, img: Image.Image) -> bool:
+        """判断是否为低饱和度的文字截图（在缩略图上计算饱和度均值）"""
+        small = img.copy()
+        small.thumbnail((128, 128))
+        saturation = small.convert('HSV').getchannel('S')
+        return ImageStat.Stat(saturation).mean[0] < self.GRAYSCALE_SATURATION_THRESHOLD
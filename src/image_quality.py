@@ -0,0 +1,164 @@
+"""
+图片质量预检
+在调用视觉模型之前，用缩小后的灰度像素数组快速判断空白、过暗、模糊的图片，
+并计算差值哈希用于识别PDF中的重复页面（每张图片耗时约数毫秒）
+"""
+import io
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from phash_index import dhash, hamming_distances
+
+# 预检使用的长边像素（JPEG草稿模式可直接按此尺寸解码）
+ANALYSIS_LONG_EDGE = 320
+
+# 质量状态
+STATUS_OK = 'ok'
+STATUS_BLANK = 'blank'
+STATUS_DARK = 'dark'
+STATUS_BLURRY = 'blurry'
+
+# 重复页判定：dHash汉明距离不超过该值，且缩略图平均灰度差不超过 DUPLICATE_MAX_PIXEL_DIFF
+# （同一模板的不同页面dHash可能很接近，需再比较像素确认）
+DUPLICATE_MAX_DISTANCE = 2
+DUPLICATE_MAX_PIXEL_DIFF = 3.0
+
+STATUS_NAMES = {
+    STATUS_OK: '正常',
+    STATUS_BLANK: '空白',
+    STATUS_DARK: '过暗',
+    STATUS_BLURRY: '模糊',
+}
+
+
+class ImageSkipped(Exception):
+    """图片质量不足，跳过识别"""
+
+    def __init__(self, quality: Dict[str, Any]):
+        self.quality = quality
+        super().__init__(f"图片质量不足，跳过识别（{STATUS_NAMES.get(quality['status'], quality['status'])}）")
+
+
+class ImageQualityChecker:
+    """图片质量预检"""
+
+    def __init__(self,
+                 blur_threshold: float = 50,
+                 blank_std_threshold: float = 4,
+                 blank_dominant_ratio: float = 0.995,
+                 dark_mean_threshold: float = 25,
+                 skip_blurry: bool = False):
+        """
+        初始化
+
+        Args:
+            blur_threshold: 拉普拉斯方差低于该值视为模糊（在320像素长边的灰度图上计算）
+            blank_std_threshold: 灰度标准差低于该值视为空白
+            blank_dominant_ratio: 灰度直方图中最大的分桶占比超过该值视为空白
+            dark_mean_threshold: 平均灰度低于该值且没有明亮内容时视为过暗
+            skip_blurry: 模糊图片是否跳过识别（否则只标记为低质量）
+        """
+        self.blur_threshold = blur_threshold
+        self.blank_std_threshold = blank_std_threshold
+        self.blank_dominant_ratio = blank_dominant_ratio
+        self.dark_mean_threshold = dark_mean_threshold
+        self.skip_blurry = skip_blurry
+
+    def check(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        检查图片质量
+
+        Args:
+            image_data: 图片二进制数据
+
+        Returns:
+            status（ok/blank/dark/blurry）、skip（是否跳过识别）、low_quality、
+            各项指标（blur_score、mean、std、dominant_ratio）和 hash（差值哈希）
+        """
+        return self.analyze(image_data)[0]
+
+    def analyze(self, image_data: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+        """检查图片质量，同时返回分析用的灰度缩略图（用于重复页比较）"""
+        with Image.open(io.BytesIO(image_data)) as img:
+            img.draft('L', (ANALYSIS_LONG_EDGE, ANALYSIS_LONG_EDGE))
+            gray = img.convert('L')
+        gray.thumbnail((ANALYSIS_LONG_EDGE, ANALYSIS_LONG_EDGE), Image.BILINEAR)
+
+        pixels = np.asarray(gray, dtype=np.float32)
+        mean = float(pixels.mean())
+        std = float(pixels.std())
+        # 32个灰度分桶中最大分桶的占比
+        histogram = np.bincount((pixels.astype(np.uint8) >> 3).ravel(), minlength=32)
+        dominant_ratio = float(histogram.max() / pixels.size)
+        blur_score = self._laplacian_variance(pixels)
+
+        if std < self.blank_std_threshold or dominant_ratio > self.blank_dominant_ratio:
+            status = STATUS_DARK if mean < self.dark_mean_threshold else STATUS_BLANK
+        elif mean < self.dark_mean_threshold and np.percentile(pixels, 99) < 3 * self.dark_mean_threshold:
+            status = STATUS_DARK
+        elif blur_score < self.blur_threshold:
+            status = STATUS_BLURRY
+        else:
+            status = STATUS_OK
+
+        skip = status in (STATUS_BLANK, STATUS_DARK) or (status == STATUS_BLURRY and self.skip_blurry)
+        quality = {
+            'status': status,
+            'skip': skip,
+            'low_quality': status != STATUS_OK,
+            'blur_score': round(blur_score, 1),
+            'mean': round(mean, 1),
+            'std': round(std, 1),
+            'dominant_ratio': round(dominant_ratio, 3),
+            'hash': dhash(gray),
+        }
+        return quality, pixels
+
+    @staticmethod
+    def _laplacian_variance(pixels: np.ndarray) -> float:
+        """4邻域拉普拉斯算子响应的方差（越小越模糊）"""
+        if min(pixels.shape) < 3:
+            return 0.0
+        laplacian = (pixels[1:-1, :-2] + pixels[1:-1, 2:] + pixels[:-2, 1:-1] + pixels[2:, 1:-1]
+                     - 4 * pixels[1:-1, 1:-1])
+        return float(laplacian.var())
+
+
+class DuplicatePageTracker:
+    """记录同一文档中已出现的页面，识别内容相同的重复页（如重复扫描、重复插入的页面）"""
+
+    def __init__(self,
+                 max_distance: int = DUPLICATE_MAX_DISTANCE,
+                 max_pixel_diff: float = DUPLICATE_MAX_PIXEL_DIFF):
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._pages: List[Tuple[int, np.ndarray]] = []
+        self._lock = threading.Lock()
+
+    def match(self, page_number: int, image_hash: int, pixels: np.ndarray) -> Optional[int]:
+        """
+        查找与当前页重复的已出现页面；不重复时记录当前页
+
+        Args:
+            page_number: 当前页码
+            image_hash: 当前页的dHash
+            pixels: 当前页的分析缩略图
+
+        Returns:
+            重复时返回已出现页面的页码，否则返回None
+        """
+        with self._lock:
+            if len(self._hashes):
+                distances = hamming_distances(self._hashes, image_hash)
+                for index in np.flatnonzero(distances <= self.max_distance).tolist():
+                    seen_page, seen_pixels = self._pages[index]
+                    if seen_pixels.shape == pixels.shape \
+                            and float(np.abs(seen_pixels - pixels).mean()) <= self.max_pixel_diff:
+                        return seen_page
+            self._hashes = np.append(self._hashes, np.uint64(image_hash))
+            self._pages.append((page_number, pixels))
+            return None
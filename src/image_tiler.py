@@ -0,0 +1,178 @@
+"""
+长截图分块
+微信聊天、月度账单等长截图的长宽比远超视觉模型的像素限制，整图上传会被缩小到文字无法辨认。
+沿长边切分为相互重叠的分块分别识别，再按顺序合并文字并去掉重叠部分的重复行
+"""
+import io
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# 分块识别结果中的内容类型标记
+TILE_TYPE_PATTERN = re.compile(r'^\s*【([^】]{1,30})】\s*$')
+
+DIGITS_PATTERN = re.compile(r'\d+')
+
+
+class ImageTiler:
+    """长截图分块与分块识别结果合并"""
+
+    # 合并时在前一块末尾、后一块开头查找重叠行的最大行数
+    MAX_OVERLAP_LINES = 20
+
+    # 至少连续这么多行相同才视为重叠（账单中重复的表头、小计行单独出现时不去重）
+    MIN_OVERLAP_LINES = 2
+
+    # 两行文字视为同一行的最低相似度（重叠区域的文字可能被模型识别得略有差异）
+    LINE_SIMILARITY = 0.85
+
+    def __init__(self,
+                 max_aspect_ratio: float = 3.0,
+                 tile_aspect_ratio: float = 1.5,
+                 overlap_ratio: float = 0.1):
+        """
+        初始化
+
+        Args:
+            max_aspect_ratio: 长边与短边之比超过该值时分块
+            tile_aspect_ratio: 每个分块的长短边之比
+            overlap_ratio: 相邻分块的重叠比例（相对分块长度，避免文字行被切断后丢失）
+        """
+        self.max_aspect_ratio = max_aspect_ratio
+        self.tile_aspect_ratio = tile_aspect_ratio
+        self.overlap_ratio = overlap_ratio
+
+    @property
+    def signature(self) -> str:
+        """分块参数签名（参数变化会影响识别结果，用于区分缓存）"""
+        return f"tile{self.max_aspect_ratio}-{self.tile_aspect_ratio}-{self.overlap_ratio}"
+
+    def needs_tiling(self, width: int, height: int) -> bool:
+        """判断该尺寸的图片是否需要分块"""
+        short_edge = min(width, height)
+        return short_edge > 0 and max(width, height) / short_edge > self.max_aspect_ratio
+
+    def tile_ranges(self, length: int, short_edge: int) -> List[Tuple[int, int]]:
+        """
+        计算沿长边的分块区间
+
+        Args:
+            length: 长边像素
+            short_edge: 短边像素
+
+        Returns:
+            [(起点, 终点)]，相邻区间按 overlap_ratio 重叠，各分块长度相同
+        """
+        tile_length = max(1, int(short_edge * self.tile_aspect_ratio))
+        overlap = int(tile_length * self.overlap_ratio)
+        step = max(1, tile_length - overlap)
+        count = max(1, -(-(length - overlap) // step))
+        if count == 1:
+            return [(0, length)]
+        # 均分步长，使最后一块不会过短
+        step = (length - tile_length) / (count - 1)
+        return [(round(i * step), round(i * step) + tile_length) for i in range(count)]
+
+    def split(self, image_data: bytes) -> Optional[List[bytes]]:
+        """
+        将长截图切分为重叠的分块
+
+        Args:
+            image_data: 图片二进制数据
+
+        Returns:
+            按从上到下（从左到右）顺序的分块图片数据；无需分块时返回None
+        """
+        with Image.open(io.BytesIO(image_data)) as img:
+            # 只读取文件头判断尺寸，普通图片不解码像素
+            if not self.needs_tiling(*img.size):
+                return None
+            source_format = img.format
+            image = ImageOps.exif_transpose(img)
+            image.load()
+
+        width, height = image.size
+        vertical = height >= width
+
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        tiles = []
+        for start, end in self.tile_ranges(max(width, height), min(width, height)):
+            box = (0, start, width, end) if vertical else (start, 0, end, height)
+            buffer = io.BytesIO()
+            if source_format == 'PNG':
+                image.crop(box).save(buffer, format='PNG')
+            else:
+                image.crop(box).save(buffer, format='JPEG', quality=95)
+            tiles.append(buffer.getvalue())
+        return tiles
+
+    @classmethod
+    def merge(cls, texts: List[str]) -> Tuple[Optional[str], str]:
+        """
+        合并各分块的识别结果
+
+        Args:
+            texts: 按顺序的分块识别文本（首行可为【类型】标记）
+
+        Returns:
+            (出现最多的内容类型，没有标记时为None, 去掉重叠重复行后的合并文本)
+        """
+        types: List[str] = []
+        merged: List[str] = []
+
+        for text in texts:
+            lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+            if lines:
+                match = TILE_TYPE_PATTERN.match(lines[0])
+                if match:
+                    types.append(match.group(1))
+                    lines = lines[1:]
+            if merged:
+                lines = lines[cls._overlap_length(merged[-cls.MAX_OVERLAP_LINES:], lines):]
+            merged.extend(lines)
+
+        content_type = max(types, key=types.count) if types else None
+        return content_type, '\n'.join(merged)
+
+    @classmethod
+    def _overlap_length(cls, tail: List[str], head: List[str]) -> int:
+        """
+        计算后一块开头与前一块末尾重复的行数（至少 MIN_OVERLAP_LINES 行）
+
+        后一块的第一行是被切断的残行时（是前一块中对应行的片段），与其后的重复行一并去掉
+        """
+        best = 0
+        for k in range(cls.MIN_OVERLAP_LINES, min(len(tail), len(head)) + 1):
+            if all(cls._same_line(a, b) for a, b in zip(tail[-k:], head[:k])):
+                best = k
+        for k in range(cls.MIN_OVERLAP_LINES, min(len(tail) - 1, len(head) - 1) + 1):
+            if cls._is_fragment(head[0], tail[-k - 1]) \
+                    and all(cls._same_line(a, b) for a, b in zip(tail[-k:], head[1:k + 1])):
+                best = max(best, k + 1)
+        return best
+
+    @classmethod
+    def _is_fragment(cls, fragment: str, line: str) -> bool:
+        """判断 fragment 是否为 line 被切断后残留的一部分（较短，且绝大部分文字出现在 line 中）"""
+        fragment = ''.join(fragment.split())
+        line = ''.join(line.split())
+        if not fragment or len(fragment) >= len(line):
+            return False
+        blocks = SequenceMatcher(None, fragment, line, autojunk=False).get_matching_blocks()
+        matched = sum(block.size for block in blocks)
+        return matched / len(fragment) >= cls.LINE_SIMILARITY
+
+    @classmethod
+    def _same_line(cls, a: str, b: str) -> bool:
+        """判断两行是否为同一行文字：数字必须完全一致（账单各行往往只有金额、日期不同），其余文字允许少量差异"""
+        a = ''.join(a.split())
+        b = ''.join(b.split())
+        if a == b:
+            return True
+        if DIGITS_PATTERN.findall(a) != DIGITS_PATTERN.findall(b):
+            return False
+        return SequenceMatcher(None, a, b, autojunk=False).ratio() >= cls.LINE_SIMILARITY
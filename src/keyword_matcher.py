@@ -0,0 +1,185 @@
+"""
+多关键词匹配（Aho-Corasick自动机）
+将多组关键词预编译为一个自动机，一次扫描文本即可得到所有命中的关键词、类别和位置，
+耗时与文本长度成正比，与关键词数量无关。
+自动机逐字符推进是纯Python循环，关键词较少时不如逐个关键词的子串查找（C实现）快，
+get_matcher 按关键词数量选择两者之一
+"""
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# 关键词总数达到该值时使用自动机，否则逐个关键词做子串查找
+AUTOMATON_MIN_KEYWORDS = 150
+
+
+class KeywordMatcher:
+    """按类别分组的多关键词匹配器"""
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        """
+        构建自动机
+
+        Args:
+            groups: {类别: 关键词列表}，同一关键词可属于多个类别
+        """
+        # 每个状态：字符转移表、失败转移、以该状态结尾的 (关键词, 类别)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[Tuple[str, str], ...]] = [()]
+        self._categories: List[FrozenSet[str]] = [frozenset()]
+
+        pending: Dict[int, Set[Tuple[str, str]]] = {}
+        for category, keywords in groups.items():
+            for keyword in keywords:
+                if keyword:
+                    pending.setdefault(self._insert(keyword), set()).add((keyword, category))
+        for state, outputs in pending.items():
+            self._outputs[state] = tuple(sorted(outputs))
+
+        self._build_failure_links()
+        self._categories = [frozenset(category for _, category in outputs) for outputs in self._outputs]
+        # 出现在关键词中的全部字符，其他字符直接回到根状态
+        self._alphabet = frozenset(ch for transitions in self._goto for ch in transitions)
+
+    def _insert(self, keyword: str) -> int:
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        return state
+
+    def _build_failure_links(self):
+        """按广度优先计算失败转移，并把失败链上的输出合并到当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def _states(self, text: str) -> Iterator[Tuple[int, int]]:
+        """逐字符推进自动机，产出 (字符位置, 有输出的状态)"""
+        goto, fail, alphabet, outputs = self._goto, self._fail, self._alphabet, self._outputs
+        state = 0
+        for index, ch in enumerate(text):
+            if ch not in alphabet:
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                yield index, state
+
+    def categories(self, text: str, stop_on: Optional[str] = None) -> Set[str]:
+        """
+        返回文本命中的关键词类别
+
+        Args:
+            text: 文本
+            stop_on: 命中该类别后立即停止扫描（只关心是否命中时使用）
+
+        Returns:
+            命中的类别集合
+        """
+        found: Set[str] = set()
+        for _, state in self._states(text):
+            found |= self._categories[state]
+            if stop_on is not None and stop_on in found:
+                break
+        return found
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """
+        查找全部命中（含重叠的关键词）
+
+        Returns:
+            [(起始位置, 关键词, 类别)]，按结束位置排序
+        """
+        matches = []
+        for index, state in self._states(text):
+            for keyword, category in self._outputs[state]:
+                matches.append((index - len(keyword) + 1, keyword, category))
+        return matches
+
+
+class SubstringMatcher:
+    """关键词较少时使用的匹配器：逐个关键词做子串查找，接口和结果与 KeywordMatcher 相同"""
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        """
+        Args:
+            groups: {类别: 关键词列表}，同一关键词可属于多个类别
+        """
+        self._groups: Dict[str, Tuple[str, ...]] = {}
+        for category, keywords in groups.items():
+            merged = self._groups.get(category, ()) + tuple(keyword for keyword in keywords if keyword)
+            self._groups[category] = tuple(dict.fromkeys(merged))
+
+    def categories(self, text: str, stop_on: Optional[str] = None) -> Set[str]:
+        """
+        返回文本命中的关键词类别
+
+        Args:
+            text: 文本
+            stop_on: 先检查该类别，命中后不再检查其他类别（只关心是否命中时使用）
+
+        Returns:
+            命中的类别集合
+        """
+        if stop_on is not None and any(keyword in text for keyword in self._groups.get(stop_on, ())):
+            return {stop_on}
+        return {category for category, keywords in self._groups.items()
+                if category != stop_on and any(keyword in text for keyword in keywords)}
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """
+        查找全部命中（含重叠的关键词）
+
+        Returns:
+            [(起始位置, 关键词, 类别)]，按结束位置排序（与 KeywordMatcher.find_all 顺序一致）
+        """
+        matches = []
+        for category, keywords in self._groups.items():
+            for keyword in keywords:
+                start = text.find(keyword)
+                while start >= 0:
+                    matches.append((start, keyword, category))
+                    start = text.find(keyword, start + 1)
+        matches.sort(key=lambda match: (match[0] + len(match[1]), -len(match[1]), match[1], match[2]))
+        return matches
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(groups: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Union[KeywordMatcher, SubstringMatcher]:
+    keyword_count = len({keyword for _, keywords in groups for keyword in keywords if keyword})
+    if keyword_count >= AUTOMATON_MIN_KEYWORDS:
+        return KeywordMatcher(dict(groups))
+    return SubstringMatcher(dict(groups))
+
+
+def get_matcher(groups: Dict[str, Iterable[str]]) -> Union[KeywordMatcher, SubstringMatcher]:
+    """
+    获取关键词匹配器（相同的关键词配置在进程内只构建一次）
+
+    关键词总数达到 AUTOMATON_MIN_KEYWORDS 时构建自动机，否则使用逐个子串查找
+
+    Args:
+        groups: {类别: 关键词列表}
+
+    Returns:
+        KeywordMatcher 或 SubstringMatcher
+    """
+    return _cached_matcher(tuple((category, tuple(keywords)) for category, keywords in groups.items()))
@@ -3,17 +3,29 @@ OCR处理模块：处理PDF和图片文件，提取文本内容
 """
 import os
 import json
+import queue
+import threading
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 import fitz  # PyMuPDF
 from PIL import Image
 import pytesseract
-from pdf2image import convert_from_path
 from tqdm import tqdm
 import logging
 
+from page_router import OCR_DPI, ROUTE_OCR, ROUTE_TEXT, route_page
+
 logger = logging.getLogger(__name__)
 
+# OCR页面预渲染的页数：渲染线程最多领先识别这么多页，内存中同时最多保留 OCR_PREFETCH_PAGES+1 页图片
+OCR_PREFETCH_PAGES = 2
+
+# 渲染线程等待队列空位时检查是否已停止的间隔（秒）
+RENDER_PUT_TIMEOUT = 0.5
+
+# 每页OCR完成时的回调 (已完成页数, 需OCR的页数, 页面结果)
+PageCallback = Callable[[int, int, Dict[str, Any]], None]
+
 
 class OCRProcessor:
     """OCR处理器，支持PDF和图片文件"""
@@ -32,12 +44,13 @@ class OCRProcessor:
         self.supported_image_formats = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif'}
         self.supported_pdf_format = '.pdf'
     
-    def process_file(self, file_path: str) -> Dict[str, Any]:
+    def process_file(self, file_path: str, page_callback: Optional[PageCallback] = None) -> Dict[str, Any]:
         """
         处理单个文件（PDF或图片）
         
         Args:
             file_path: 文件路径
+            page_callback: PDF每页OCR完成时的回调 (已完成页数, 需OCR的页数, 页面结果)
             
         Returns:
             包含文件信息和提取文本的字典
@@ -60,7 +73,7 @@ class OCRProcessor:
         
         try:
             if file_ext == self.supported_pdf_format:
-                result = self._process_pdf(file_path, result)
+                result = self._process_pdf(file_path, result, page_callback)
             elif file_ext in self.supported_image_formats:
                 result = self._process_image(file_path, result)
             else:
@@ -73,79 +86,129 @@ class OCRProcessor:
         
         return result
     
-    def _process_pdf(self, file_path: Path, result: Dict) -> Dict:
-        """处理PDF文件"""
+    def _process_pdf(self, file_path: Path, result: Dict, page_callback: Optional[PageCallback] = None) -> Dict:
+        """处理PDF文件（逐页判断：有文字层的页面直接提取，图片页使用OCR）"""
         logger.info(f"处理PDF文件: {file_path.name}")
         
-        # 首先尝试直接提取文本（对于可搜索的PDF）
         doc = fitz.open(file_path)
         result["metadata"]["total_pages"] = len(doc)
         
-        all_text = []
-        has_text = False
+        ocr_pages = []
+        page_routes = []
         
         for page_num in range(len(doc)):
             page = doc[page_num]
-            text = page.get_text()
+            decision = route_page(page, image_route=ROUTE_OCR)
+            decision["page"] = page_num + 1
+            page_routes.append(decision)
             
             page_data = {
                 "page_number": page_num + 1,
-                "text": text.strip(),
+                "text": "",
                 "method": "direct_extraction"
             }
             
-            if text.strip():
-                has_text = True
-                all_text.append(text)
-                result["pages"].append(page_data)
+            if decision["route"] == ROUTE_TEXT:
+                page_data["text"] = page.get_text().strip()
             else:
-                # 如果没有文本，标记需要OCR
+                # 图片页标记需要OCR
                 page_data["needs_ocr"] = True
-                result["pages"].append(page_data)
+                ocr_pages.append(page_num + 1)
+            result["pages"].append(page_data)
         
         doc.close()
+        result["metadata"]["page_routes"] = page_routes
         
-        # 如果PDF没有可提取的文本，使用OCR
-        if not has_text:
-            logger.info(f"PDF无可提取文本，使用OCR: {file_path.name}")
-            result = self._ocr_pdf(file_path, result)
-        else:
-            result["content"] = "\n\n".join(all_text)
+        if ocr_pages:
+            logger.info(f"PDF共{len(ocr_pages)}页需要OCR: {file_path.name}")
+            result = self._ocr_pdf(file_path, result, ocr_pages, page_callback)
+        
+        result["content"] = "\n\n".join(page["text"] for page in result["pages"] if page["text"])
+        if not ocr_pages:
             result["metadata"]["extraction_method"] = "direct"
+        elif len(ocr_pages) == len(result["pages"]):
+            result["metadata"]["extraction_method"] = "ocr"
+        else:
+            result["metadata"]["extraction_method"] = "mixed"
         
         return result
     
-    def _ocr_pdf(self, file_path: Path, result: Dict) -> Dict:
-        """对PDF进行OCR识别"""
+    def _ocr_pdf(self, file_path: Path, result: Dict, page_numbers: List[int],
+                 page_callback: Optional[PageCallback] = None) -> Dict:
+        """
+        对PDF的指定页面进行OCR识别
+        
+        后台线程用PyMuPDF逐页渲染为灰度图，第一页渲染完即开始识别，识别当前页时渲染后续页面；
+        渲染线程最多领先 OCR_PREFETCH_PAGES 页，识别完的页面图片随即释放，内存占用与页数无关
+        """
+        pages: queue.Queue = queue.Queue(maxsize=OCR_PREFETCH_PAGES)
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            """放入队列；识别已停止（出错）时放弃，避免渲染线程一直阻塞"""
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=RENDER_PUT_TIMEOUT)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def render():
+            try:
+                with fitz.open(file_path) as doc:
+                    for page_number in page_numbers:
+                        pix = doc[page_number - 1].get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY)
+                        image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+                        del pix
+                        if not put((page_number, image)):
+                            return
+            except Exception as e:
+                put(e)
+        
+        renderer = threading.Thread(target=render, name="ocr-pdf-render", daemon=True)
+        renderer.start()
+        
+        total = len(page_numbers)
         try:
-            # 将PDF转换为图片
-            images = convert_from_path(str(file_path), dpi=300)
-            
-            all_text = []
-            for i, image in enumerate(tqdm(images, desc=f"OCR处理 {file_path.name}")):
-                text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-                all_text.append(text)
+            for done in tqdm(range(1, total + 1), desc=f"OCR处理 {file_path.name}"):
+                item = pages.get()
+                if isinstance(item, Exception):
+                    raise item
+                page_number, image = item
+                with image:
+                    text = self.ocr_image(image)
                 
-                # 更新页面数据
-                if i < len(result["pages"]):
-                    result["pages"][i]["text"] = text.strip()
-                    result["pages"][i]["method"] = "ocr"
-                else:
-                    result["pages"].append({
-                        "page_number": i + 1,
-                        "text": text.strip(),
-                        "method": "ocr"
-                    })
-            
-            result["content"] = "\n\n".join(all_text)
-            result["metadata"]["extraction_method"] = "ocr"
+                page_data = result["pages"][page_number - 1]
+                page_data["text"] = text
+                page_data["method"] = "ocr"
+                page_data.pop("needs_ocr", None)
+                logger.debug(f"OCR进度 {file_path.name}: {done}/{total}（第{page_number}页）")
+                if page_callback:
+                    page_callback(done, total, page_data)
             
         except Exception as e:
             logger.error(f"OCR处理PDF失败: {str(e)}")
             result["error"] = f"OCR失败: {str(e)}"
         
+        finally:
+            stop.set()
+            renderer.join()
+        
         return result
     
+    def ocr_image(self, image: Image.Image) -> str:
+        """
+        识别单张图片中的文字
+        
+        Args:
+            image: PIL图片
+            
+        Returns:
+            识别的文本
+        """
+        return pytesseract.image_to_string(image, lang='chi_sim+eng').strip()
+    
     def _process_image(self, file_path: Path, result: Dict) -> Dict:
         """处理图片文件"""
         logger.info(f"处理图片文件: {file_path.name}")
@@ -158,12 +221,12 @@ class OCRProcessor:
             result["metadata"]["image_mode"] = image.mode
             
             # OCR识别
-            text = pytesseract.image_to_string(image, lang='chi_sim+eng')
+            text = self.ocr_image(image)
             
-            result["content"] = text.strip()
+            result["content"] = text
             result["pages"] = [{
                 "page_number": 1,
-                "text": text.strip(),
+                "text": text,
                 "method": "ocr"
             }]
             result["metadata"]["extraction_method"] = "ocr"
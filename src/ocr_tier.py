@@ -0,0 +1,151 @@
+"""
+OCR优先的分级识别
+先用本地Tesseract识别并读取逐词置信度，置信度和关键信息数量达标时直接采用，
+否则交给视觉大模型（清晰的高对比度截图无需调用视觉模型）
+"""
+import io
+import os
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from PIL import Image, ImageOps
+import pytesseract
+
+from entity_scanner import scan, ENTITY_PHONE, ENTITY_AMOUNT, ENTITY_DATE
+
+logger = logging.getLogger(__name__)
+
+
+class OCRTier:
+    """OCR识别层：识别成功且质量达标时返回文本，否则返回None由视觉模型接手"""
+
+    # 低于该宽度的图片放大后再识别（Tesseract对小字号效果较差）
+    MIN_OCR_WIDTH = 1000
+
+    # 置信度低于该值的词计为低置信度
+    LOW_WORD_CONFIDENCE = 60
+
+    def __init__(self,
+                 min_confidence: float = 85,
+                 max_low_conf_ratio: float = 0.15,
+                 min_entities: int = 1,
+                 min_words: int = 10,
+                 lang: str = 'chi_sim+eng',
+                 tesseract_path: Optional[str] = None):
+        """
+        初始化
+
+        Args:
+            min_confidence: 采用OCR结果所需的平均置信度（0-100，按字符数加权）
+            max_low_conf_ratio: 低置信度字符占比上限
+            min_entities: 采用OCR结果所需的最少关键信息数（手机号、金额、日期）
+            min_words: 采用OCR结果所需的最少识别词数
+            lang: Tesseract语言
+            tesseract_path: Tesseract可执行文件路径（Windows需要）
+        """
+        if tesseract_path and os.path.exists(tesseract_path):
+            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+        self.min_confidence = min_confidence
+        self.max_low_conf_ratio = max_low_conf_ratio
+        self.min_entities = min_entities
+        self.min_words = min_words
+        self.lang = lang
+        self.available = True
+        self._lock = threading.Lock()
+
+    def recognize(self, image_data: bytes) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        用OCR识别图片并评估质量
+
+        Args:
+            image_data: 图片二进制数据
+
+        Returns:
+            (识别文本，质量不达标时为None, 质量统计)
+        """
+        if not self.available:
+            return None, {'accepted': False, 'reason': 'Tesseract不可用'}
+
+        try:
+            with Image.open(io.BytesIO(image_data)) as img:
+                image = self._prepare(img)
+            data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractNotFoundError:
+            with self._lock:
+                if self.available:
+                    logger.warning("未找到Tesseract，OCR优先识别已停用，全部使用视觉模型")
+                self.available = False
+            return None, {'accepted': False, 'reason': 'Tesseract不可用'}
+        except Exception as e:
+            logger.warning(f"OCR识别失败，改用视觉模型: {e}")
+            return None, {'accepted': False, 'reason': f'OCR失败: {e}'}
+
+        text, stats = self._evaluate(data)
+        return (text if stats['accepted'] else None), stats
+
+    def _prepare(self, img: Image.Image) -> Image.Image:
+        """转为灰度，小图放大"""
+        img = ImageOps.exif_transpose(img).convert('L')
+        if img.width < self.MIN_OCR_WIDTH:
+            scale = self.MIN_OCR_WIDTH / img.width
+            img = img.resize((self.MIN_OCR_WIDTH, int(img.height * scale)), Image.LANCZOS)
+        return img
+
+    def _evaluate(self, data: Dict[str, List]) -> Tuple[str, Dict[str, Any]]:
+        """由 image_to_data 的逐词结果拼接文本并计算置信度统计"""
+        lines: Dict[Tuple[int, int, int], List[str]] = {}
+        total_chars = 0
+        weighted_conf = 0.0
+        low_chars = 0
+        words = 0
+
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            conf = float(data['conf'][i])
+            if not word or conf < 0:
+                continue
+            words += 1
+            total_chars += len(word)
+            weighted_conf += conf * len(word)
+            if conf < self.LOW_WORD_CONFIDENCE:
+                low_chars += len(word)
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+
+        text = '\n'.join(self._join_words(lines[key]) for key in sorted(lines))
+        # 关键信息：手机号、金额、日期
+        entities = scan(text).count(ENTITY_PHONE, ENTITY_AMOUNT, ENTITY_DATE)
+        confidence = weighted_conf / total_chars if total_chars else 0.0
+        low_ratio = low_chars / total_chars if total_chars else 1.0
+
+        if words < self.min_words:
+            reason = f'识别词数过少（{words}）'
+        elif confidence < self.min_confidence:
+            reason = f'平均置信度过低（{confidence:.1f}）'
+        elif low_ratio > self.max_low_conf_ratio:
+            reason = f'低置信度文字占比过高（{low_ratio:.0%}）'
+        elif entities < self.min_entities:
+            reason = f'关键信息过少（{entities}）'
+        else:
+            reason = ''
+
+        return text, {
+            'accepted': not reason,
+            'reason': reason or '质量达标',
+            'confidence': round(confidence, 1),
+            'low_conf_ratio': round(low_ratio, 3),
+            'words': words,
+            'entities': entities,
+        }
+
+    @staticmethod
+    def _join_words(words: List[str]) -> str:
+        """拼接一行中的词：中文之间不加空格，西文和数字之间保留空格"""
+        line = words[0]
+        for word in words[1:]:
+            if line[-1].isascii() and line[-1].isalnum() and word[0].isascii() and word[0].isalnum():
+                line += ' '
+            line += word
+        return line
@@ -0,0 +1,139 @@
+"""
+PDF页面相关性评分与抽样
+协议类PDF大部分页面是条款模板，只有少数页面有业务数据（号码、金额、签名、费用表）。
+按文字层的关键信息密度和模板行占比为每页打分，只处理有业务数据的页面，
+并可限制每个文件处理的页数，使长文件与短文件的识别成本接近
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from bill_table_extractor import BillTableExtractor
+from entity_scanner import ENTITY_AMOUNT, ENTITY_DATE, ENTITY_NUMBER, ENTITY_PHONE, ENTITY_TIME, scan
+from keyword_matcher import KeywordMatcher, get_matcher
+from pdf_text_extractor import (DEFAULT_IMPORTANT_KEYWORDS, DEFAULT_TEMPLATE_KEYWORDS, KEYWORD_IMPORTANT,
+                                KEYWORD_TEMPLATE)
+
+logger = logging.getLogger(__name__)
+
+# 签名页关键词（签名页常只有少量关键信息，单独加分）
+SIGNATURE_KEYWORDS = ('签名', '签字', '签章', '盖章', '客户签', '经办人', '受理人')
+SIGNATURE_LINE_MAX_CHARS = 20
+
+# 文字层少于该字符数的页面无法评分（扫描页、图片页），不因相关性低被跳过
+MIN_TEXT_CHARS = 20
+
+# 评分：每千字关键信息数 ×（1 - 模板行占比），签名页、费用表页另外加分
+SIGNATURE_BONUS = 2.0
+FEE_TABLE_BONUS = 5.0
+
+# 无法评分的页面在页数预算内的排序分数
+UNSCORED_PAGE_SCORE = 1.0
+
+# 跳过原因
+SKIP_LOW_RELEVANCE = '低相关'
+SKIP_OVER_BUDGET = '超出页数预算'
+
+SIGNATURE = 'signature'
+
+
+class PageRelevanceScorer:
+    """PDF页面相关性评分与抽样"""
+
+    def __init__(self,
+                 page_budget: int = 0,
+                 min_score: float = 0.0,
+                 keyword_matcher: Optional[KeywordMatcher] = None):
+        """
+        初始化
+
+        Args:
+            page_budget: 每个文件最多处理的页数（0为不限），超出时按分数保留，首页总是保留
+            min_score: 低于该分数的页面不处理（0为不按分数跳过，无法评分的页面不跳过）
+            keyword_matcher: 模板/重要关键词的匹配自动机（默认使用 PDFTextExtractor 的默认关键词）
+        """
+        self.page_budget = max(0, int(page_budget or 0))
+        self.min_score = min_score
+        if keyword_matcher is None:
+            keyword_matcher = get_matcher({KEYWORD_TEMPLATE: DEFAULT_TEMPLATE_KEYWORDS,
+                                           KEYWORD_IMPORTANT: DEFAULT_IMPORTANT_KEYWORDS})
+        self.keyword_matcher = keyword_matcher
+        self.signature_matcher = get_matcher({SIGNATURE: SIGNATURE_KEYWORDS})
+        self.bill_extractor = BillTableExtractor()
+
+    @property
+    def enabled(self) -> bool:
+        return self.page_budget > 0 or self.min_score > 0
+
+    def score_text(self, text: str) -> Dict[str, Any]:
+        """
+        按页面文字评分
+
+        Returns:
+            {score（无法评分时为None）, entities, template_ratio, signature, fee_table}
+        """
+        compact = text.strip()
+        if len(compact) < MIN_TEXT_CHARS:
+            return {'score': None, 'entities': 0, 'template_ratio': 0.0, 'signature': False, 'fee_table': False}
+
+        lines = [line for line in compact.split('\n') if line.strip()]
+        template_lines = 0
+        for line in lines:
+            categories = self.keyword_matcher.categories(line, stop_on=KEYWORD_IMPORTANT)
+            if KEYWORD_TEMPLATE in categories and KEYWORD_IMPORTANT not in categories:
+                template_lines += 1
+        template_ratio = template_lines / len(lines)
+
+        entities = scan(compact).count(ENTITY_PHONE, ENTITY_NUMBER, ENTITY_AMOUNT, ENTITY_DATE, ENTITY_TIME)
+        # 签名栏是含签名关键词的短行（条款中"签字盖章"等长句不算）
+        signature = any(len(line.strip()) <= SIGNATURE_LINE_MAX_CHARS
+                        and self.signature_matcher.categories(line, stop_on=SIGNATURE) for line in lines)
+        fee_table = self.bill_extractor.is_bill_page(compact)
+
+        score = entities * 1000 / len(compact) * (1 - template_ratio)
+        score += SIGNATURE_BONUS if signature else 0
+        score += FEE_TABLE_BONUS if fee_table else 0
+        return {
+            'score': round(score, 2),
+            'entities': entities,
+            'template_ratio': round(template_ratio, 2),
+            'signature': signature,
+            'fee_table': fee_table,
+        }
+
+    def score_document(self, doc: fitz.Document) -> List[Dict[str, Any]]:
+        """为文档每一页评分（只读取文字层，不渲染）"""
+        return [{'page': index + 1, **self.score_text(page.get_text())} for index, page in enumerate(doc)]
+
+    def select(self, scores: List[Dict[str, Any]]) -> Tuple[List[int], Dict[int, Dict[str, Any]]]:
+        """
+        按评分选择要处理的页面
+
+        Args:
+            scores: score_document 的结果
+
+        Returns:
+            (要处理的页面序号（从0开始，升序）, {跳过的页面序号: {skipped（原因）, relevance（分数）}})
+        """
+        skipped: Dict[int, Dict[str, Any]] = {}
+        candidates = []
+        for index, item in enumerate(scores):
+            if index > 0 and item['score'] is not None and item['score'] < self.min_score:
+                skipped[index] = {'skipped': SKIP_LOW_RELEVANCE, 'relevance': item['score']}
+            else:
+                candidates.append(index)
+
+        if self.page_budget and len(candidates) > self.page_budget:
+            ranked = sorted(candidates, key=lambda index: (
+                index != 0,
+                -(UNSCORED_PAGE_SCORE if scores[index]['score'] is None else scores[index]['score']),
+                index,
+            ))
+            for index in ranked[self.page_budget:]:
+                skipped[index] = {'skipped': SKIP_OVER_BUDGET, 'relevance': scores[index]['score']}
+            candidates = sorted(ranked[:self.page_budget])
+
+        if skipped:
+            logger.info(f"页面相关性抽样：共{len(scores)}页，处理{len(candidates)}页，跳过{len(skipped)}页")
+        return candidates, skipped
@@ -0,0 +1,357 @@
+"""
+PDF页面提取路由
+按文字层覆盖和图片面积逐页决定提取方式：
+有文字层的数字页面直接提取文字，只有图片的页面才交给本地OCR或视觉大模型
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+import io
+import logging
+
+import fitz  # PyMuPDF
+
+from attachment_source import AttachmentSource, as_source
+from image_quality import DuplicatePageTracker
+from pdf_page_renderer import TARGET_LONG_EDGE, render_page
+from vision_schema import render_fee_table
+
+logger = logging.getLogger(__name__)
+
+# 提取方式
+ROUTE_TEXT = 'text'        # 直接提取文字层
+ROUTE_OCR = 'ocr'          # 本地Tesseract识别
+ROUTE_VISION = 'vision'    # 视觉大模型识别
+
+# 各提取方式在页面结果中的method字段（与OCRProcessor/VisionProcessor一致）
+ROUTE_METHODS = {
+    ROUTE_TEXT: 'direct_extraction',
+    ROUTE_OCR: 'ocr',
+    ROUTE_VISION: 'vision_model',
+}
+
+# 文字层至少有这么多字符才视为可直接提取
+MIN_TEXT_CHARS = 20
+
+# 图片覆盖页面面积的比例达到该值且文字较少时，视为图片页（如贴入的截图）
+IMAGE_COVERAGE_THRESHOLD = 0.5
+
+# 文字层字符数达到该值时，即使图片覆盖较大也直接提取（如带文字层的扫描件）
+RICH_TEXT_CHARS = 200
+
+# 图片覆盖低于该比例且无文字的页面视为空白页
+MIN_IMAGE_COVERAGE = 0.02
+
+# 文字层中替换字符占比超过该值时视为乱码（字体缺少ToUnicode映射）
+GARBLED_RATIO = 0.3
+
+# 本地OCR的渲染分辨率
+OCR_DPI = 300
+
+
+def analyze_page(page: fitz.Page) -> Dict[str, Any]:
+    """
+    统计页面的文字层与图片覆盖情况
+
+    Args:
+        page: PDF页面
+
+    Returns:
+        text_chars（文字层字符数）、text_coverage（文字块面积占比）、
+        image_coverage（图片面积占比）、garbled（文字层是否为乱码）
+    """
+    rect = page.rect
+    page_area = rect.width * rect.height or 1
+
+    text_chars = 0
+    replacement_chars = 0
+    text_area = 0.0
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        if block_type != 0:
+            continue
+        stripped = text.strip()
+        text_chars += len(stripped)
+        replacement_chars += stripped.count('\ufffd')
+        text_area += (x1 - x0) * (y1 - y0)
+
+    image_area = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox']) & rect
+        if not bbox.is_empty:
+            image_area += bbox.width * bbox.height
+
+    return {
+        'text_chars': text_chars,
+        'text_coverage': round(min(1.0, text_area / page_area), 3),
+        'image_coverage': round(min(1.0, image_area / page_area), 3),
+        'garbled': bool(text_chars) and replacement_chars / text_chars > GARBLED_RATIO,
+    }
+
+
+def route_page(page: fitz.Page,
+               image_route: str = ROUTE_VISION,
+               min_text_chars: int = MIN_TEXT_CHARS,
+               image_coverage_threshold: float = IMAGE_COVERAGE_THRESHOLD) -> Dict[str, Any]:
+    """
+    决定页面的提取方式
+
+    Args:
+        page: PDF页面
+        image_route: 图片页使用的识别方式（ROUTE_OCR 或 ROUTE_VISION）
+        min_text_chars: 文字层可直接提取的最少字符数
+        image_coverage_threshold: 判定为图片页的图片面积占比
+
+    Returns:
+        页面统计信息，附加 route（提取方式）和 reason（决策原因）
+    """
+    decision = analyze_page(page)
+    has_text = decision['text_chars'] >= min_text_chars and not decision['garbled']
+
+    if has_text and decision['image_coverage'] >= image_coverage_threshold \
+            and decision['text_chars'] < RICH_TEXT_CHARS:
+        route, reason = image_route, '图片为主，文字层内容较少'
+    elif has_text:
+        route, reason = ROUTE_TEXT, '文字层完整'
+    elif decision['image_coverage'] >= MIN_IMAGE_COVERAGE:
+        if decision['garbled']:
+            reason = '文字层乱码'
+        elif decision['text_chars']:
+            reason = '文字层内容过少，内容为图片'
+        else:
+            reason = '无文字层，内容为图片'
+        route = image_route
+    else:
+        route, reason = ROUTE_TEXT, '空白页'
+
+    decision['route'] = route
+    decision['reason'] = reason
+    return decision
+
+
+class PDFPageRouter:
+    """按页路由的PDF提取器：数字页面直接取文字，图片页面交给OCR或视觉模型"""
+
+    def __init__(self,
+                 vision_processor=None,
+                 ocr_processor=None,
+                 text_extractor=None,
+                 image_route: str = ROUTE_VISION,
+                 min_text_chars: int = MIN_TEXT_CHARS,
+                 image_coverage_threshold: float = IMAGE_COVERAGE_THRESHOLD):
+        """
+        初始化路由
+
+        Args:
+            vision_processor: 视觉处理器（VisionProcessor），图片页使用视觉模型时需要
+            ocr_processor: OCR处理器（OCRProcessor），图片页使用本地OCR时需要
+            text_extractor: PDF文本提取器（PDFTextExtractor），用于过滤模板和提取关键信息
+            image_route: 图片页优先使用的识别方式（ocr / vision），对应处理器缺失时改用另一种
+            min_text_chars: 文字层可直接提取的最少字符数
+            image_coverage_threshold: 判定为图片页的图片面积占比
+        """
+        if text_extractor is None:
+            from pdf_text_extractor import PDFTextExtractor
+            text_extractor = PDFTextExtractor()
+
+        self.vision_processor = vision_processor
+        self.ocr_processor = ocr_processor
+        self.text_extractor = text_extractor
+        self.image_route = self._available_route(image_route)
+        self.min_text_chars = min_text_chars
+        self.image_coverage_threshold = image_coverage_threshold
+
+    def _available_route(self, preferred: str) -> Optional[str]:
+        """按可用的处理器确定图片页的识别方式，都不可用时返回None"""
+        available = {ROUTE_VISION: self.vision_processor, ROUTE_OCR: self.ocr_processor}
+        if available.get(preferred) is not None:
+            return preferred
+        for route, processor in available.items():
+            if processor is not None:
+                logger.info(f"图片页识别方式 {preferred} 不可用，改用 {route}")
+                return route
+        return None
+
+    def extract(self, pdf_path: 'str | AttachmentSource',
+                partial_callback: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """
+        按页路由提取PDF内容
+
+        Args:
+            pdf_path: PDF文件路径或附件数据源（上传的附件可直接在内存中处理）
+            partial_callback: 视觉识别页的流式部分结果回调（默认使用视觉处理器初始化时的设置）
+
+        Returns:
+            与 PDFTextExtractor.extract_from_pdf 相同的结果结构，另含 content、pages 和
+            metadata（page_routes 记录每页的提取方式和决策依据，route_counts 为各方式页数）
+        """
+        source = as_source(pdf_path)
+        logger.info(f"按页路由提取PDF: {source}")
+        name = source.name
+
+        # 页面文字按页码顺序交给累加器过滤并提取关键信息（低内存模式下不保留原文，
+        # 过滤后文本超出上限时截断的是靠后的页面，因此视觉识别页也要在自己的位置加入）
+        accumulator = self.text_extractor.accumulator()
+        keep_text = accumulator.keep_raw_text
+        page_texts: List[Dict[str, Any]] = []
+        decisions: List[Dict[str, Any]] = []
+        futures = {}
+        # 等待加入累加器的页面：(视觉识别任务，非视觉页为None, 加入累加器的函数)
+        pending: Deque[Tuple[Optional[Future], Callable[[], None]]] = deque()
+        executor = None
+        skipped: Dict[int, Dict[str, Any]] = {}
+        tracker = DuplicatePageTracker()
+        vision_metadata: Dict[str, Any] = {}
+
+        try:
+            with source.open_pdf() as doc:
+                # 长协议按页面相关性抽样：条款模板页不提取、不识别（需启用提取器的页面抽样）
+                _, page_skips = self.text_extractor.sample_pages(doc)
+                for index, page in enumerate(doc):
+                    # 前面已识别完成的视觉页（及排在其后的页面）依次加入累加器
+                    self._add_pending(pending)
+                    decision = route_page(page, self.image_route or ROUTE_TEXT,
+                                          self.min_text_chars, self.image_coverage_threshold)
+                    decision['page'] = index + 1
+                    decisions.append(decision)
+                    page_texts.append({'page': index + 1, 'text': ''})
+
+                    if index in page_skips:
+                        skipped[index] = page_skips[index]
+                        pending.append((None, partial(accumulator.add_page,
+                                                      {**page_texts[index], **page_skips[index]})))
+                        continue
+
+                    if decision['route'] == ROUTE_TEXT:
+                        text = page.get_text()
+                        # 账单页的费用明细表直接由文字坐标提取，不调用视觉模型
+                        fee_rows = self.text_extractor.extract_fee_rows(page, text)
+                        pending.append((None, partial(self._add_page_text, accumulator, page_texts[index], text,
+                                                      keep_text, fee_rows)))
+                    elif decision['route'] == ROUTE_OCR:
+                        try:
+                            text = self._ocr_page(page)
+                            pending.append((None, partial(self._add_page_text, accumulator, page_texts[index], text,
+                                                          keep_text)))
+                        except Exception as e:
+                            logger.error(f"第{index + 1}页OCR失败: {e}")
+                            page_texts[index]['error'] = str(e)
+                            pending.append((None, partial(accumulator.add_page, page_texts[index])))
+                    else:
+                        # 视觉模型页面：当前线程渲染，识别请求并发进行
+                        if executor is None:
+                            executor = ThreadPoolExecutor(max_workers=self.vision_processor.max_workers,
+                                                          thread_name_prefix="route-vision")
+                        img_data, _ = render_page(page, TARGET_LONG_EDGE)
+                        page_name = f"{name} 第{index + 1}页"
+                        # 空白页、重复页不调用视觉模型（需启用视觉处理器的质量预检）
+                        skip = self.vision_processor.screen_pdf_page(img_data, index + 1, page_name, tracker)
+                        if skip:
+                            skipped[index] = skip
+                            pending.append((None, partial(accumulator.add_page, page_texts[index])))
+                            continue
+                        futures[index] = executor.submit(
+                            self.vision_processor.recognize_image, img_data, page_name, vision_metadata, False,
+                            partial_callback
+                        )
+                        pending.append((futures[index], partial(self._add_vision_page, accumulator,
+                                                                page_texts[index], futures[index], keep_text)))
+
+            self._add_pending(pending, wait=True)
+
+        except Exception as e:
+            logger.error(f"PDF路由提取失败: {e}")
+            return {
+                'file_name': name,
+                'file_type': 'pdf',
+                'error': str(e),
+                'status': 'failed'
+            }
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        result = accumulator.result(name)
+        # 跳过的页面（含相关性抽样跳过的）统一记录在 metadata.skipped_pages 中
+        result.pop('skipped_pages', None)
+        # 低内存模式下以过滤后的文本作为识别内容
+        result['content'] = result['full_text'].strip() if keep_text else result['filtered_text']
+        if result.get('fee_rows'):
+            result['content'] += '\n\n' + render_fee_table(result['fee_rows'])
+        result['pages'] = [
+            {
+                'page_number': item['page'],
+                **({'text': item['text'].strip()} if keep_text else {'chars': item.get('chars', 0)}),
+                'method': ROUTE_METHODS[decision['route']],
+                **({'error': item['error']} if 'error' in item else {}),
+                **skipped.get(index, {})
+            }
+            for index, (item, decision) in enumerate(zip(page_texts, decisions))
+        ]
+
+        route_counts: Dict[str, int] = {}
+        for decision in decisions:
+            route_counts[decision['route']] = route_counts.get(decision['route'], 0) + 1
+        result['metadata'] = {
+            'extraction_method': 'routed',
+            'page_routes': decisions,
+            'route_counts': route_counts,
+        }
+
+        if skipped:
+            result['metadata']['skipped_pages'] = [{'page': index + 1, **skip} for index, skip in skipped.items()]
+
+        if futures:
+            structured = self.vision_processor.collect_structured(vision_metadata)
+            if structured:
+                result['structured'] = structured
+            # 视觉识别的统计（预处理、质量预检、提示词档位等）
+            result['metadata'].update(vision_metadata)
+
+        failed = [item['page'] for item in page_texts if 'error' in item]
+        if failed:
+            result['metadata']['failed_pages'] = failed
+            if len(failed) == len(page_texts):
+                result['error'] = f"全部{len(failed)}页识别失败"
+                result['status'] = 'failed'
+
+        logger.info(f"PDF路由完成 {name}: {route_counts}")
+        return result
+
+    @staticmethod
+    def _add_pending(pending: Deque[Tuple[Optional[Future], Callable[[], None]]], wait: bool = False):
+        """按页码顺序将页面加入累加器，遇到尚未识别完成的视觉页时停止（wait 为True时等待其完成）"""
+        while pending:
+            future, add = pending[0]
+            if future is not None and not wait and not future.done():
+                return
+            pending.popleft()
+            add()
+
+    def _add_vision_page(self, accumulator, item: Dict[str, Any], future: Future, keep_text: bool):
+        """将视觉识别页交给累加器，识别失败时记录错误"""
+        try:
+            text = future.result()
+        except Exception as e:
+            logger.error(f"第{item['page']}页视觉识别失败: {e}")
+            item['error'] = str(e)
+            accumulator.add_page(item)
+            return
+        self._add_page_text(accumulator, item, text, keep_text)
+
+    @staticmethod
+    def _add_page_text(accumulator, item: Dict[str, Any], text: str, keep_text: bool,
+                       fee_rows: Optional[List[Dict[str, str]]] = None):
+        """将一页文字（及费用明细）交给累加器，页面记录中只在保留原文时存放文字"""
+        accumulator.add_page({'page': item['page'], 'text': text, **({'fee_rows': fee_rows} if fee_rows else {})})
+        item['chars'] = len(text)
+        if keep_text:
+            item['text'] = text
+
+    def _ocr_page(self, page: fitz.Page) -> str:
+        """渲染页面并用本地OCR识别"""
+        from PIL import Image
+
+        pix = page.get_pixmap(dpi=OCR_DPI)
+        with Image.open(io.BytesIO(pix.tobytes("png"))) as image:
+            return self.ocr_processor.ocr_image(image)
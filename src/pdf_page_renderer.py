@@ -0,0 +1,101 @@
+"""
+PDF页面渲染
+按页面尺寸和文字密度自适应选择渲染倍率，供视觉识别前将PDF页面转为图片
+本模块只依赖PyMuPDF，可在渲染进程池中快速加载
+"""
+from typing import Optional, Tuple
+import fitz  # PyMuPDF
+
+# 渲染目标长边像素（A4页面约对应1.9倍）
+TARGET_LONG_EDGE = 1600
+
+# 渲染倍率上下限
+MIN_SCALE = 1.0
+MAX_SCALE = 3.0
+
+# 文字密度阈值（每100x100点面积的字符数），超过视为小字号密集文本
+DENSE_TEXT_THRESHOLD = 30
+DENSE_TEXT_BOOST = 1.25
+
+# 渲染进程内缓存最近打开的文档，避免每页重复打开
+_cached_doc: Optional[Tuple[str, fitz.Document]] = None
+
+
+def choose_render_scale(page: fitz.Page, target_long_edge: int = TARGET_LONG_EDGE) -> float:
+    """
+    根据页面尺寸和文字密度选择渲染倍率
+
+    Args:
+        page: PDF页面
+        target_long_edge: 渲染后长边的目标像素
+
+    Returns:
+        渲染倍率
+    """
+    rect = page.rect
+    long_edge = max(rect.width, rect.height) or 1
+    scale = target_long_edge / long_edge
+
+    area_units = (rect.width * rect.height) / 10000 or 1
+    text_chars = len(page.get_text().strip())
+
+    if text_chars / area_units >= DENSE_TEXT_THRESHOLD:
+        # 小字号密集文本（合同条款、账单明细），提高清晰度
+        scale *= DENSE_TEXT_BOOST
+    elif text_chars == 0:
+        # 扫描页：渲染分辨率不超过内嵌图片的原始分辨率
+        native_scale = _native_image_scale(page)
+        if native_scale:
+            scale = min(scale, native_scale)
+
+    return round(max(MIN_SCALE, min(MAX_SCALE, scale)), 2)
+
+
+def _native_image_scale(page: fitz.Page) -> float:
+    """页面内嵌图片的原始分辨率对应的倍率（像素/点），无图片时返回0"""
+    best = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox'])
+        if bbox.width > 0:
+            best = max(best, info['width'] / bbox.width)
+    return best
+
+
+def render_page(page: fitz.Page, target_long_edge: int = TARGET_LONG_EDGE) -> Tuple[bytes, float]:
+    """
+    渲染页面为PNG
+
+    Args:
+        page: PDF页面
+        target_long_edge: 渲染后长边的目标像素
+
+    Returns:
+        (PNG数据, 渲染倍率)
+    """
+    scale = choose_render_scale(page, target_long_edge)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+    return pix.tobytes("png"), scale
+
+
+def render_pdf_page(pdf_path: str, page_index: int,
+                    target_long_edge: int = TARGET_LONG_EDGE) -> Tuple[int, bytes, float]:
+    """
+    渲染进程池的任务函数：打开（或复用）文档并渲染指定页
+
+    Args:
+        pdf_path: PDF文件路径
+        page_index: 页码（从0开始）
+        target_long_edge: 渲染后长边的目标像素
+
+    Returns:
+        (页码, PNG数据, 渲染倍率)
+    """
+    global _cached_doc
+
+    if _cached_doc is None or _cached_doc[0] != pdf_path:
+        if _cached_doc is not None:
+            _cached_doc[1].close()
+        _cached_doc = (pdf_path, fitz.open(pdf_path))
+
+    img_data, scale = render_page(_cached_doc[1][page_index], target_long_edge)
+    return page_index, img_data, scale
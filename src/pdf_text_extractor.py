@@ -7,159 +7,254 @@ try:
 except ImportError:
     import PyMuPDF as fitz
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+import multiprocessing
 import re
 import logging
+import time
+
+from attachment_source import AttachmentSource, as_source
+from bill_table_extractor import BillTableExtractor
+from boilerplate_filter import load_filter
+from entity_scanner import scan
+from keyword_matcher import get_matcher
+from phrase_scanner import addresses, keyword_phrases
 
 logger = logging.getLogger(__name__)
 
+# 默认协议模板关键词（这些内容会被过滤）
+DEFAULT_TEMPLATE_KEYWORDS = (
+    '甲方', '乙方', '协议条款', '特别约定',
+    '本协议', '双方约定', '违约责任', '争议解决',
+    '法律适用', '协议生效', '协议终止', '附则',
+    '声明与保证', '保密条款', '知识产权', '不可抗力',
+    '通知与送达', '协议变更', '协议解除', '其他事项',
+    '签字盖章', '签订日期', '合同编号', '合同期限',
+)
+
+# 默认重要信息关键词（这些内容会被保留）
+DEFAULT_IMPORTANT_KEYWORDS = (
+    '号码', '手机', '电话', '联系方式', '身份证',
+    '金额', '费用', '价格', '套餐', '资费',
+    '日期', '时间', '年', '月', '日',
+    '姓名', '用户', '客户', '申请人',
+    '业务', '服务', '产品', '订单',
+    '账号', '账户', '卡号', '流水号',
+    '地址', '省', '市', '区', '县',
+    '投诉', '申诉', '问题', '原因',
+)
+
+# 关键词类别
+KEYWORD_TEMPLATE = 'template'
+KEYWORD_IMPORTANT = 'important'
+
+# 业务信息短语的关键词（含关键词的连续汉字段）
+BUSINESS_PHRASE_KEYWORDS = ('套餐', '资费', '业务')
+
+# 无意义的行：纯数字/符号、页码、页眉页脚、分隔线、条款编号、纯编号
+MEANINGLESS_PATTERN = re.compile(
+    r'^(?:[\d\s\-_\.]+$'
+    r'|第\s*\d+\s*页'
+    r'|\d+\s*/\s*\d+$'
+    r'|[\*\-=]{3,}$'
+    r'|第[一二三四五六七八九十]+[条章节]'
+    r'|\d+[\.\)]\s*$)'
+)
+
 
 class PDFTextExtractor:
     """PDF文本提取器 - 直接提取文字，不使用视觉识别"""
     
-    def __init__(self):
-        """初始化提取器"""
-        # 协议模板关键词（这些内容会被过滤）
-        self.template_keywords = [
-            '甲方', '乙方', '协议条款', '特别约定',
-            '本协议', '双方约定', '违约责任', '争议解决',
-            '法律适用', '协议生效', '协议终止', '附则',
-            '声明与保证', '保密条款', '知识产权', '不可抗力',
-            '通知与送达', '协议变更', '协议解除', '其他事项',
-            '签字盖章', '签订日期', '合同编号', '合同期限',
-        ]
+    def __init__(self,
+                 template_keywords: Optional[Iterable[str]] = None,
+                 important_keywords: Optional[Iterable[str]] = None,
+                 extra_template_keywords: Iterable[str] = (),
+                 extra_important_keywords: Iterable[str] = (),
+                 low_memory: bool = False,
+                 max_filtered_chars: int = 20000,
+                 batch_workers: int = 1,
+                 batch_timeout: Optional[float] = None,
+                 bill_tables: bool = True,
+                 page_budget: int = 0,
+                 page_min_score: float = 0.0,
+                 boilerplate_path: Optional[str] = None):
+        """
+        初始化提取器
         
-        # 重要信息关键词（这些内容会被保留）
-        self.important_keywords = [
-            '号码', '手机', '电话', '联系方式', '身份证',
-            '金额', '费用', '价格', '套餐', '资费',
-            '日期', '时间', '年', '月', '日',
-            '姓名', '用户', '客户', '申请人',
-            '业务', '服务', '产品', '订单',
-            '账号', '账户', '卡号', '流水号',
-            '地址', '省', '市', '区', '县',
-            '投诉', '申诉', '问题', '原因',
-        ]
+        Args:
+            template_keywords: 协议模板关键词（替换默认列表）
+            important_keywords: 重要信息关键词（替换默认列表）
+            extra_template_keywords: 追加的协议模板关键词
+            extra_important_keywords: 追加的重要信息关键词
+            low_memory: 低内存模式：逐页过滤并提取关键信息，结果中不保留原文（full_text、page_texts）
+            max_filtered_chars: 低内存模式下保留的过滤后文本字符数上限（超出后的页面只提取关键信息）
+            batch_workers: 批量提取的进程数（1为当前进程逐个提取）
+            batch_timeout: 批量提取时单个文件的超时秒数（仅多进程时生效，None为不限）
+            bill_tables: 是否从账单页面提取逐月费用明细表（结果中的 fee_rows）
+            page_budget: 每个文件最多提取的页数（0为不限），超出时按页面相关性保留
+            page_min_score: 相关性低于该分数的页面不提取（0为不跳过），见 page_relevance
+            boilerplate_path: 从历史PDF学习的模板签名集文件（见 boilerplate_filter），None为不启用
+        """
+        self.template_keywords = list(DEFAULT_TEMPLATE_KEYWORDS if template_keywords is None else template_keywords)
+        self.template_keywords += [kw for kw in extra_template_keywords if kw not in self.template_keywords]
+        
+        self.important_keywords = list(DEFAULT_IMPORTANT_KEYWORDS if important_keywords is None else important_keywords)
+        self.important_keywords += [kw for kw in extra_important_keywords if kw not in self.important_keywords]
+        
+        self.low_memory = low_memory
+        self.max_filtered_chars = max_filtered_chars
+        self.batch_workers = batch_workers
+        self.batch_timeout = batch_timeout
+        self.bill_extractor = BillTableExtractor() if bill_tables else None
+        self.boilerplate_path = boilerplate_path
+        self.boilerplate = load_filter(boilerplate_path)
+        self.page_scorer = None
+        if page_budget or page_min_score:
+            from page_relevance import PageRelevanceScorer
+            self.page_scorer = PageRelevanceScorer(page_budget, page_min_score, self.keyword_matcher)
+    
+    @property
+    def keyword_matcher(self):
+        """模板/重要关键词的匹配器（相同关键词配置在进程内只构建一次，关键词较多时为自动机）"""
+        return get_matcher({
+            KEYWORD_TEMPLATE: self.template_keywords,
+            KEYWORD_IMPORTANT: self.important_keywords,
+        })
     
-    def extract_from_pdf(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_from_pdf(self, pdf_path: 'str | AttachmentSource') -> Dict[str, Any]:
         """
         从PDF提取文本内容
         
         Args:
-            pdf_path: PDF文件路径
+            pdf_path: PDF文件路径或附件数据源
             
         Returns:
             提取结果
         """
-        logger.info(f"开始提取PDF文本: {pdf_path}")
+        source = as_source(pdf_path)
+        logger.info(f"开始提取PDF文本: {source}")
         
         try:
-            doc = fitz.open(pdf_path)
-            
-            # 提取所有页面文本
-            full_text = ""
-            page_texts = []
-            
-            # 保存页数
-            total_pages = len(doc)
-            
-            for page_num in range(total_pages):
-                page = doc[page_num]
-                page_text = page.get_text()
-                page_texts.append({
-                    'page': page_num + 1,
-                    'text': page_text
-                })
-                full_text += page_text + "\n"
-            
-            # 关闭文档
-            doc.close()
-            
-            # 过滤协议模板内容
-            filtered_text = self._filter_template_content(full_text)
-            
-            # 提取关键信息
-            key_info = self._extract_key_information(filtered_text)
-            
-            logger.info(f"PDF提取完成，共{total_pages}页，提取{len(filtered_text)}字符")
-            
-            return {
-                'file_name': Path(pdf_path).name,
-                'file_type': 'pdf',
-                'total_pages': total_pages,
-                'full_text': full_text,
-                'filtered_text': filtered_text,
-                'key_info': key_info,
-                'page_texts': page_texts,
-                'status': 'success'
-            }
+            accumulator = self.accumulator()
+            for item in self.iter_pages(source):
+                accumulator.add_page(item)
+            return accumulator.result(source.name)
             
         except Exception as e:
             logger.error(f"PDF提取失败: {e}")
             return {
-                'file_name': Path(pdf_path).name,
+                'file_name': source.name,
                 'file_type': 'pdf',
                 'error': str(e),
                 'status': 'failed'
             }
     
+    def iter_pages(self, pdf_path: 'str | AttachmentSource') -> Iterator[Dict[str, Any]]:
+        """
+        逐页读取PDF文字（每次只加载一页）
+        
+        Args:
+            pdf_path: PDF文件路径或附件数据源
+            
+        Yields:
+            {'page': 页码, 'text': 文本}，账单页另含 fee_rows（逐月费用明细），
+            按相关性跳过的页面文本为空，另含 skipped（原因）和 relevance（分数）
+        """
+        with as_source(pdf_path).open_pdf() as doc:
+            _, page_skips = self.sample_pages(doc)
+            for page_num, page in enumerate(doc):
+                if page_num in page_skips:
+                    yield {'page': page_num + 1, 'text': '', **page_skips[page_num]}
+                    continue
+                text = page.get_text()
+                item = {'page': page_num + 1, 'text': text}
+                fee_rows = self.extract_fee_rows(page, text)
+                if fee_rows:
+                    item['fee_rows'] = fee_rows
+                yield item
+    
+    def sample_pages(self, doc) -> Tuple[List[int], Dict[int, Dict[str, Any]]]:
+        """
+        按页面相关性选择要提取的页面（未启用时全部提取）
+        
+        Returns:
+            (要提取的页面序号, {跳过的页面序号: {skipped, relevance}})
+        """
+        if self.page_scorer is None:
+            return list(range(len(doc))), {}
+        return self.page_scorer.select(self.page_scorer.score_document(doc))
+    
+    def extract_fee_rows(self, page, text: Optional[str] = None) -> List[Dict[str, str]]:
+        """从账单页面的文字层提取逐月费用明细（未启用或不是账单页时为空列表）"""
+        if self.bill_extractor is None:
+            return []
+        try:
+            return self.bill_extractor.extract_page(page, text)
+        except Exception as e:
+            logger.warning(f"第{page.number + 1}页费用明细提取失败: {e}")
+            return []
+    
+    def accumulator(self) -> 'PDFTextAccumulator':
+        """创建逐页过滤、提取关键信息的累加器（低内存模式下不保留原文）"""
+        if self.low_memory:
+            return PDFTextAccumulator(self, keep_raw_text=False, max_filtered_chars=self.max_filtered_chars)
+        return PDFTextAccumulator(self)
+    
+    def build_result(self, pdf_path: str, page_texts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        由逐页文本生成提取结果（过滤协议模板并提取关键信息）
+        
+        Args:
+            pdf_path: PDF文件路径
+            page_texts: 逐页文本 [{'page': 页码, 'text': 文本}]（可以是生成器）
+            
+        Returns:
+            提取结果
+        """
+        accumulator = self.accumulator()
+        for item in page_texts:
+            accumulator.add_page(item)
+        return accumulator.result(pdf_path)
+    
     def _filter_template_content(self, text: str) -> str:
-        """过滤协议模板内容，保留关键信息"""
-        lines = text.split('\n')
+        """
+        过滤协议模板内容，保留关键信息
+        
+        每行只用关键词自动机扫描一次（命中重要关键词即停止），耗时与文本长度成正比，与关键词数量无关；
+        加载了模板签名集时，关键词规则保留的行再按签名集过滤
+        """
+        matcher = self.keyword_matcher
+        boilerplate = self.boilerplate
         filtered_lines = []
         
-        for line in lines:
+        for line in text.split('\n'):
             line = line.strip()
-            if not line:
-                continue
-            
-            # 检查是否包含重要关键词
-            has_important = any(kw in line for kw in self.important_keywords)
-            
-            # 检查是否是协议模板内容
-            is_template = any(kw in line for kw in self.template_keywords)
             
             # 过滤规则：
-            # 1. 包含重要关键词的保留
-            # 2. 不包含模板关键词的保留
-            # 3. 太短的行（<5字符）跳过
+            # 1. 太短的行（<5字符）跳过
+            # 2. 包含重要关键词的保留
+            # 3. 不包含模板关键词、且是有意义内容的保留
+            # 4. 以上保留的行中，命中模板签名集的（不含数字的通用条款）跳过
             if len(line) < 5:
                 continue
             
-            if has_important:
-                filtered_lines.append(line)
-            elif not is_template:
-                # 进一步检查：是否是有意义的内容
-                if self._is_meaningful_content(line):
-                    filtered_lines.append(line)
+            categories = matcher.categories(line, stop_on=KEYWORD_IMPORTANT)
+            if KEYWORD_IMPORTANT not in categories and (
+                    KEYWORD_TEMPLATE in categories or not self._is_meaningful_content(line)):
+                continue
+            if boilerplate is not None and boilerplate.is_boilerplate(line):
+                continue
+            filtered_lines.append(line)
         
         return '\n'.join(filtered_lines)
     
     def _is_meaningful_content(self, line: str) -> bool:
-        """判断是否是有意义的内容"""
-        # 过滤纯数字、纯符号
-        if re.match(r'^[\d\s\-_\.]+$', line):
-            return False
-        
-        # 过滤页码、页眉页脚
-        if re.match(r'^第\s*\d+\s*页', line):
-            return False
-        if re.match(r'^\d+\s*/\s*\d+$', line):
-            return False
-        
-        # 过滤常见的无意义内容
-        meaningless_patterns = [
-            r'^[\*\-=]{3,}$',  # 分隔线
-            r'^第[一二三四五六七八九十]+[条章节]',  # 条款编号
-            r'^\d+[\.\)]\s*$',  # 纯编号
-        ]
-        
-        for pattern in meaningless_patterns:
-            if re.match(pattern, line):
-                return False
-        
-        return True
+        """判断是否是有意义的内容（过滤纯数字、纯符号、页码、分隔线、条款编号等）"""
+        return MEANINGLESS_PATTERN.match(line) is None
     
     def _extract_key_information(self, text: str) -> Dict[str, List[str]]:
         """提取关键信息"""
@@ -172,59 +267,176 @@ class PDFTextExtractor:
             'business_info': [],
         }
         
-        # 提取手机号（确保是独立的11位数字，不是从长数字串中截取）
-        phone_pattern = r'(?<!\d)1[3-9]\d{9}(?!\d)'
-        key_info['phone_numbers'] = list(set(re.findall(phone_pattern, text)))
-        
-        # 提取金额
-        amount_patterns = [
-            r'¥\s*[\d,]+\.?\d*',
-            r'[\d,]+\.?\d*\s*元',
-            r'人民币\s*[\d,]+\.?\d*',
-        ]
-        for pattern in amount_patterns:
-            amounts = re.findall(pattern, text)
-            key_info['amounts'].extend(amounts)
-        key_info['amounts'] = list(set(key_info['amounts']))
-        
-        # 提取日期
-        date_patterns = [
-            r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日]?',
-            r'\d{4}\.\d{1,2}\.\d{1,2}',
-            r'\d{4}/\d{1,2}/\d{1,2}',
-        ]
-        for pattern in date_patterns:
-            dates = re.findall(pattern, text)
-            key_info['dates'].extend(dates)
-        key_info['dates'] = list(set(key_info['dates']))
-        
-        # 提取业务信息（套餐、资费等）
-        business_patterns = [
-            r'[\u4e00-\u9fa5]*套餐[\u4e00-\u9fa5]*',
-            r'[\u4e00-\u9fa5]*资费[\u4e00-\u9fa5]*',
-            r'[\u4e00-\u9fa5]*业务[\u4e00-\u9fa5]*',
-        ]
-        for pattern in business_patterns:
-            matches = re.findall(pattern, text)
-            key_info['business_info'].extend([m for m in matches if len(m) > 2])
-        key_info['business_info'] = list(set(key_info['business_info']))[:10]  # 限制数量
+        # 手机号（独立的11位数字，不从长数字串中截取）、金额、日期
+        entities = scan(text)
+        key_info['phone_numbers'] = entities.phones
+        key_info['amounts'] = entities.amounts
+        key_info['dates'] = entities.dates
         
-        # 提取地址信息
-        address_pattern = r'[\u4e00-\u9fa5]{2,}省[\u4e00-\u9fa5]{2,}市[\u4e00-\u9fa5]{2,}[区县]?[\u4e00-\u9fa5]*'
-        key_info['addresses'] = list(set(re.findall(address_pattern, text)))
+        # 提取业务信息（套餐、资费等）、地址（按连续汉字段线性扫描，长文本不回溯）
+        business_info = keyword_phrases(text, BUSINESS_PHRASE_KEYWORDS)
+        key_info['business_info'] = list(dict.fromkeys(business_info))[:PDFTextAccumulator.MAX_BUSINESS_INFO]
+        key_info['addresses'] = list(dict.fromkeys(addresses(text)))
         
         return key_info
     
     def extract_batch(self, pdf_files: List[str]) -> List[Dict[str, Any]]:
-        """批量提取PDF文本"""
-        results = []
+        """批量提取PDF文本（结果顺序与输入一致）"""
+        order = {pdf_file: index for index, pdf_file in enumerate(pdf_files)}
+        return sorted(self.iter_batch(pdf_files), key=lambda result: order[result['file_path']])
+    
+    def iter_batch(self,
+                   pdf_files: List[str],
+                   workers: Optional[int] = None,
+                   timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        批量提取PDF文本，按完成顺序返回结果
+        
+        多进程时每个文件单独计时，超时或处理进程崩溃只影响对应文件（记为失败结果），其余文件继续处理
+        
+        Args:
+            pdf_files: PDF文件路径列表
+            workers: 进程数（默认使用 batch_workers）
+            timeout: 单个文件的超时秒数（默认使用 batch_timeout）
+            
+        Yields:
+            提取结果（另含 file_path）
+        """
+        workers = workers or self.batch_workers
+        timeout = timeout if timeout is not None else self.batch_timeout
+        
+        if workers <= 1 or len(pdf_files) <= 1:
+            for pdf_file in pdf_files:
+                logger.info(f"处理PDF: {pdf_file}")
+                yield {**self.extract_from_pdf(pdf_file), 'file_path': pdf_file}
+            return
+        
+        yield from self._iter_batch_parallel(pdf_files, workers, timeout)
+    
+    def _iter_batch_parallel(self,
+                             pdf_files: List[str],
+                             workers: int,
+                             timeout: Optional[float]) -> Iterator[Dict[str, Any]]:
+        """
+        进程池批量提取
         
-        for pdf_file in pdf_files:
-            logger.info(f"处理PDF: {pdf_file}")
-            result = self.extract_from_pdf(pdf_file)
-            results.append(result)
+        同时提交的文件数不超过进程数，提交时间即开始处理的时间，据此计算每个文件的截止时间。
+        某个文件超时后重建进程池（结束卡住的进程），其余正在处理的文件重新排队；
+        进程崩溃时无法确定是哪个文件导致的，当时正在处理的文件改为逐个单独处理，再次崩溃的记为失败
+        """
+        options = self._worker_options()
+        queued = deque(pdf_files)
+        isolated: deque = deque()
+        running: Dict[Future, Tuple[str, float, bool]] = {}
+        pool: Optional[ProcessPoolExecutor] = None
         
-        return results
+        try:
+            while queued or isolated or running:
+                if pool is None:
+                    pool = self._create_batch_pool(workers)
+                
+                # 有待单独处理的文件时，等当前文件处理完后逐个提交
+                if isolated:
+                    if not running:
+                        pdf_file = isolated.popleft()
+                        running[pool.submit(_extract_pdf_worker, pdf_file, options)] = (
+                            pdf_file, self._deadline(timeout), True)
+                else:
+                    while queued and len(running) < workers:
+                        pdf_file = queued.popleft()
+                        logger.info(f"处理PDF: {pdf_file}")
+                        running[pool.submit(_extract_pdf_worker, pdf_file, options)] = (
+                            pdf_file, self._deadline(timeout), False)
+                
+                wait_seconds = max(0.0, min(deadline for _, deadline, _ in running.values()) - time.monotonic())
+                done, _ = wait(list(running), timeout=None if timeout is None else wait_seconds,
+                               return_when=FIRST_COMPLETED)
+                
+                broken = timed_out = False
+                for future in done:
+                    pdf_file, _, alone = running.pop(future)
+                    try:
+                        yield {**future.result(), 'file_path': pdf_file}
+                    except BrokenProcessPool:
+                        broken = True
+                        if alone:
+                            logger.error(f"PDF提取进程异常退出: {pdf_file}")
+                            yield self._failed_result(pdf_file, '提取进程异常退出')
+                        else:
+                            isolated.append(pdf_file)
+                    except Exception as e:
+                        logger.error(f"PDF提取失败 {pdf_file}: {e}")
+                        yield self._failed_result(pdf_file, str(e))
+                
+                if not done and running:
+                    now = time.monotonic()
+                    for future in [f for f, (_, deadline, _) in running.items() if deadline <= now]:
+                        pdf_file, _, _ = running.pop(future)
+                        logger.error(f"PDF提取超时（{timeout}秒）: {pdf_file}")
+                        yield self._failed_result(pdf_file, f'提取超时（{timeout}秒）')
+                        timed_out = True
+                
+                if broken or timed_out:
+                    # 重建进程池（结束卡住的进程）；进程池崩溃时其余正在处理的文件也会失败，改为单独处理，
+                    # 仅超时时其余文件重新排队
+                    for pdf_file, _, _ in running.values():
+                        if broken:
+                            isolated.append(pdf_file)
+                        else:
+                            queued.appendleft(pdf_file)
+                    running.clear()
+                    self._terminate_batch_pool(pool)
+                    pool = None
+        finally:
+            if pool is not None:
+                self._terminate_batch_pool(pool)
+    
+    def _worker_options(self) -> Dict[str, Any]:
+        """创建子进程中提取器所需的参数"""
+        return {
+            'template_keywords': self.template_keywords,
+            'important_keywords': self.important_keywords,
+            'low_memory': self.low_memory,
+            'max_filtered_chars': self.max_filtered_chars,
+            'bill_tables': self.bill_extractor is not None,
+            'page_budget': self.page_scorer.page_budget if self.page_scorer else 0,
+            'page_min_score': self.page_scorer.min_score if self.page_scorer else 0.0,
+            'boilerplate_path': self.boilerplate_path,
+        }
+    
+    @staticmethod
+    def _deadline(timeout: Optional[float]) -> float:
+        return time.monotonic() + timeout if timeout is not None else float('inf')
+    
+    @staticmethod
+    def _failed_result(pdf_path: str, error: str) -> Dict[str, Any]:
+        return {
+            'file_name': Path(pdf_path).name,
+            'file_type': 'pdf',
+            'file_path': pdf_path,
+            'error': error,
+            'status': 'failed'
+        }
+    
+    @staticmethod
+    def _create_batch_pool(workers: int) -> ProcessPoolExecutor:
+        # 调用方可能存在多个线程，避免直接fork
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    
+    @staticmethod
+    def _terminate_batch_pool(pool: ProcessPoolExecutor):
+        """关闭进程池并结束仍在运行的进程（超时的文件无法通过取消任务停止）"""
+        terminate = getattr(pool, 'terminate_workers', None)  # Python 3.14+
+        if terminate is not None:
+            terminate()
+            return
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
     
     def get_summary(self, extract_result: Dict[str, Any]) -> str:
         """生成提取结果摘要"""
@@ -252,3 +464,123 @@ class PDFTextExtractor:
             summary_parts.append(f"业务: {', '.join(key_info['business_info'][:3])}")
         
         return ' | '.join(summary_parts)
+
+
+# 子进程内复用的提取器（同一进程池中的参数相同）
+_worker_extractor: Optional[Tuple[Tuple, PDFTextExtractor]] = None
+
+
+def _extract_pdf_worker(pdf_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """进程池中提取单个PDF"""
+    global _worker_extractor
+    key = tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in options.items())
+    if _worker_extractor is None or _worker_extractor[0] != key:
+        _worker_extractor = (key, PDFTextExtractor(**options))
+    return _worker_extractor[1].extract_from_pdf(pdf_path)
+
+
+class PDFTextAccumulator:
+    """
+    逐页累加PDF提取结果：每页文字到达时即过滤模板并提取关键信息，
+    原文可以不保留（低内存模式），页面可以乱序加入（如并发识别的页面）
+    """
+    
+    # 业务信息的保留条数
+    MAX_BUSINESS_INFO = 10
+    
+    def __init__(self,
+                 extractor: PDFTextExtractor,
+                 keep_raw_text: bool = True,
+                 max_filtered_chars: Optional[int] = None):
+        """
+        初始化
+        
+        Args:
+            extractor: 提供模板过滤和关键信息提取规则的PDFTextExtractor
+            keep_raw_text: 是否保留原文（结果中的 full_text、page_texts）
+            max_filtered_chars: 保留的过滤后文本字符数上限（None为不限），超出后的页面只提取关键信息
+        """
+        self.extractor = extractor
+        self.keep_raw_text = keep_raw_text
+        self.max_filtered_chars = max_filtered_chars
+        
+        self.total_pages = 0
+        self.total_chars = 0
+        self.filtered_chars = 0
+        self.truncated = False
+        self._raw_pages: Dict[int, Dict[str, Any]] = {}
+        self._filtered_pages: Dict[int, str] = {}
+        self._key_info: Dict[str, Dict[str, None]] = {}
+        self._fee_rows: Dict[int, List[Dict[str, str]]] = {}
+        self._skipped_pages: Dict[int, Dict[str, Any]] = {}
+    
+    def add_page(self, item: Dict[str, Any]):
+        """
+        加入一页
+        
+        Args:
+            item: {'page': 页码, 'text': 文本}，可附带 fee_rows（费用明细）、skipped（跳过原因）、error 等字段
+        """
+        page, text = item['page'], item.get('text', '')
+        self.total_pages += 1
+        self.total_chars += len(text)
+        if self.keep_raw_text:
+            self._raw_pages[page] = item
+        if item.get('fee_rows'):
+            self._fee_rows[page] = item['fee_rows']
+        if 'skipped' in item:
+            self._skipped_pages[page] = {'page': page, 'skipped': item['skipped'],
+                                         **({'relevance': item['relevance']} if 'relevance' in item else {})}
+            return
+        
+        filtered = self.extractor._filter_template_content(text)
+        if not filtered:
+            return
+        
+        for key, values in self.extractor._extract_key_information(filtered).items():
+            self._key_info.setdefault(key, {}).update(dict.fromkeys(values))
+        
+        if self.max_filtered_chars is not None and self.filtered_chars + len(filtered) > self.max_filtered_chars:
+            self.truncated = True
+            return
+        self._filtered_pages[page] = filtered
+        self.filtered_chars += len(filtered) + 1
+    
+    def result(self, pdf_path: str) -> Dict[str, Any]:
+        """
+        生成提取结果（与 PDFTextExtractor.extract_from_pdf 的结构相同；不保留原文时没有 full_text、page_texts）
+        
+        Args:
+            pdf_path: PDF文件路径
+            
+        Returns:
+            提取结果
+        """
+        filtered_text = '\n'.join(self._filtered_pages[page] for page in sorted(self._filtered_pages))
+        key_info = {key: list(self._key_info.get(key, {})) for key in
+                    ('phone_numbers', 'amounts', 'dates', 'names', 'addresses', 'business_info')}
+        key_info['business_info'] = key_info['business_info'][:self.MAX_BUSINESS_INFO]
+        
+        logger.info(f"PDF提取完成，共{self.total_pages}页，提取{len(filtered_text)}字符")
+        
+        result = {
+            'file_name': Path(pdf_path).name,
+            'file_type': 'pdf',
+            'total_pages': self.total_pages,
+            'filtered_text': filtered_text,
+            'key_info': key_info,
+            'status': 'success'
+        }
+        if self.keep_raw_text:
+            page_texts = [self._raw_pages[page] for page in sorted(self._raw_pages)]
+            result['full_text'] = "".join(item.get('text', '') + "\n" for item in page_texts)
+            result['page_texts'] = page_texts
+        else:
+            result['total_chars'] = self.total_chars
+        if self.truncated:
+            result['filtered_truncated'] = True
+        if self._skipped_pages:
+            result['skipped_pages'] = [self._skipped_pages[page] for page in sorted(self._skipped_pages)]
+        if self._fee_rows:
+            result['fee_rows'] = [row for page in sorted(self._fee_rows) for row in self._fee_rows[page]]
+        return result
@@ -0,0 +1,230 @@
+"""
+感知哈希索引
+为已识别的附件计算dHash（64位差值哈希），存入紧凑的uint64数组文件，
+新附件按汉明距离检索：重新裁剪、压缩过的相同截图可直接复用之前的识别结果
+（只索引与具体业务数据无关的操作指引类图片；每条记录带有识别版本（提示词档位、输出格式等），只复用同一版本的结果）
+"""
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 识别结果中的内容类型标记（视觉模型按【类型】格式输出）
+CONTENT_TYPE_PATTERN = re.compile(r'【([^】]{1,30})】')
+
+# 可复用相似图片识别结果的内容类型：APP截图、操作入口、知识库截图等通用图片。
+# 凭证、账单、聊天记录等业务截图版式相同时哈希也很接近，但号码、金额不同，不能复用
+REUSABLE_CONTENT_TYPES = frozenset({'操作指引'})
+
+# 默认的最大汉明距离（64位中不同的位数）
+DEFAULT_MAX_DISTANCE = 4
+
+# 一次检索最多读取的候选记录数（按距离从近到远）
+MAX_CANDIDATES = 256
+
+# 每个字节的置1位数（旧版NumPy没有bitwise_count时使用）
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def content_type_of(content: str) -> Optional[str]:
+    """从识别结果的【类型】标记中提取内容类型（【操作指引类-...】归为操作指引），没有标记时返回None"""
+    match = CONTENT_TYPE_PATTERN.search(content)
+    if not match:
+        return None
+    content_type = match.group(1)
+    return '操作指引' if content_type.startswith('操作指引') else content_type
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    计算64位差值哈希：缩放为9x8灰度图，比较每行相邻像素的明暗
+
+    Args:
+        image: PIL图片
+
+    Returns:
+        哈希值（无符号64位整数）
+    """
+    small = image.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def dhash_bytes(image_data: bytes) -> int:
+    """计算图片数据的dHash（JPEG使用草稿模式解码，只解码到很小的尺寸）"""
+    with Image.open(io.BytesIO(image_data)) as img:
+        img.draft('L', (64, 64))
+        return dhash(img)
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """计算数组中每个哈希与给定哈希的汉明距离"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor)
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class PerceptualHashIndex:
+    """已识别附件的感知哈希索引（哈希存于uint64数组文件，识别结果存于SQLite）"""
+
+    HASH_FILE = 'phash_index.u64'
+    DB_NAME = 'phash_index.sqlite3'
+
+    def __init__(self, index_dir: str = 'output/phash_index', max_distance: int = DEFAULT_MAX_DISTANCE):
+        """
+        初始化索引
+
+        Args:
+            index_dir: 索引目录
+            max_distance: 视为同一张图片的最大汉明距离（64位中不同的位数）
+        """
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.hash_path = self.index_dir / self.HASH_FILE
+        self.db_path = self.index_dir / self.DB_NAME
+        self.max_distance = max_distance
+
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._loaded_size = -1
+        self._lock = threading.Lock()
+
+        self._init_db()
+        self.hash_path.touch(exist_ok=True)
+        self._refresh()
+        logger.info(f"感知哈希索引: {self.index_dir}，已有 {len(self._hashes)} 条")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=10)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " row INTEGER PRIMARY KEY,"
+                " content TEXT NOT NULL,"
+                " content_type TEXT,"
+                " source TEXT,"
+                " created REAL NOT NULL,"
+                " version TEXT)"
+            )
+            # 旧索引没有版本列：补上后旧记录的版本为空，不再被带版本的检索复用
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN version TEXT")
+        conn.close()
+
+    def _refresh(self):
+        """哈希文件被（其他进程）追加后重新映射"""
+        size = os.path.getsize(self.hash_path)
+        if size == self._loaded_size:
+            return
+        self._loaded_size = size
+        count = size // 8
+        # 只写入了一部分的哈希不计入，条数不变时继续使用当前映射
+        if count == len(self._hashes):
+            return
+        # 映射无法扩展：先释放旧映射（正在检索的线程用完后关闭），再映射追加后的文件
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        if count:
+            self._hashes = np.memmap(self.hash_path, dtype=np.uint64, mode='r', shape=(count,))
+
+    @property
+    def size(self) -> int:
+        """索引中的哈希条数"""
+        return len(self._hashes)
+
+    def lookup(self, image_hash: int, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        查找最相近的同一识别版本的已识别通用图片（内容类型属于 REUSABLE_CONTENT_TYPES）
+
+        Args:
+            image_hash: 图片的dHash
+            version: 识别版本（与添加时一致的记录才会返回）
+
+        Returns:
+            距离不超过阈值时返回 {content, content_type, source, distance}，否则返回None
+        """
+        with self._lock:
+            self._refresh()
+            hashes = self._hashes
+        if not len(hashes):
+            return None
+
+        distances = hamming_distances(hashes, image_hash)
+        candidates = np.flatnonzero(distances <= self.max_distance)
+        if not len(candidates):
+            return None
+        # 按距离从近到远取候选，返回其中最近的同版本记录（哈希已写入但记录尚未提交的行会被跳过）
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')][:MAX_CANDIDATES].tolist()
+
+        try:
+            conn = self._connect()
+            try:
+                entries = {
+                    row: (content, content_type, source)
+                    for row, content, content_type, source in conn.execute(
+                        "SELECT row, content, content_type, source FROM entries "
+                        f"WHERE version IS ? AND content_type IN ({','.join('?' * len(REUSABLE_CONTENT_TYPES))}) "
+                        f"AND row IN ({','.join('?' * len(candidates))})",
+                        (version, *sorted(REUSABLE_CONTENT_TYPES), *candidates)
+                    )
+                }
+            finally:
+                conn.close()
+            for row in candidates:
+                if row in entries:
+                    content, content_type, source = entries[row]
+                    return {'content': content, 'content_type': content_type, 'source': source,
+                            'distance': int(distances[row])}
+        except sqlite3.Error as e:
+            logger.warning(f"读取感知哈希索引失败: {e}")
+        return None
+
+    def add(self, image_hash: int, content: str, source: str = '', content_type: Optional[str] = None,
+            version: Optional[str] = None):
+        """
+        添加一条已识别的图片（内容类型不属于 REUSABLE_CONTENT_TYPES 的业务图片不索引）
+
+        Args:
+            image_hash: 图片的dHash
+            content: 识别结果
+            source: 来源（文件名）
+            content_type: 内容类型，为None时从识别结果的【类型】标记中提取
+            version: 识别版本（提示词档位、输出格式等，检索时只复用同一版本的结果）
+        """
+        if content_type is None:
+            content_type = content_type_of(content)
+        if content_type not in REUSABLE_CONTENT_TYPES:
+            return
+
+        try:
+            conn = self._connect()
+            try:
+                # 写事务同时作为多进程追加哈希文件的锁
+                conn.execute("BEGIN IMMEDIATE")
+                row = os.path.getsize(self.hash_path) // 8
+                with open(self.hash_path, 'ab') as f:
+                    f.write(np.uint64(image_hash).tobytes())
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries(row, content, content_type, source, created, version) "
+                    "VALUES(?, ?, ?, ?, ?, ?)",
+                    (row, content, content_type, source, time.time(), version)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"写入感知哈希索引失败: {e}")
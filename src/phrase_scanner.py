@@ -0,0 +1,96 @@
+"""
+业务短语扫描（线性时间）
+"[一-龥]*套餐[一-龥]*"、地址、套餐名称这类正则在长段连续汉字（OCR、PDF文字）上
+会反复回溯：每个起点都扫到汉字段末尾再逐字退回，整体为平方甚至立方时间，一段200KB的文字可以占住进程数秒。
+这里先用单个字符类把文本切分为连续汉字段（或单词段），再在段内用 str.find / rfind 判断，
+每个字符只被扫描常数次；结果与原正则的 findall 相同
+"""
+import re
+from typing import Iterable, List
+
+# 连续汉字段（与原正则的字符类相同）
+CJK_RUN_PATTERN = re.compile(r'[一-龥]+')
+
+# 套餐名称的起点：套餐品牌字，或数字串的第一位
+PACKAGE_BRANDS = '沃畅冰神'
+PACKAGE_START_PATTERN = re.compile(rf'[{PACKAGE_BRANDS}]|(?<!\d)\d')
+
+# 沃派39元套餐、畅爽冰激凌129元20GB套（数字串长度决定扫描量，每个起点只扫描自己的数字串）
+PACKAGE_NUMBER_PATTERN = re.compile(rf'[{PACKAGE_BRANDS}]派?\d+元\d*套餐?')
+PACKAGE_PRICE_PATTERN = re.compile(r'\d+元套餐')
+WORD_RUN_PATTERN = re.compile(r'\w+')
+
+PACKAGE_SUFFIX = '套餐'
+
+
+def cjk_runs(text: str) -> List[str]:
+    """文本中的连续汉字段"""
+    return CJK_RUN_PATTERN.findall(text)
+
+
+def keyword_phrases(text: str, keywords: Iterable[str], min_chars: int = 3) -> List[str]:
+    """
+    含关键词的连续汉字段（等同于对每个关键词 findall "[汉字]*关键词[汉字]*"，按关键词顺序拼接，不去重）
+
+    Args:
+        text: 文本
+        keywords: 关键词（如 套餐、资费、业务）
+        min_chars: 短语的最少字数
+    """
+    runs = [run for run in cjk_runs(text) if len(run) >= min_chars]
+    return [run for keyword in keywords for run in runs if keyword in run]
+
+
+def addresses(text: str) -> List[str]:
+    """
+    地址：等同于 findall "[汉字]{2,}省[汉字]{2,}市[汉字]{2,}[区县]?[汉字]*"。
+    该正则总是匹配整个汉字段，汉字段中最早的可用"省"之后、末尾两字之前有"市"即可匹配
+    """
+    result = []
+    for run in cjk_runs(text):
+        province = run.find('省', 2)
+        if province >= 0 and run.find('市', province + 3, len(run) - 2) >= 0:
+            result.append(run)
+    return result
+
+
+def package_names(text: str) -> List[str]:
+    """
+    套餐名称：等同于 findall "[沃畅冰神]派?\\d+元\\d*套餐?|[沃畅冰神]派\\w+套餐|\\d+元套餐"。
+    "派\\w+套餐"取单词段中最后一个"套餐"，每个单词段只查找一次
+    """
+    result = []
+    run_start = run_end = last_suffix = -1
+    pos = 0
+    while True:
+        start = PACKAGE_START_PATTERN.search(text, pos)
+        if not start:
+            return result
+        index = start.start()
+        if text[index] not in PACKAGE_BRANDS:
+            match = PACKAGE_PRICE_PATTERN.match(text, index)
+            if match:
+                result.append(match.group())
+                pos = match.end()
+            else:
+                pos = index + 1
+            continue
+
+        match = PACKAGE_NUMBER_PATTERN.match(text, index)
+        if match:
+            result.append(match.group())
+            pos = match.end()
+            continue
+
+        if text.startswith('派', index + 1):
+            words = index + 2
+            if not run_start <= words < run_end:
+                run = WORD_RUN_PATTERN.match(text, words)
+                run_start, run_end = (words, run.end()) if run else (words, words)
+                last_suffix = text.rfind(PACKAGE_SUFFIX, run_start, run_end)
+            # 品牌字、"派"与"套餐"之间至少一个字符
+            if last_suffix >= words + 1:
+                result.append(text[index:last_suffix + len(PACKAGE_SUFFIX)])
+                pos = last_suffix + len(PACKAGE_SUFFIX)
+                continue
+        pos = index + 1
@@ -0,0 +1,78 @@
+"""
+视觉识别提示词档位
+完整档输出摘要、详细内容、关键信息和费用明细；关键字段档只输出类型、摘要和关键信息；
+分类档只输出类型和一句话摘要。各档位有各自的输出token上限，
+按文件名、图片尺寸和质量预检结果等低成本信号为每个附件选择档位
+"""
+import re
+from typing import Dict, Any, Optional, Tuple
+
+# 档位
+PROFILE_AUTO = 'auto'
+PROFILE_FULL = 'full'
+PROFILE_KEY_FIELDS = 'key_fields'
+PROFILE_CLASSIFY = 'classify'
+
+PROFILES = (PROFILE_FULL, PROFILE_KEY_FIELDS, PROFILE_CLASSIFY)
+
+# 各档位的输出token上限
+MAX_TOKENS = {
+    PROFILE_FULL: 1500,
+    PROFILE_KEY_FIELDS: 500,
+    PROFILE_CLASSIFY: 150,
+}
+
+# 长截图分块转写的输出token上限（每块）
+TILE_MAX_TOKENS = 2000
+
+# 关键字段档：与完整档相同的标记格式，省略详细内容和费用明细
+KEY_FIELDS_PROMPT = """请识别这张图片，只输出以下内容，不要输出其他说明：
+【类型】（从【业务凭证】、【账单明细】、【记录查询】、【沟通记录】、【操作指引】、【其他】中选择一个）
+**内容摘要**：[1句话概括]
+**关键信息**：[手机号码（独立的11位数字）、套餐/业务名称、金额（XX元及费用名称）、关键日期，没有则写"无"]"""
+
+# 分类档：只判断类型并概括
+CLASSIFY_PROMPT = """请判断这张图片的内容类型并用一句话概括，只输出两行：
+【类型】（从【业务凭证】、【账单明细】、【记录查询】、【沟通记录】、【操作指引】、【其他】中选择一个；
+APP截图、操作入口、知识库截图等请标注为【操作指引类-与具体业务数据无关】）
+**内容摘要**：[1句话概括]"""
+
+# 文件名信号：账单、凭证类需要完整提取；操作指引类只需分类
+FULL_NAME_PATTERN = re.compile(r'账单|明细|详单|费用|话费|扣费|协议|合同|受理单|凭证|bill', re.IGNORECASE)
+CLASSIFY_NAME_PATTERN = re.compile(r'指引|知识库|入口')
+# 业务截图也常用的词（销户操作记录、办理界面截图），不能据此只分类，改用关键字段档
+AMBIGUOUS_NAME_PATTERN = re.compile(r'操作|界面|(?<![a-z])app(?![a-z])', re.IGNORECASE)
+
+# 小于该像素数的图片（图标、局部裁剪的小截图）内容有限，使用关键字段档
+SMALL_IMAGE_PIXELS = 300_000
+
+
+def select_profile(image_name: str,
+                   width: int = 0,
+                   height: int = 0,
+                   quality: Optional[Dict[str, Any]] = None,
+                   default: str = PROFILE_FULL) -> Tuple[str, str]:
+    """
+    为一张图片选择提示词档位
+
+    Args:
+        image_name: 图片名称（文件名，PDF页面为"文件名 第N页"）
+        width: 图片宽度（未知时为0）
+        height: 图片高度（未知时为0）
+        quality: 质量预检结果（ImageQualityChecker.check）
+        default: 没有明确信号时使用的档位
+
+    Returns:
+        (档位, 选择原因)
+    """
+    if FULL_NAME_PATTERN.search(image_name):
+        return PROFILE_FULL, '文件名为账单/凭证类'
+    if CLASSIFY_NAME_PATTERN.search(image_name):
+        return PROFILE_CLASSIFY, '文件名为操作指引类'
+    if AMBIGUOUS_NAME_PATTERN.search(image_name):
+        return PROFILE_KEY_FIELDS, '文件名可能为操作界面截图'
+    if quality and quality.get('low_quality'):
+        return PROFILE_KEY_FIELDS, '图片质量较差'
+    if 0 < width * height < SMALL_IMAGE_PIXELS:
+        return PROFILE_KEY_FIELDS, '图片尺寸较小'
+    return default, '默认档位'
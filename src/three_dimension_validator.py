@@ -8,6 +8,9 @@ from typing import Dict, List, Any, Optional
 import logging
 from openai import OpenAI
 
+from entity_scanner import scan
+from phrase_scanner import package_names
+
 logger = logging.getLogger(__name__)
 
 
@@ -411,11 +414,15 @@ class ImageInfoExtractor:
                 # 图片视觉识别结果
                 content = result.get('content', '')
             
-            # 提取关键信息
-            extracted = self._extract_key_info(content, idx, filename)
+            # 提取关键信息（有视觉模型的结构化结果时直接使用）
+            extracted = self._extract_key_info(content, idx, filename, result.get('structured'))
             
             # 判断状态
-            if result.get('error') or result.get('status') == 'failed':
+            skipped = result.get('metadata', {}).get('skipped')
+            if skipped:
+                status = f"图片质量不足（{skipped}）"
+                pic_input["整体状态"]["模糊图片"] += 1
+            elif result.get('error') or result.get('status') == 'failed':
                 status = "识别失败"
                 pic_input["整体状态"]["模糊图片"] += 1
             elif len(content.strip()) < 20:
@@ -447,38 +454,25 @@ class ImageInfoExtractor:
         
         return pic_input
     
-    def _extract_key_info(self, content: str, idx: int, filename: str) -> Dict[str, Any]:
+    def _extract_key_info(self, content: str, idx: int, filename: str,
+                          structured: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """从内容中提取关键信息"""
+        if structured:
+            return self._structured_key_info(structured, filename)
         
-        # 提取号码类
-        phone_numbers = list(set(re.findall(r'(?<!\d)1[3-9]\d{9}(?!\d)', content)))
-        
-        # 尝试区分业务号码和联系号码
-        business_numbers = []
-        contact_numbers = []
-        
-        for phone in phone_numbers:
-            # 简单规则：如果号码前后有"业务"、"签约"等关键词，判定为业务号码
-            pattern = rf'(业务|签约|办理|开通|套餐).{{0,20}}{phone}|{phone}.{{0,20}}(业务|签约|办理|开通|套餐)'
-            if re.search(pattern, content):
-                business_numbers.append(phone)
-            # 如果有"联系"、"备用"、"家人"等关键词，判定为联系号码
-            elif re.search(rf'(联系|备用|家人|沟通).{{0,20}}{phone}|{phone}.{{0,20}}(联系|备用|家人|沟通)', content):
-                contact_numbers.append(phone)
-            else:
-                # 默认第一个号码为业务号码
-                if not business_numbers:
-                    business_numbers.append(phone)
-                else:
-                    contact_numbers.append(phone)
+        entities = scan(content)
+        
+        # 提取号码类，按号码前后的关键词（业务/签约/办理、联系/备用/家人等）区分业务号码和联系号码
+        phone_numbers = entities.phones
+        business_numbers, contact_numbers = entities.classify_phones()
         
         # 提取业务类
-        套餐名称 = re.findall(r'[沃畅冰神]派?\d+元\d*套餐?|[沃畅冰神]派\w+套餐|\d+元套餐', content)
+        套餐名称 = package_names(content)
         业务类型 = re.findall(r'(宽带|流量|话费|短信|彩铃|视频会员|合约)', content)
         
         # 提取数字类
-        金额 = list(set(re.findall(r'\d+\.?\d*元', content)))
-        日期 = list(set(re.findall(r'\d{4}[-年]\d{1,2}[-月]\d{1,2}[日号]?', content)))
+        金额 = entities.amounts
+        日期 = entities.dates
         
         # 从文件名提取附件名称
         附件名称 = self._parse_attachment_name(filename)
@@ -500,6 +494,33 @@ class ImageInfoExtractor:
             "附件名称": 附件名称
         }
     
+    def _structured_key_info(self, structured: Dict[str, Any], filename: str) -> Dict[str, Any]:
+        """由视觉模型的结构化结果生成关键信息（号码角色由模型标注，未标注的号码按正则提取的规则处理）"""
+        business_numbers = [p['number'] for p in structured['phones'] if p['role'] == '业务号码']
+        contact_numbers = [p['number'] for p in structured['phones'] if p['role'] == '联系号码']
+        for phone in structured['phones']:
+            if phone['role'] == '疑似号码':
+                # 与正则提取一致：没有业务号码时第一个号码作为业务号码
+                (contact_numbers if business_numbers else business_numbers).append(phone['number'])
+        
+        return {
+            "号码类": {
+                "业务号码": business_numbers,
+                "联系号码": contact_numbers,
+                "所有号码": [p['number'] for p in structured['phones']]
+            },
+            "业务类": {
+                "套餐名称": structured['packages'],
+                "业务类型": list(set(re.findall(r'(宽带|流量|话费|短信|彩铃|视频会员|合约)',
+                                            ' '.join(structured['packages'] + [structured['summary']]))))
+            },
+            "数字类": {
+                "金额": [amount['value'] for amount in structured['amounts']],
+                "日期": [date['value'] for date in structured['dates']]
+            },
+            "附件名称": self._parse_attachment_name(filename)
+        }
+    
     def _parse_attachment_name(self, filename: str) -> Dict[str, str]:
         """解析附件文件名"""
         # 格式：编号-名称.扩展名
@@ -591,7 +612,7 @@ class PDFInfoExtractor:
             else:
                 # 降级：从内容中提取
                 extractor = ImageInfoExtractor(None, None)
-                extracted = extractor._extract_key_info(content, idx, filename)
+                extracted = extractor._extract_key_info(content, idx, filename, result.get('structured'))
             
             # 判断状态
             if result.get('error') or result.get('status') == 'failed':
@@ -0,0 +1,208 @@
+"""
+视觉识别结果缓存
+以图片内容哈希 + 模型名 + 提示词版本为键，将识别结果持久化到磁盘，
+避免同一张图片重复调用视觉模型
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VisionCache:
+    """视觉识别结果磁盘缓存（内容寻址，按容量LRU淘汰，多进程共享）"""
+
+    DB_NAME = 'vision_cache.sqlite3'
+
+    def __init__(self, cache_dir: str = 'output/vision_cache', max_size_mb: float = 500):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存内容总大小上限（MB），超出后淘汰最久未使用的条目
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_NAME
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        # 本进程内的命中统计
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._init_db()
+        logger.info(f"视觉识别缓存: {self.db_path}，容量上限 {max_size_mb}MB")
+
+    @staticmethod
+    def make_key(image_data: bytes, model: str, prompt_version: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            image_data: 图片二进制数据
+            model: 视觉模型名称
+            prompt_version: 提示词版本（提示词变化时需更新，使旧结果失效）
+
+        Returns:
+            十六进制哈希字符串
+        """
+        digest = hashlib.sha256(image_data).hexdigest()
+        return hashlib.sha256(f"{digest}|{model}|{prompt_version}".encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，保证多线程/多进程安全"""
+        return sqlite3.connect(str(self.db_path), timeout=10)
+
+    def _init_db(self):
+        """初始化数据表（WAL模式允许多个进程并发读写）"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " content TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " name TEXT PRIMARY KEY,"
+                " value INTEGER NOT NULL)"
+            )
+        conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的识别结果，未命中返回None
+        """
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute("SELECT content FROM entries WHERE key = ?", (key,)).fetchone()
+                    counter = 'hits' if row else 'misses'
+                    if row:
+                        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                    conn.execute(
+                        "INSERT INTO counters(name, value) VALUES(?, 1) "
+                        "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                        (counter,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"读取识别缓存失败: {e}")
+            return None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return row[0] if row else None
+
+    def put(self, key: str, content: str):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            content: 识别结果
+        """
+        size = len(content.encode('utf-8'))
+        now = time.time()
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries(key, content, size, created, last_access) "
+                        "VALUES(?, ?, ?, ?, ?)",
+                        (key, content, size, now, now)
+                    )
+                    self._evict(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"写入识别缓存失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """按最近访问时间淘汰条目，直到总大小回落到上限的90%"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+
+        logger.info(f"识别缓存淘汰 {evicted} 条，当前大小 {total / 1024 / 1024:.1f}MB")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            本进程命中/未命中次数、所有进程累计次数、条目数和占用大小
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+        try:
+            conn = self._connect()
+            try:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+                counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            finally:
+                conn.close()
+            stats.update({
+                'total_hits': counters.get('hits', 0),
+                'total_misses': counters.get('misses', 0),
+                'entries': entries,
+                'size_bytes': size,
+            })
+        except sqlite3.Error as e:
+            logger.warning(f"读取识别缓存统计失败: {e}")
+
+        return stats
+
+    def clear(self):
+        """清空缓存"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM counters")
+        finally:
+            conn.close()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
@@ -3,110 +3,366 @@
 直接使用千问视觉模型（qwen-vl）识别图片内容，跳过OCR
 """
 import os
+import asyncio
 import base64
 import json
+import multiprocessing
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Any
-import fitz  # PyMuPDF
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
 from PIL import Image
 import io
 import logging
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from vision_cache import VisionCache
+from vision_resilience import VisionRequestError, get_resilient_caller
+from ocr_tier import OCRTier
+from phash_index import DEFAULT_MAX_DISTANCE, PerceptualHashIndex, dhash_bytes
+from image_quality import STATUS_NAMES, DuplicatePageTracker, ImageQualityChecker, ImageSkipped
+from image_preprocessor import ImagePreprocessor
+from image_tiler import ImageTiler
+from page_relevance import PageRelevanceScorer
+from vision_schema import merge_structured, parse_structured, render_markdown, structured_prompt
+from prompt_profiles import (CLASSIFY_PROMPT, KEY_FIELDS_PROMPT, MAX_TOKENS, PROFILE_AUTO, PROFILE_CLASSIFY,
+                             PROFILE_FULL, PROFILE_KEY_FIELDS, PROFILES, TILE_MAX_TOKENS, select_profile)
+from pdf_page_renderer import TARGET_LONG_EDGE, render_page, render_pdf_page
+from attachment_source import AttachmentSource, as_source
+from entity_scanner import scan
 
 logger = logging.getLogger(__name__)
 
+# 流式识别部分结果的回调 (识别对象名称, 已输出的文本)，按 VisionProcessor.PARTIAL_INTERVAL 节流，可能在工作线程中调用
+PartialCallback = Callable[[str, str], None]
+
+# 提示词版本：修改 VISION_PROMPT 后需同步更新，使识别缓存中的旧结果失效
+VISION_PROMPT_VERSION = "v1"
+
+# 构建提示词 - 增加内容类型判断和深度理解
+VISION_PROMPT = """你是图片内容理解与信息提取专家。请仔细分析这张图片，理解其含义并提取关键信息。
+
+**第一步：判断图片内容类型**
+请先判断这张图片属于以下哪种类型，并在开头用【】标注：
+- 【业务凭证】：业务受理单、协议、合同、订单等（包含具体业务信息）
+- 【账单明细】：月度账单、费用清单、扣费记录等
+- 【记录查询】：联系记录、投诉记录、通话记录查询结果等
+- 【沟通记录】：微信/短信/在线客服聊天记录等
+- 【操作指引】：APP截图、操作入口、知识库截图等（说明如何操作）
+- 【其他】：无法归类的图片
+
+**第二步：内容理解与摘要**
+请用1-2句话概括这张图片的核心内容和意义。
+
+**第三步：提取关键信息**
+请提取以下内容（如果存在）：
+1. **号码类**：手机号码（必须是独立的11位数字，如13912345678，不要从长数字串中截取）
+2. **业务类**：套餐名称、业务类型、协议编号
+3. **金额类**：具体金额（XX元），并说明是什么费用
+4. **日期类**：关键日期（办理日期、生效日期、到期日期等）
+5. **沟通要点**：如果是沟通记录，提取双方的关键对话内容和结论
+
+**第四步：如果是账单/费用类图片，请详细提取**
+如果图片包含账单或费用信息，请按以下格式逐月列出：
+```
+【月度费用明细】
+| 月份 | 套餐费 | 其他费用 | 优惠减免 | 应收 | 实收 |
+|------|--------|----------|----------|------|------|
+| 2024-01 | XX元 | XX元 | -XX元 | XX元 | XX元 |
+```
+如果无法识别完整表格，请尽量提取：
+- 每月出账金额
+- 各项收费项目名称和金额
+- 优惠/减免金额
+- 应收与实收的差异
+
+**第五步：标注与申诉的相关性**
+- 如果是"操作指引"类型，在开头标注：【操作指引类-与具体业务数据无关】
+- 如果是"沟通记录"，请总结沟通的结论和用户态度
+
+请按以下格式输出：
+【类型】
+**内容摘要**：[1-2句话概括]
+**详细内容**：[识别到的文字内容]
+**关键信息**：[提取的号码、金额、日期等]
+**费用明细**：[如有账单信息，列出月度费用明细表]"""
+
+# 多图合并请求的提示词（每张图片的回答以分隔标记开头，便于拆分回各文件）
+PACKED_PROMPT_TEMPLATE = """以下共有{count}张图片，请按顺序逐张独立分析，每张图片都按下面的要求完整输出。
+每张图片的输出必须以单独一行的分隔标记开头：===图片1===、===图片2===……直到===图片{count}===，不要遗漏或合并。
+
+{prompt}"""
+
+# PDF页面的识别名称（"文件名 第N页"），用于按页码排序各页的结构化结果
+PAGE_NAME_PATTERN = re.compile(r'第(\d+)页$')
+
+PACKED_SECTION_PATTERN = re.compile(r'^\s*===\s*图片\s*(\d+)\s*===\s*$', re.MULTILINE)
+
+# 长截图分块识别的提示词（各块逐行转写文字，合并后去掉重叠行）
+TILE_PROMPT_TEMPLATE = """这是一张长截图从上到下切分后的第{index}/{count}块，相邻分块之间有少量重叠。
+请先在第一行用【】标注整张截图的内容类型：【业务凭证】、【账单明细】、【记录查询】、【沟通记录】、【操作指引】或【其他】。
+然后按从上到下的顺序逐行原样输出本块中的全部文字：
+- 聊天记录在每条消息前标明发言方（如"客服："、"用户："）和可见的时间
+- 账单表格每行输出为一行，各列之间用" | "分隔
+- 被切断的不完整文字行也照原样输出
+不要总结，不要补充图片中没有的内容。"""
+
 
 class VisionProcessor:
     """视觉大模型处理器，直接调用千问VL模型识别图片"""
     
-    def __init__(self, api_key: str, model: str = "qwen3-vl-plus"):
+    # 流式识别时两次部分结果回调之间的最小间隔（秒）
+    PARTIAL_INTERVAL = 0.5
+    
+    def __init__(self,
+                 api_key: str,
+                 model: str = "qwen3-vl-plus",
+                 max_workers: int = 1,
+                 cache_dir: Optional[str] = None,
+                 cache_max_mb: float = 500,
+                 preprocess: bool = True,
+                 max_long_edge: int = 2048,
+                 jpeg_quality: int = 85,
+                 grayscale_screenshots: bool = False,
+                 pdf_render_workers: int = 2,
+                 pack_images: bool = False,
+                 pack_pixel_budget: int = 3_000_000,
+                 pack_max_images: int = 4,
+                 stream: bool = False,
+                 partial_callback: Optional[PartialCallback] = None,
+                 request_timeout: float = 60,
+                 retry_attempts: int = 3,
+                 retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 8.0,
+                 breaker_threshold: int = 5,
+                 breaker_reset_seconds: float = 30.0,
+                 hedge_requests: bool = False,
+                 ocr_first: bool = False,
+                 ocr_min_confidence: float = 85,
+                 ocr_max_low_conf_ratio: float = 0.15,
+                 ocr_min_entities: int = 1,
+                 tesseract_path: Optional[str] = None,
+                 phash_dir: Optional[str] = None,
+                 phash_max_distance: int = DEFAULT_MAX_DISTANCE,
+                 quality_check: bool = False,
+                 blur_threshold: float = 50,
+                 skip_blurry: bool = False,
+                 tile_tall_images: bool = False,
+                 tile_max_aspect_ratio: float = 3.0,
+                 prompt_profile: str = PROFILE_FULL,
+                 structured_output: bool = False,
+                 page_budget: int = 0,
+                 page_min_score: float = 0.0):
         """
         初始化视觉处理器
         
         Args:
             api_key: 千问API密钥
             model: 视觉模型名称，默认qwen3-vl-plus
+            max_workers: 批量识别时同时进行的最大请求数，1表示逐个识别
+            cache_dir: 识别结果缓存目录，为None时不启用缓存
+            cache_max_mb: 识别缓存容量上限（MB）
+            preprocess: 上传前是否规范化图片（限制长边、修正方向、重新编码）
+            max_long_edge: 规范化后的长边像素上限
+            jpeg_quality: 规范化重新编码的JPEG质量
+            grayscale_screenshots: 是否将文字截图转为灰度
+            pdf_render_workers: PDF页面渲染进程数，1表示在当前进程内逐页渲染
+            pack_images: 是否将多张小图片合并到一次请求中识别
+            pack_pixel_budget: 合并请求中所有图片的像素总数上限（单张超过一半的图片不参与合并）
+            pack_max_images: 合并请求中的最大图片数
+            stream: 是否以流式方式接收模型输出
+            partial_callback: 流式识别过程中的默认回调 (识别对象名称, 已输出的文本)，
+                按 PARTIAL_INTERVAL 节流，可能在工作线程中调用；各识别方法也可按次传入
+            request_timeout: 单次请求的超时时间（秒，含流式接收全部输出）
+            retry_attempts: 瞬时错误（超时、限流、5xx）的最大尝试次数
+            retry_base_delay: 重试退避基准时间（秒）
+            retry_max_delay: 单次重试退避的最长时间（秒）
+            breaker_threshold: 连续失败多少次后熔断
+            breaker_reset_seconds: 熔断冷却时间（秒）
+            hedge_requests: 请求超过近期p95耗时后是否发出对冲请求
+            ocr_first: 是否先用本地OCR识别，质量不达标时才调用视觉模型
+            ocr_min_confidence: 采用OCR结果所需的平均置信度（0-100）
+            ocr_max_low_conf_ratio: 采用OCR结果允许的低置信度文字占比
+            ocr_min_entities: 采用OCR结果所需的最少关键信息数（手机号、金额、日期）
+            tesseract_path: Tesseract可执行文件路径
+            phash_dir: 感知哈希索引目录，为None时不启用（相似的操作指引类图片复用已有识别结果）
+            phash_max_distance: 视为同一张图片的最大汉明距离
+            quality_check: 识别前是否预检图片质量（跳过空白、过暗的图片和PDF中的重复页）
+            blur_threshold: 清晰度（拉普拉斯方差）低于该值的图片视为模糊
+            skip_blurry: 模糊图片是否跳过识别（否则只在元数据中标记）
+            tile_tall_images: 是否将长截图切分为重叠的分块分别识别后合并
+            tile_max_aspect_ratio: 长宽比超过该值的图片分块识别
+            prompt_profile: 提示词档位（full / key_fields / classify），auto 表示按文件名、尺寸和质量逐张选择
+            structured_output: 是否要求模型输出JSON，解析校验后保存在结果的 structured 字段中
+                （识别内容仍为原格式的Markdown；不支持多图合并识别）
+            page_budget: 每个PDF最多识别的页数（0为不限），超出时按页面相关性保留
+            page_min_score: 相关性低于该分数的PDF页面不识别（0为不跳过），见 page_relevance
         """
+        # 重试由容错层统一处理，关闭客户端自带的重试
         self.client = OpenAI(
             api_key=api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+            max_retries=0
         )
         self.model = model
+        self.max_workers = max(1, int(max_workers or 1))
+        self.cache = VisionCache(cache_dir, cache_max_mb) if cache_dir else None
+        self.preprocessor = ImagePreprocessor(max_long_edge, jpeg_quality, grayscale_screenshots) if preprocess else None
+        self.tiler = ImageTiler(tile_max_aspect_ratio) if tile_tall_images else None
+        if prompt_profile != PROFILE_AUTO and prompt_profile not in PROFILES:
+            logger.warning(f"未知的提示词档位 {prompt_profile}，使用完整提取档")
+            prompt_profile = PROFILE_FULL
+        self.prompt_profile = prompt_profile
+        self.structured_output = structured_output
+        self.phash_index = PerceptualHashIndex(phash_dir, phash_max_distance) if phash_dir else None
+        self.page_scorer = PageRelevanceScorer(page_budget, page_min_score) if page_budget or page_min_score else None
+        self.quality_checker = ImageQualityChecker(
+            blur_threshold=blur_threshold,
+            skip_blurry=skip_blurry
+        ) if quality_check else None
+        self.ocr_tier = OCRTier(
+            min_confidence=ocr_min_confidence,
+            max_low_conf_ratio=ocr_max_low_conf_ratio,
+            min_entities=ocr_min_entities,
+            tesseract_path=tesseract_path
+        ) if ocr_first else None
+        self.pdf_render_workers = max(1, min(int(pdf_render_workers or 1), os.cpu_count() or 1))
+        self._render_pool: Optional[ProcessPoolExecutor] = None
+        self._render_pool_lock = threading.Lock()
+        # PyMuPDF不支持多线程并发渲染，当前进程内的渲染串行执行
+        self._inprocess_render_lock = threading.Lock()
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._async_client_loop = None
+        if pack_images and structured_output:
+            logger.info("结构化输出模式不支持多图合并识别，已关闭合并识别")
+            pack_images = False
+        self.pack_images = pack_images
+        self.pack_pixel_budget = pack_pixel_budget
+        self.pack_max_images = max(2, pack_max_images)
+        self.stream = stream
+        self.partial_callback = partial_callback
+        self.request_timeout = request_timeout
+        # 熔断状态与耗时统计在进程内按模型共享，每次请求新建处理器时仍然延续
+        self.resilience = get_resilient_caller(
+            model,
+            max_attempts=retry_attempts,
+            base_delay=retry_base_delay,
+            max_delay=retry_max_delay,
+            failure_threshold=breaker_threshold,
+            reset_timeout=breaker_reset_seconds,
+            hedge=hedge_requests
+        )
+        
+        # 全局在途请求上限（文件级与页面级并发嵌套时仍不超过max_workers）
+        self._request_slots = threading.BoundedSemaphore(self.max_workers)
+        self._metadata_lock = threading.Lock()
         self.supported_image_formats = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif', '.webp'}
         self.supported_pdf_format = '.pdf'
         
-        logger.info(f"视觉处理器初始化完成，使用模型: {model}")
+        logger.info(f"视觉处理器初始化完成，使用模型: {model}，并发数: {self.max_workers}")
     
-    def process_file(self, file_path: str) -> Dict[str, Any]:
+    def process_file(self, file_path: "str | AttachmentSource",
+                     page_callback: Optional[Callable[[int, int, str], None]] = None,
+                     partial_callback: Optional[PartialCallback] = None) -> Dict[str, Any]:
         """
         处理单个文件（PDF或图片）
         
         Args:
-            file_path: 文件路径
+            file_path: 文件路径或附件数据源（AttachmentSource，上传的附件不落盘）
+            page_callback: PDF每页识别完成时的回调 (页码, 总页数, 识别内容)
+            partial_callback: 本次识别的流式部分结果回调（默认使用初始化时的设置）
             
         Returns:
             包含文件信息和提取内容的字典
         """
-        file_path = Path(file_path)
+        source = as_source(file_path)
         
-        if not file_path.exists():
-            raise FileNotFoundError(f"文件不存在: {file_path}")
+        if not source.exists():
+            raise FileNotFoundError(f"文件不存在: {source}")
         
-        file_ext = file_path.suffix.lower()
-        
-        result = {
-            "file_name": file_path.name,
-            "file_path": str(file_path),
-            "file_type": file_ext,
-            "content": "",
-            "extracted_info": {},
-            "metadata": {
-                "extraction_method": "vision_model"
-            }
-        }
+        file_ext = source.suffix
+        result = self._new_result(source)
         
         try:
             if file_ext == self.supported_pdf_format:
-                result = self._process_pdf(file_path, result)
+                result = self._process_pdf(source, result, page_callback, partial_callback)
             elif file_ext in self.supported_image_formats:
-                result = self._process_image(file_path, result)
+                result = self._process_image(source, result, partial_callback)
             else:
                 logger.warning(f"不支持的文件格式: {file_ext}")
                 result["error"] = f"不支持的文件格式: {file_ext}"
         
         except Exception as e:
-            logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            logger.error(f"处理文件失败 {source}: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             result["error"] = str(e)
         
+        structured = self.collect_structured(result["metadata"])
+        if structured:
+            result["structured"] = structured
         return result
     
-    def _process_pdf(self, file_path: Path, result: Dict) -> Dict:
-        """处理PDF文件 - 转换为图片后用视觉模型识别"""
-        logger.info(f"处理PDF文件: {file_path.name}")
+    def recognize_image(self, image_data: bytes, image_name: str = "image",
+                        metadata: Optional[Dict[str, Any]] = None,
+                        check_quality: bool = True,
+                        partial_callback: Optional[PartialCallback] = None) -> str:
+        """
+        识别一张内存中的图片（如PDF渲染出的页面），经过缓存、预处理和容错层
+        
+        Args:
+            image_data: 图片二进制数据
+            image_name: 图片名称（用于日志）
+            metadata: 结果元数据，传入时记录预处理统计
+            check_quality: 是否进行质量预检（已由 screen_pdf_page 检查过的页面传False）
+            partial_callback: 本次识别的流式部分结果回调（默认使用初始化时的设置）
+            
+        Returns:
+            识别的文本内容
+            
+        Raises:
+            ImageSkipped: 图片质量不足，未调用视觉模型
+            VisionRequestError: 识别失败
+        """
+        return self._call_vision_model(image_data, image_name, metadata, check_quality, partial_callback)
+    
+    @staticmethod
+    def _new_result(source: AttachmentSource) -> Dict[str, Any]:
+        """创建单个文件的结果结构"""
+        return {
+            "file_name": source.name,
+            "file_path": source.location,
+            "file_type": source.suffix,
+            "content": "",
+            "extracted_info": {},
+            "metadata": {
+                "extraction_method": "vision_model"
+            }
+        }
+    
+    def _process_pdf(self, source: AttachmentSource, result: Dict,
+                     page_callback: Optional[Callable[[int, int, str], None]] = None,
+                     partial_callback: Optional[PartialCallback] = None) -> Dict:
+        """处理PDF文件 - 转换为图片后用视觉模型识别（页面并行渲染与识别）"""
+        logger.info(f"处理PDF文件: {source.name}")
         
         try:
-            doc = fitz.open(str(file_path))
-            all_content = []
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # 将PDF页面转换为图片
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x放大提高清晰度
-                img_data = pix.tobytes("png")
-                
-                # 使用视觉模型识别
-                content = self._call_vision_model(img_data, f"PDF第{page_num+1}页")
-                all_content.append(content)
-                
-                logger.info(f"PDF第{page_num+1}页识别完成")
-            
-            doc.close()
-            
-            result["content"] = "\n\n".join(all_content)
-            result["metadata"]["pages"] = len(doc)
+            with source.open_pdf() as doc:
+                total_pages = len(doc)
+            
+            pages = {}
+            for page in self.iter_pdf_pages(source, result["metadata"], partial_callback):
+                page_number = page["page_number"]
+                pages[page_number] = page
+                if "error" not in page and "skipped" not in page:
+                    logger.info(f"PDF第{page_number}页识别完成（渲染倍率 {page['render_scale']}）")
+                if page_callback:
+                    page_callback(page_number, total_pages, page["text"])
+            
+            self._collect_pdf_pages(result, [pages[n] for n in sorted(pages)])
             
         except Exception as e:
             logger.error(f"处理PDF失败: {e}")
@@ -114,44 +370,636 @@ class VisionProcessor:
         
         return result
     
-    def _process_image(self, file_path: Path, result: Dict) -> Dict:
+    @staticmethod
+    def _collect_pdf_pages(result: Dict[str, Any], pages: List[Dict[str, Any]]):
+        """汇总PDF各页识别结果：失败页记录在元数据中，全部失败时记为文件识别失败（跳过的页面不计入内容）"""
+        result["pages"] = pages
+        result["content"] = "\n\n".join(
+            page["text"] for page in pages if "error" not in page and "skipped" not in page
+        )
+        result["metadata"]["pages"] = len(pages)
+        
+        failed = [page for page in pages if "error" in page]
+        if failed:
+            result["metadata"]["failed_pages"] = [page["page_number"] for page in failed]
+            if len(failed) == len(pages):
+                result["error"] = f"全部{len(pages)}页识别失败: {failed[0]['error']}"
+    
+    def iter_pdf_pages(self, file_path: "str | AttachmentSource",
+                       metadata: Optional[Dict[str, Any]] = None,
+                       partial_callback: Optional[PartialCallback] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐页渲染并识别PDF，按识别完成顺序返回
+        
+        页面在渲染进程池中渲染，每页渲染完成后立即提交识别，识别与后续页面的渲染同时进行。
+        启用质量预检时，空白页和重复页在渲染后直接跳过，不调用视觉模型；
+        启用页面抽样时，相关性低或超出页数预算的页面不渲染、不识别。
+        
+        Args:
+            file_path: PDF文件路径或附件数据源
+            metadata: 结果元数据（记录预处理统计）
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
+            
+        Yields:
+            页面结果 {page_number（从1开始）, text, render_scale, method}，
+            识别失败时含 error，跳过时含 skipped（原因）和 duplicate_of（重复页对应的页码）
+        """
+        source = as_source(file_path)
+        with source.open_pdf() as doc:
+            page_indices, page_skips = self._sample_pdf_pages(doc, metadata)
+        
+        def page_result(page_index: int, scale: float, **fields) -> Dict[str, Any]:
+            return {"page_number": page_index + 1, "text": "", "render_scale": scale,
+                    "method": "vision_model", **fields}
+        
+        for page_index, skip in page_skips.items():
+            yield page_result(page_index, 0.0, **skip)
+        
+        if not page_indices:
+            return
+        
+        results: "queue.Queue" = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(page_indices)),
+                                      thread_name_prefix="vision-page")
+        
+        tracker = DuplicatePageTracker() if self.quality_checker else None
+        
+        def recognize(page_index: int, img_data: bytes, scale: float):
+            try:
+                content = self._call_vision_model(img_data, f"{source.name} 第{page_index+1}页", metadata,
+                                                  check_quality=False, partial_callback=partial_callback)
+                results.put(page_result(page_index, scale, text=content))
+            except Exception as e:
+                results.put(page_result(page_index, scale, error=str(e)))
+        
+        def feed():
+            try:
+                for page_index, img_data, scale in self._iter_rendered_pages(source, page_indices):
+                    skip = None
+                    if tracker is not None:
+                        skip = self.screen_pdf_page(img_data, page_index + 1, f"{source.name} 第{page_index+1}页",
+                                                    tracker, metadata)
+                    if skip:
+                        results.put(page_result(page_index, scale, **skip))
+                    else:
+                        executor.submit(recognize, page_index, img_data, scale)
+            except Exception as e:
+                logger.error(f"PDF页面渲染失败: {e}")
+                results.put(e)
+        
+        feeder = threading.Thread(target=feed, name="vision-pdf-render", daemon=True)
+        feeder.start()
+        
+        try:
+            for _ in page_indices:
+                item = results.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _sample_pdf_pages(self, doc, metadata: Optional[Dict[str, Any]] = None
+                          ) -> Tuple[List[int], Dict[int, Dict[str, Any]]]:
+        """
+        按页面相关性选择要识别的页面（未启用页面抽样时全部识别），跳过的页面记录在 metadata["skipped_pages"] 中
+        
+        Returns:
+            (要识别的页面序号, {跳过的页面序号: {skipped（原因）, relevance（分数）}})
+        """
+        if self.page_scorer is None:
+            return list(range(len(doc))), {}
+        page_indices, page_skips = self.page_scorer.select(self.page_scorer.score_document(doc))
+        if page_skips and metadata is not None:
+            with self._metadata_lock:
+                metadata.setdefault("skipped_pages", []).extend(
+                    {"page": index + 1, **skip} for index, skip in page_skips.items())
+        return page_indices, page_skips
+    
+    def _iter_rendered_pages(self, source: AttachmentSource,
+                             page_indices: List[int]) -> Iterator[Tuple[int, bytes, float]]:
+        """
+        渲染PDF页面，多页时使用进程池并按渲染完成顺序返回；进程池不可用时退回当前进程渲染
+        （内存中的PDF不传给渲染进程，避免每页复制一次文件数据）
+        """
+        pending = list(page_indices)
+        
+        if self.pdf_render_workers > 1 and len(pending) > 1 and source.path:
+            try:
+                pool = self._get_render_pool()
+                futures = [pool.submit(render_pdf_page, source.path, i, TARGET_LONG_EDGE) for i in pending]
+                for future in as_completed(futures):
+                    page_index, img_data, scale = future.result()
+                    pending.remove(page_index)
+                    yield page_index, img_data, scale
+                return
+            except (BrokenProcessPool, OSError) as e:
+                logger.warning(f"渲染进程池不可用，改为逐页渲染: {e}")
+                self._shutdown_render_pool()
+        
+        with source.open_pdf() as doc:
+            for page_index in pending:
+                with self._inprocess_render_lock:
+                    img_data, scale = render_page(doc[page_index], TARGET_LONG_EDGE)
+                yield page_index, img_data, scale
+    
+    def _get_render_pool(self) -> ProcessPoolExecutor:
+        """获取渲染进程池（首次使用时创建，多个PDF共用）"""
+        with self._render_pool_lock:
+            if self._render_pool is None:
+                # 当前进程存在多个线程，避免直接fork
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._render_pool = ProcessPoolExecutor(max_workers=self.pdf_render_workers, mp_context=context)
+            return self._render_pool
+    
+    def _shutdown_render_pool(self):
+        """关闭渲染进程池"""
+        with self._render_pool_lock:
+            if self._render_pool is not None:
+                self._render_pool.shutdown(wait=False, cancel_futures=True)
+                self._render_pool = None
+    
+    def close(self):
+        """释放处理器占用的资源（渲染进程池）"""
+        self._shutdown_render_pool()
+    
+    def _process_image(self, source: AttachmentSource, result: Dict,
+                       partial_callback: Optional[PartialCallback] = None) -> Dict:
         """处理图片文件 - 直接用视觉模型识别"""
-        logger.info(f"处理图片文件: {file_path.name}")
+        logger.info(f"处理图片文件: {source.name}")
         
         try:
-            # 读取图片
-            with open(file_path, "rb") as f:
-                img_data = f.read()
+            # 读取图片（只读一次，后续均使用内存数据）
+            img_data = source.read_bytes()
+            
+            # 获取图片信息（只解析文件头，不解码像素）
+            with Image.open(io.BytesIO(img_data)) as img:
+                result["metadata"]["width"] = img.width
+                result["metadata"]["height"] = img.height
+                result["metadata"]["format"] = img.format
             
             # 使用视觉模型识别
-            content = self._call_vision_model(img_data, file_path.name)
+            content = self._call_vision_model(img_data, source.name, result["metadata"],
+                                              partial_callback=partial_callback)
             result["content"] = content
             
-            # 获取图片信息
-            img = Image.open(file_path)
-            result["metadata"]["width"] = img.width
-            result["metadata"]["height"] = img.height
-            result["metadata"]["format"] = img.format
-            
+        except ImageSkipped as e:
+            self._mark_skipped(result, e)
         except Exception as e:
             logger.error(f"处理图片失败: {e}")
             result["error"] = str(e)
         
         return result
     
-    def _call_vision_model(self, image_data: bytes, image_name: str) -> str:
+    def _call_vision_model(self, image_data: bytes, image_name: str,
+                           metadata: Optional[Dict[str, Any]] = None,
+                           check_quality: bool = True,
+                           partial_callback: Optional[PartialCallback] = None) -> str:
+        """
+        调用视觉大模型识别图片（优先读取识别缓存，未命中时先规范化图片再上传）
+        
+        Args:
+            image_data: 图片二进制数据
+            image_name: 图片名称（用于日志）
+            metadata: 结果元数据，传入时记录预处理节省的字节数
+            check_quality: 是否进行质量预检
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
+            
+        Returns:
+            识别的文本内容
+            
+        Raises:
+            ImageSkipped: 图片质量不足（空白、过暗等），未调用视觉模型
+            VisionRequestError: 重试耗尽或熔断中（失败不会作为识别内容返回）
+        """
+        quality = None
+        if self.quality_checker and check_quality:
+            quality, _ = self._check_quality(image_data, image_name, metadata)
+            if quality and quality["skip"]:
+                raise ImageSkipped(quality)
+        
+        profile = self._choose_profile(image_data, image_name, quality, metadata)
+        
+        cache_key = None
+        if self.cache:
+            cache_key = VisionCache.make_key(image_data, self.model, self._cache_version(profile))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中识别缓存: {image_name}")
+                return self._finish_content(cached, image_name, metadata)
+        
+        image_hash = None
+        if self.phash_index:
+            image_hash, match = self._lookup_similar(image_data, image_name, metadata, self._cache_version(profile))
+            if match:
+                return self._finish_content(match["content"], image_name, metadata)
+        
+        if self.ocr_tier:
+            text = self._recognize_with_ocr(image_data, image_name, metadata)
+            if text is not None:
+                return text
+        
+        # 只需分类的长截图整图识别即可，不分块
+        tiles = self._split_tiles(image_data, image_name) if self.tiler and profile != PROFILE_CLASSIFY else None
+        
+        try:
+            if tiles:
+                content = self._recognize_tiles(tiles, image_name, metadata, partial_callback)
+            else:
+                if self.preprocessor:
+                    image_data = self._preprocess_image(image_data, image_name, metadata)
+                with self._request_slots:
+                    content = self._request_vision_model(image_data, image_name, profile, partial_callback)
+        except Exception as e:
+            logger.error(f"视觉模型调用失败 ({image_name}): {e}")
+            raise
+        
+        self._store_result(cache_key, image_hash, content, image_name, self._cache_version(profile))
+        return self._finish_content(content, image_name, metadata)
+    
+    def _finish_content(self, content: str, image_name: str,
+                        metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        结构化输出模式下解析模型返回的JSON：结构化结果记录在 metadata["structured"] 中，
+        返回由其生成的Markdown识别内容；非JSON内容（OCR文本、分块合并结果）或解析失败时原样返回
+        """
+        if not self.structured_output or not content.lstrip().startswith(('{', '```')):
+            return content
+        try:
+            data = parse_structured(content)
+        except ValueError as e:
+            logger.warning(f"结构化输出解析失败，按原文保存 {image_name}: {e}")
+            return content
+        
+        if metadata is not None:
+            with self._metadata_lock:
+                metadata.setdefault("structured", []).append((image_name, data))
+        return render_markdown(data)
+    
+    def collect_structured(self, metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        取出元数据中记录的结构化结果（PDF各页按页码顺序）并合并为一个对象
+        
+        Args:
+            metadata: 识别时传入的元数据
+            
+        Returns:
+            合并后的结构化结果，没有时返回None
+        """
+        with self._metadata_lock:
+            items = metadata.pop("structured", [])
+        
+        def page_number(item) -> int:
+            match = PAGE_NAME_PATTERN.search(item[0])
+            return int(match.group(1)) if match else 0
+        
+        return merge_structured([data for _, data in sorted(items, key=page_number)])
+    
+    def _store_result(self, cache_key: Optional[str], image_hash: Optional[int], content: str, image_name: str,
+                      version: str):
+        """
+        保存视觉模型的识别结果（精确缓存 + 感知哈希索引）
+        
+        感知哈希索引只收录操作指引类结果，记录带缓存版本，只被同一版本复用
+        """
+        if self.cache and cache_key:
+            self.cache.put(cache_key, content)
+        if self.phash_index and image_hash is not None:
+            content_type = None
+            # 结构化输出没有【类型】标记，按解析出的类型判断
+            if self.structured_output and content.lstrip().startswith(('{', '```')):
+                try:
+                    data = parse_structured(content)
+                    content_type = '操作指引' if data["is_operation_guide"] else data["type"]
+                except ValueError:
+                    pass
+            self.phash_index.add(image_hash, content, image_name, content_type=content_type, version=version)
+    
+    def _check_quality(self, image_data: bytes, image_name: str,
+                       metadata: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """
+        图片质量预检，结果记录在 metadata["quality_checks"] 中
+        
+        Returns:
+            (质量检查结果, 分析用的灰度缩略图)，图片无法解码时均为None（照常识别）
+        """
+        try:
+            quality, pixels = self.quality_checker.analyze(image_data)
+        except Exception as e:
+            logger.warning(f"图片质量预检失败 {image_name}: {e}")
+            return None, None
+        
+        if quality["low_quality"]:
+            logger.info(
+                f"图片{STATUS_NAMES[quality['status']]} {image_name}: 清晰度 {quality['blur_score']}，"
+                f"灰度均值 {quality['mean']}，标准差 {quality['std']}，{'跳过识别' if quality['skip'] else '继续识别'}"
+            )
+        if metadata is not None:
+            with self._metadata_lock:
+                metadata.setdefault("quality_checks", []).append(
+                    {"image": image_name, **{k: v for k, v in quality.items() if k != "hash"}}
+                )
+        return quality, pixels
+    
+    def screen_pdf_page(self, image_data: bytes, page_number: int, image_name: str,
+                        tracker: DuplicatePageTracker,
+                        metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        PDF页面识别前的质量预检与重复页检测（未启用质量预检时不做检查）
+        
+        Args:
+            image_data: 渲染后的页面图片
+            page_number: 页码
+            image_name: 页面名称（用于日志）
+            tracker: 当前文档的重复页记录
+            metadata: 结果元数据，跳过的页面记录在 metadata["skipped_pages"] 中
+            
+        Returns:
+            需要跳过时返回页面结果的附加字段 {skipped（原因）, duplicate_of}，否则返回None
+        """
+        if not self.quality_checker:
+            return None
+        quality, pixels = self._check_quality(image_data, image_name, metadata)
+        if quality is None:
+            return None
+        
+        if quality["skip"]:
+            skip = {"skipped": STATUS_NAMES[quality["status"]]}
+        else:
+            duplicate_of = tracker.match(page_number, quality["hash"], pixels)
+            if duplicate_of is None:
+                return None
+            logger.info(f"{image_name} 与第{duplicate_of}页重复，跳过识别")
+            skip = {"skipped": "重复页", "duplicate_of": duplicate_of}
+        
+        if metadata is not None:
+            with self._metadata_lock:
+                metadata.setdefault("skipped_pages", []).append({"page": page_number, **skip})
+        return skip
+    
+    @staticmethod
+    def _mark_skipped(result: Dict[str, Any], error: ImageSkipped):
+        """记录因质量不足而跳过识别的图片"""
+        logger.info(f"{result['file_name']}: {error}")
+        result["error"] = str(error)
+        result["metadata"]["skipped"] = STATUS_NAMES[error.quality["status"]]
+    
+    def _lookup_similar(self, image_data: bytes, image_name: str,
+                        metadata: Optional[Dict[str, Any]] = None,
+                        version: str = "") -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+        """
+        在感知哈希索引中查找相似的已识别操作指引类图片（只匹配同一缓存版本，即相同档位和输出格式的结果）
+        
+        Returns:
+            (图片哈希（无法解码时为None）, 匹配结果（未命中为None）)
+        """
+        try:
+            image_hash = dhash_bytes(image_data)
+        except Exception as e:
+            logger.warning(f"计算感知哈希失败 {image_name}: {e}")
+            return None, None
+        
+        match = self.phash_index.lookup(image_hash, version)
+        if match:
+            logger.info(f"命中相似图片 {image_name}: 来源 {match['source']}，汉明距离 {match['distance']}")
+            if metadata is not None:
+                with self._metadata_lock:
+                    metadata.setdefault("phash_matches", []).append({
+                        "image": image_name,
+                        "source": match["source"],
+                        "content_type": match["content_type"],
+                        "distance": match["distance"],
+                    })
+        return image_hash, match
+    
+    def _recognize_with_ocr(self, image_data: bytes, image_name: str,
+                            metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        OCR优先识别：质量达标时返回OCR文本，否则返回None（交给视觉模型）
+        
+        每次判定记录在 metadata["ocr_checks"] 中，metadata["recognition_tiers"] 统计两级各识别了多少张
+        """
+        text, stats = self.ocr_tier.recognize(image_data)
+        tier = "ocr" if text is not None else "vision"
+        
+        if stats.get("words") is not None:
+            logger.info(
+                f"OCR优先识别 {image_name}: 置信度 {stats['confidence']}，关键信息 {stats['entities']} 个，"
+                f"{'采用OCR结果' if text is not None else '转视觉模型（' + stats['reason'] + '）'}"
+            )
+        
+        if metadata is not None:
+            with self._metadata_lock:
+                tiers = metadata.setdefault("recognition_tiers", {"ocr": 0, "vision": 0})
+                tiers[tier] += 1
+                metadata.setdefault("ocr_checks", []).append({"image": image_name, **stats})
+        
+        return text
+    
+    def _choose_profile(self, image_data: bytes, image_name: str,
+                        quality: Optional[Dict[str, Any]] = None,
+                        metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        选择提示词档位，各档位的使用次数记录在 metadata["prompt_profiles"] 中
+        
+        Args:
+            image_data: 图片二进制数据（只读取文件头获取尺寸）
+            image_name: 图片名称
+            quality: 质量预检结果
+            metadata: 结果元数据
+            
+        Returns:
+            档位名称
+        """
+        if self.prompt_profile != PROFILE_AUTO:
+            profile, reason = self.prompt_profile, '固定档位'
+        else:
+            try:
+                with Image.open(io.BytesIO(image_data)) as img:
+                    width, height = img.size
+            except Exception:
+                width = height = 0
+            profile, reason = select_profile(image_name, width, height, quality)
+            logger.info(f"提示词档位 {image_name}: {profile}（{reason}）")
+        
+        if metadata is not None:
+            with self._metadata_lock:
+                counts = metadata.setdefault("prompt_profiles", {})
+                counts[profile] = counts.get(profile, 0) + 1
+        return profile
+    
+    def _profile_prompt(self, profile: str) -> str:
+        """档位对应的提示词（结构化输出模式下为对应字段的JSON提示词）"""
+        if self.structured_output:
+            return structured_prompt(profile)
+        if profile == PROFILE_KEY_FIELDS:
+            return KEY_FIELDS_PROMPT
+        if profile == PROFILE_CLASSIFY:
+            return CLASSIFY_PROMPT
+        return VISION_PROMPT
+    
+    def _cache_version(self, profile: str = PROFILE_FULL) -> str:
+        """缓存键中的版本信息（提示词版本 + 档位 + 预处理参数 + 分块参数）"""
+        version = VISION_PROMPT_VERSION
+        if profile != PROFILE_FULL:
+            version += f"|{profile}"
+        if self.structured_output:
+            version += "|json"
+        if self.preprocessor:
+            version += f"|{self.preprocessor.signature}"
+        if self.tiler:
+            version += f"|{self.tiler.signature}"
+        return version
+    
+    def _split_tiles(self, image_data: bytes, image_name: str) -> Optional[List[bytes]]:
+        """长截图切分为分块，无需分块或切分失败时返回None（整图识别）"""
+        try:
+            tiles = self.tiler.split(image_data)
+        except Exception as e:
+            logger.warning(f"长截图分块失败，整图识别 {image_name}: {e}")
+            return None
+        if tiles:
+            logger.info(f"长截图分块识别 {image_name}: 共{len(tiles)}块")
+        return tiles
+    
+    def _tile_request(self, tiles: List[bytes], index: int, image_name: str,
+                      metadata: Optional[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """构建分块识别请求：(分块名称, 请求内容)"""
+        label = f"{image_name} 第{index + 1}/{len(tiles)}块"
+        tile = tiles[index]
+        if self.preprocessor:
+            tile = self._preprocess_image(tile, label, metadata)
+        prompt = TILE_PROMPT_TEMPLATE.format(index=index + 1, count=len(tiles))
+        return label, [self._image_part(tile), {"type": "text", "text": prompt}]
+    
+    def _recognize_tiles(self, tiles: List[bytes], image_name: str,
+                         metadata: Optional[Dict[str, Any]] = None,
+                         partial_callback: Optional[PartialCallback] = None) -> str:
+        """并发识别长截图的各分块并合并（并发数受全局在途请求上限约束）"""
+        def recognize(index: int) -> str:
+            label, content_parts = self._tile_request(tiles, index, image_name, metadata)
+            with self._request_slots:
+                logger.info(f"调用视觉模型识别: {label}")
+                return self._create_completion(content_parts, label, TILE_MAX_TOKENS, partial_callback)
+        
+        with ThreadPoolExecutor(max_workers=min(len(tiles), self.max_workers),
+                                thread_name_prefix="vision-tile") as executor:
+            texts = list(executor.map(recognize, range(len(tiles))))
+        return self._merge_tiles(texts, metadata)
+    
+    def _merge_tiles(self, texts: List[str], metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        合并分块识别结果，输出与整图识别相同的格式：
+        【类型】、内容摘要（由合并后的文字生成）、详细内容和关键信息（手机号、金额、日期）
+        """
+        content_type, text = ImageTiler.merge(texts)
+        content_type = content_type or '其他'
+        if metadata is not None:
+            with self._metadata_lock:
+                metadata["tiles"] = metadata.get("tiles", 0) + len(texts)
+        
+        lines = text.splitlines()
+        summary = f"{content_type}长截图，分{len(texts)}块识别，共{len(lines)}行文字"
+        if lines:
+            summary += f"，开头为：{lines[0][:50]}"
+        entities = scan(text)
+        key_info = entities.phones + entities.amounts + entities.dates
+        return (f"【{content_type}】\n**内容摘要**：{summary}\n**详细内容**：\n{text}\n"
+                f"**关键信息**：{'；'.join(key_info) or '无'}")
+    
+    def _preprocess_image(self, image_data: bytes, image_name: str,
+                          metadata: Optional[Dict[str, Any]] = None) -> bytes:
+        """规范化图片，失败时退回原始数据"""
+        try:
+            normalized, stats = self.preprocessor.normalize(image_data)
+        except Exception as e:
+            logger.warning(f"图片预处理失败，使用原图上传 {image_name}: {e}")
+            return image_data
+        
+        logger.info(
+            f"图片预处理 {image_name}: {stats['original_size']} -> {stats['normalized_size']}，"
+            f"{stats['original_bytes'] // 1024}KB -> {stats['normalized_bytes'] // 1024}KB"
+        )
+        
+        if metadata is not None:
+            with self._metadata_lock:
+                summary = metadata.setdefault("preprocess", {"original_bytes": 0, "normalized_bytes": 0, "saved_bytes": 0})
+                for key in ("original_bytes", "normalized_bytes", "saved_bytes"):
+                    summary[key] += stats[key]
+        
+        return normalized
+    
+    def _request_vision_model(self, image_data: bytes, image_name: str,
+                              profile: str = PROFILE_FULL,
+                              partial_callback: Optional[PartialCallback] = None) -> str:
         """
-        调用视觉大模型识别图片
+        请求视觉大模型识别图片（不经过缓存，失败时抛出异常）
         
         Args:
             image_data: 图片二进制数据
             image_name: 图片名称（用于日志）
+            profile: 提示词档位
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
             
         Returns:
             识别的文本内容
         """
-        logger.info(f"调用视觉模型识别: {image_name}")
+        logger.info(f"调用视觉模型识别: {image_name}（{profile}）")
         
+        return self._create_completion(
+            [self._image_part(image_data), {"type": "text", "text": self._profile_prompt(profile)}],
+            image_name, MAX_TOKENS[profile], partial_callback
+        )
+    
+    def _request_packed_vision_model(self, images: List[Tuple[str, bytes]],
+                                     profile: str = PROFILE_FULL,
+                                     partial_callback: Optional[PartialCallback] = None) -> List[str]:
+        """
+        在一次请求中识别多张图片，并将回答拆分回每张图片
+        
+        Args:
+            images: [(图片名称, 图片数据)]
+            profile: 提示词档位（同一请求中的图片使用相同档位）
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
+            
+        Returns:
+            与输入顺序一致的识别内容列表
+            
+        Raises:
+            ValueError: 回答中的分隔标记与图片数量不一致
+        """
+        names = [name for name, _ in images]
+        logger.info(f"合并识别 {len(images)} 张图片（{profile}）: {', '.join(names)}")
+        
+        content_parts = [self._image_part(image_data) for _, image_data in images]
+        content_parts.append({
+            "type": "text",
+            "text": PACKED_PROMPT_TEMPLATE.format(count=len(images), prompt=self._profile_prompt(profile))
+        })
+        
+        content = self._create_completion(content_parts, f"合并请求({len(images)}张)",
+                                          MAX_TOKENS[profile] * len(images), partial_callback)
+        return self._split_packed_content(content, len(images))
+    
+    @staticmethod
+    def _split_packed_content(content: str, count: int) -> List[str]:
+        """按 ===图片N=== 分隔标记拆分合并请求的回答"""
+        markers = list(PACKED_SECTION_PATTERN.finditer(content))
+        sections = {}
+        
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
+            sections[int(marker.group(1))] = content[marker.end():end].strip()
+        
+        if sorted(sections) != list(range(1, count + 1)) or not all(sections.values()):
+            raise ValueError(f"合并识别结果无法拆分：期望{count}段，实际{len(sections)}段")
+        
+        return [sections[i] for i in range(1, count + 1)]
+    
+    @staticmethod
+    def _image_part(image_data: bytes) -> Dict[str, Any]:
+        """构建请求中的图片部分（base64内嵌）"""
         # 将图片转换为base64
         base64_image = base64.b64encode(image_data).decode('utf-8')
         
@@ -163,106 +1011,698 @@ class VisionProcessor:
         else:
             media_type = "image/png"  # 默认
         
-        # 构建提示词 - 增加内容类型判断和深度理解
-        prompt = """你是图片内容理解与信息提取专家。请仔细分析这张图片，理解其含义并提取关键信息。
-
-**第一步：判断图片内容类型**
-请先判断这张图片属于以下哪种类型，并在开头用【】标注：
-- 【业务凭证】：业务受理单、协议、合同、订单等（包含具体业务信息）
-- 【账单明细】：月度账单、费用清单、扣费记录等
-- 【记录查询】：联系记录、投诉记录、通话记录查询结果等
-- 【沟通记录】：微信/短信/在线客服聊天记录等
-- 【操作指引】：APP截图、操作入口、知识库截图等（说明如何操作）
-- 【其他】：无法归类的图片
-
-**第二步：内容理解与摘要**
-请用1-2句话概括这张图片的核心内容和意义。
-
-**第三步：提取关键信息**
-请提取以下内容（如果存在）：
-1. **号码类**：手机号码（必须是独立的11位数字，如13912345678，不要从长数字串中截取）
-2. **业务类**：套餐名称、业务类型、协议编号
-3. **金额类**：具体金额（XX元），并说明是什么费用
-4. **日期类**：关键日期（办理日期、生效日期、到期日期等）
-5. **沟通要点**：如果是沟通记录，提取双方的关键对话内容和结论
-
-**第四步：如果是账单/费用类图片，请详细提取**
-如果图片包含账单或费用信息，请按以下格式逐月列出：
-```
-【月度费用明细】
-| 月份 | 套餐费 | 其他费用 | 优惠减免 | 应收 | 实收 |
-|------|--------|----------|----------|------|------|
-| 2024-01 | XX元 | XX元 | -XX元 | XX元 | XX元 |
-```
-如果无法识别完整表格，请尽量提取：
-- 每月出账金额
-- 各项收费项目名称和金额
-- 优惠/减免金额
-- 应收与实收的差异
-
-**第五步：标注与申诉的相关性**
-- 如果是"操作指引"类型，在开头标注：【操作指引类-与具体业务数据无关】
-- 如果是"沟通记录"，请总结沟通的结论和用户态度
-
-请按以下格式输出：
-【类型】
-**内容摘要**：[1-2句话概括]
-**详细内容**：[识别到的文字内容]
-**关键信息**：[提取的号码、金额、日期等]
-**费用明细**：[如有账单信息，列出月度费用明细表]"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{media_type};base64,{base64_image}"
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                timeout=60
-            )
-            
+        return {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{media_type};base64,{base64_image}"
+            }
+        }
+    
+    def _create_completion(self, content_parts: List[Dict[str, Any]], label: str,
+                           max_tokens: int = MAX_TOKENS[PROFILE_FULL],
+                           partial_callback: Optional[PartialCallback] = None) -> str:
+        """
+        发送视觉模型请求并返回回答文本（经过容错层：重试、熔断、对冲）
+        
+        部分结果回调未传入时使用初始化时的设置；对冲请求不回调部分结果
+        """
+        callback = partial_callback or self.partial_callback
+        return self.resilience.call(
+            lambda: self._complete_once(content_parts, label, max_tokens, callback),
+            label,
+            hedge_fn=lambda: self._complete_once(content_parts, label, max_tokens)
+        )
+    
+    def _complete_once(self, content_parts: List[Dict[str, Any]], label: str,
+                       max_tokens: int = MAX_TOKENS[PROFILE_FULL],
+                       partial_callback: Optional[PartialCallback] = None) -> str:
+        """发送一次视觉模型请求（启用流式且传入 partial_callback 时边接收边回调部分结果）"""
+        started = time.monotonic()
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": content_parts
+                }
+            ],
+            max_tokens=max_tokens,
+            timeout=self.request_timeout,
+            stream=self.stream
+        )
+        
+        if self.stream:
+            reporter = _PartialReporter(partial_callback, label, self.PARTIAL_INTERVAL, started)
+            try:
+                for chunk in response:
+                    reporter.feed(chunk)
+                    # 客户端超时只限制单次读取，持续缓慢输出的请求需要按总时长截断
+                    if time.monotonic() - started > self.request_timeout:
+                        raise TimeoutError(f"流式输出超过 {self.request_timeout} 秒")
+            finally:
+                response.close()
+            content = reporter.finish()
+        else:
             content = response.choices[0].message.content.strip()
+        
+        # 调试输出
+        logger.info(f"【调试】视觉模型识别结果 ({label}):")
+        logger.info("-" * 40)
+        logger.info(content[:500] if len(content) > 500 else content)
+        logger.info("-" * 40)
+        
+        return content
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取识别缓存统计（未启用缓存时返回空字典）"""
+        return self.cache.stats() if self.cache else {}
+    
+    def request_stats(self) -> Dict[str, Any]:
+        """获取视觉模型调用统计（重试、失败、对冲次数，熔断状态，耗时分布p50/p95/p99）"""
+        return self.resilience.stats()
+    
+    def process_files(self,
+                      file_paths: List[str],
+                      max_workers: Optional[int] = None,
+                      progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+                      partial_callback: Optional[PartialCallback] = None
+                      ) -> List[Dict[str, Any]]:
+        """
+        批量处理文件
+        
+        Args:
+            file_paths: 文件路径或附件数据源列表
+            max_workers: 最大并发数（默认使用初始化时的设置）
+            progress_callback: 每个文件完成时的回调 (已完成数, 总数, 结果)
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
             
-            # 调试输出
-            logger.info(f"【调试】视觉模型识别结果 ({image_name}):")
-            logger.info("-" * 40)
-            logger.info(content[:500] if len(content) > 500 else content)
-            logger.info("-" * 40)
+        Returns:
+            处理结果列表（与输入顺序一致）
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(file_paths)
+        
+        for done, (index, result) in enumerate(self.iter_process_files(file_paths, max_workers,
+                                                                                  partial_callback), 1):
+            results[index] = result
+            if progress_callback:
+                progress_callback(done, len(file_paths), result)
+        
+        return results
+    
+    def iter_process_files(self,
+                           file_paths: List[str],
+                           max_workers: Optional[int] = None,
+                           partial_callback: Optional[PartialCallback] = None
+                           ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        并发处理文件，按完成顺序逐个返回
+        
+        同时在途的识别请求不超过 max_workers 个；单个文件失败只记录在该文件的结果中，
+        不影响其他文件。启用 pack_images 时，小图片会合并到同一请求中识别。
+        
+        Args:
+            file_paths: 文件路径列表
+            max_workers: 最大并发数（默认使用初始化时的设置）
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
             
-            return content
+        Yields:
+            (输入列表中的索引, 处理结果)
+        """
+        tasks = self._plan_pack_groups(file_paths) if self.pack_images else [[i] for i in range(len(file_paths))]
+        workers = min(max(1, max_workers or self.max_workers), max(1, len(tasks)))
+        
+        if workers == 1:
+            for task in tasks:
+                yield from self._run_task(task, file_paths, partial_callback)
+            return
+        
+        logger.info(f"并发识别 {len(file_paths)} 个文件（{len(tasks)} 个请求），并发数: {workers}")
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision")
+        try:
+            futures = [executor.submit(self._run_task, task, file_paths, partial_callback) for task in tasks]
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # 调用方提前停止迭代时（如客户端断开），取消尚未开始的识别
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def iter_process_events(self,
+                            file_paths: List[str],
+                            max_workers: Optional[int] = None,
+                            page_router=None) -> Iterator[Dict[str, Any]]:
+        """
+        并发处理文件，同时返回流式识别的部分结果和每个文件的最终结果
+        
+        Args:
+            file_paths: 文件路径列表
+            max_workers: 最大并发数（默认使用初始化时的设置）
+            page_router: PDF按页路由（PDFPageRouter，使用本处理器识别图片页），传入时PDF先逐个按页路由提取，
+                其视觉识别页同样返回部分结果，其余文件并发识别
             
+        Yields:
+            {"type": "partial", "label": 识别对象名称, "text": 已输出的文本} 或
+            {"type": "result", "index": 输入列表中的索引, "result": 处理结果}
+        """
+        events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        stop = threading.Event()
+        
+        def on_partial(label: str, text: str):
+            if self.partial_callback:
+                self.partial_callback(label, text)
+            events.put({"type": "partial", "label": label, "text": text})
+        
+        routed = [i for i, path in enumerate(file_paths)
+                  if page_router is not None and as_source(path).suffix == self.supported_pdf_format]
+        others = sorted(set(range(len(file_paths))) - set(routed))
+        
+        def run():
+            try:
+                for index in routed:
+                    events.put({"type": "result", "index": index, "result": page_router.extract(file_paths[index], on_partial)})
+                    if stop.is_set():
+                        return
+                for j, result in self.iter_process_files([file_paths[i] for i in others], max_workers,
+                                                        on_partial):
+                    events.put({"type": "result", "index": others[j], "result": result})
+                    if stop.is_set():
+                        break
+            except Exception as e:
+                events.put({"type": "error", "error": e})
+            finally:
+                events.put(None)
+        
+        worker = threading.Thread(target=run, name="vision-events", daemon=True)
+        worker.start()
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                if event["type"] == "error":
+                    raise event["error"]
+                yield event
+        finally:
+            # 调用方提前停止迭代时，通知后台线程在下一个文件完成后退出并取消剩余任务
+            stop.set()
+    
+    def _run_task(self, indices: List[int], file_paths: List[str],
+                  partial_callback: Optional[PartialCallback] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """执行一个识别任务（单个文件或一组合并识别的图片）"""
+        if len(indices) == 1:
+            logger.info(f"处理文件: {file_paths[indices[0]]}")
+            return [(indices[0], self._process_file_safe(file_paths[indices[0]], partial_callback))]
+        
+        try:
+            results = self._process_image_pack([as_source(file_paths[i]) for i in indices], partial_callback)
+            return list(zip(indices, results))
         except Exception as e:
-            logger.error(f"视觉模型调用失败: {e}")
-            return f"[识别失败: {str(e)}]"
+            logger.warning(f"合并识别失败，改为逐个识别: {e}")
+            return [(i, self._process_file_safe(file_paths[i], partial_callback)) for i in indices]
     
-    def process_files(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+    def _plan_pack_groups(self, file_paths: List[str]) -> List[List[int]]:
         """
-        批量处理文件
+        按像素预算将小图片分组（保持输入顺序贪心装箱），PDF和大图片单独成组
+        
+        Returns:
+            任务列表，每个任务是文件索引列表
+        """
+        tasks: List[List[int]] = []
+        group: List[int] = []
+        group_pixels = 0
+        
+        for index, file_path in enumerate(file_paths):
+            pixels = self._upload_pixels(as_source(file_path))
+            if not pixels or pixels > self.pack_pixel_budget // 2:
+                tasks.append([index])
+                continue
+            
+            if group and (group_pixels + pixels > self.pack_pixel_budget or len(group) >= self.pack_max_images):
+                tasks.append(group)
+                group, group_pixels = [], 0
+            group.append(index)
+            group_pixels += pixels
+        
+        if group:
+            tasks.append(group)
+        
+        return tasks
+    
+    def _upload_pixels(self, source: AttachmentSource) -> int:
+        """估算图片规范化后上传的像素数（只读取文件头）；非图片或无法读取时返回0"""
+        if source.suffix not in self.supported_image_formats:
+            return 0
+        try:
+            with source.open_image() as img:
+                width, height = img.size
+        except Exception:
+            return 0
+        
+        # 长截图分块识别，不参与合并
+        if self.tiler and self.tiler.needs_tiling(width, height):
+            return 0
+        
+        if self.preprocessor and max(width, height) > self.preprocessor.max_long_edge:
+            scale = self.preprocessor.max_long_edge / max(width, height)
+            width, height = int(width * scale), int(height * scale)
+        return width * height
+    
+    def _process_image_pack(self, sources: List[AttachmentSource],
+                            partial_callback: Optional[PartialCallback] = None) -> List[Dict[str, Any]]:
+        """
+        合并识别一组图片：跳过低质量图片，已缓存的直接返回，其余图片按提示词档位分组，每组在一次请求中识别
         
         Args:
-            file_paths: 文件路径列表
+            sources: 图片的附件数据源列表
+            partial_callback: 流式部分结果回调（默认使用初始化时的设置）
             
         Returns:
-            处理结果列表
+            与输入顺序一致的结果列表
         """
         results = []
+        pending: Dict[str, List[Tuple[Dict[str, Any], Optional[str], Optional[int], bytes]]] = {}
         
-        for file_path in file_paths:
-            logger.info(f"处理文件: {file_path}")
-            result = self.process_file(file_path)
+        for source in sources:
+            if not source.exists():
+                raise FileNotFoundError(f"文件不存在: {source}")
+            
+            result = self._new_result(source)
             results.append(result)
+            metadata = result["metadata"]
+            
+            img_data = source.read_bytes()
+            with Image.open(io.BytesIO(img_data)) as img:
+                metadata["width"] = img.width
+                metadata["height"] = img.height
+                metadata["format"] = img.format
+            
+            quality = None
+            if self.quality_checker:
+                quality, _ = self._check_quality(img_data, source.name, metadata)
+                if quality and quality["skip"]:
+                    self._mark_skipped(result, ImageSkipped(quality))
+                    continue
+            
+            profile = self._choose_profile(img_data, source.name, quality, metadata)
+            
+            cache_key = None
+            if self.cache:
+                cache_key = VisionCache.make_key(img_data, self.model, self._cache_version(profile))
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"命中识别缓存: {source.name}")
+                    result["content"] = self._finish_content(cached, source.name, metadata)
+                    continue
+            
+            image_hash = None
+            if self.phash_index:
+                image_hash, match = self._lookup_similar(img_data, source.name, metadata,
+                                                         self._cache_version(profile))
+                if match:
+                    result["content"] = self._finish_content(match["content"], source.name, metadata)
+                    continue
+            
+            if self.ocr_tier:
+                text = self._recognize_with_ocr(img_data, source.name, metadata)
+                if text is not None:
+                    result["content"] = text
+                    continue
+            
+            if self.preprocessor:
+                img_data = self._preprocess_image(img_data, source.name, metadata)
+            pending.setdefault(profile, []).append((result, cache_key, image_hash, img_data))
+        
+        for profile, group in pending.items():
+            with self._request_slots:
+                if len(group) == 1:
+                    result, _, _, img_data = group[0]
+                    contents = [self._request_vision_model(img_data, result["file_name"], profile,
+                                                           partial_callback)]
+                else:
+                    contents = self._request_packed_vision_model(
+                        [(result["file_name"], img_data) for result, _, _, img_data in group], profile,
+                        partial_callback
+                    )
+            
+            for (result, cache_key, image_hash, _), content in zip(group, contents):
+                result["metadata"]["packed_with"] = len(group)
+                self._store_result(cache_key, image_hash, content, result["file_name"], self._cache_version(profile))
+                result["content"] = self._finish_content(content, result["file_name"], result["metadata"])
         
+        for result in results:
+            structured = self.collect_structured(result["metadata"])
+            if structured:
+                result["structured"] = structured
         return results
+    
+    def _process_file_safe(self, file_path: str,
+                           partial_callback: Optional[PartialCallback] = None) -> Dict[str, Any]:
+        """处理单个文件，异常记录到结果中而不是抛出"""
+        try:
+            return self.process_file(file_path, partial_callback=partial_callback)
+        except Exception as e:
+            logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            result = self._new_result(as_source(file_path))
+            result["error"] = str(e)
+            return result
+    
+    # ==================== 异步接口 ====================
+    
+    async def aprocess_files(self,
+                             file_paths: List[str],
+                             max_concurrency: Optional[int] = None,
+                             timeout: Optional[float] = None,
+                             progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None
+                             ) -> List[Dict[str, Any]]:
+        """
+        异步批量处理文件（所有视觉模型请求共用一个事件循环，不为每个请求占用线程）
+        
+        Args:
+            file_paths: 文件路径列表
+            max_concurrency: 同时在途的视觉模型请求上限（默认使用max_workers）
+            timeout: 单次视觉模型调用的超时时间（秒），None时使用 request_timeout
+            progress_callback: 每个文件完成时的回调 (已完成数, 总数, 结果)
+            
+        Returns:
+            处理结果列表（与输入顺序一致）
+            
+        Raises:
+            asyncio.CancelledError: 调用方取消时，所有未完成的请求随之取消
+        """
+        concurrency = max(1, max_concurrency or self.max_workers)
+        semaphore = asyncio.Semaphore(concurrency)
+        done = 0
+        
+        async def run(file_path: str) -> Dict[str, Any]:
+            nonlocal done
+            try:
+                result = await self._aprocess_file(as_source(file_path), timeout, semaphore, concurrency)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理文件失败 {file_path}: {str(e)}")
+                result = self._new_result(as_source(file_path))
+                result["error"] = str(e)
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(file_paths), result)
+            return result
+        
+        return list(await asyncio.gather(*(run(file_path) for file_path in file_paths)))
+    
+    async def aprocess_file(self, file_path: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        异步处理单个文件（PDF或图片）
+        
+        Args:
+            file_path: 文件路径
+            timeout: 单次视觉模型调用的超时时间（秒），None时使用 request_timeout
+            
+        Returns:
+            包含文件信息和提取内容的字典
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        return await self._aprocess_file(as_source(file_path), timeout, semaphore, self.max_workers)
+    
+    async def _aprocess_file(self, source: AttachmentSource, timeout: Optional[float],
+                             semaphore: asyncio.Semaphore, concurrency: int) -> Dict[str, Any]:
+        """异步处理单个文件"""
+        if not source.exists():
+            raise FileNotFoundError(f"文件不存在: {source}")
+        
+        file_ext = source.suffix
+        result = self._new_result(source)
+        
+        try:
+            if file_ext == self.supported_pdf_format:
+                await self._aprocess_pdf(source, result, timeout, semaphore, concurrency)
+            elif file_ext in self.supported_image_formats:
+                await self._aprocess_image(source, result, timeout, semaphore)
+            else:
+                logger.warning(f"不支持的文件格式: {file_ext}")
+                result["error"] = f"不支持的文件格式: {file_ext}"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"处理文件失败 {source}: {str(e)}")
+            result["error"] = str(e)
+        
+        structured = self.collect_structured(result["metadata"])
+        if structured:
+            result["structured"] = structured
+        return result
+    
+    async def _aprocess_image(self, source: AttachmentSource, result: Dict, timeout: Optional[float],
+                              semaphore: asyncio.Semaphore):
+        """异步处理图片文件"""
+        logger.info(f"处理图片文件: {source.name}")
+        
+        img_data = await asyncio.to_thread(source.read_bytes)
+        with Image.open(io.BytesIO(img_data)) as img:
+            result["metadata"]["width"] = img.width
+            result["metadata"]["height"] = img.height
+            result["metadata"]["format"] = img.format
+        
+        try:
+            result["content"] = await self._acall_vision_model(
+                img_data, source.name, result["metadata"], timeout, semaphore
+            )
+        except ImageSkipped as e:
+            self._mark_skipped(result, e)
+    
+    async def _aprocess_pdf(self, source: AttachmentSource, result: Dict, timeout: Optional[float],
+                            semaphore: asyncio.Semaphore, concurrency: int):
+        """异步处理PDF文件：concurrency 个页面任务依次取页渲染、预检和识别（同时驻留内存的页面不超过该数量）"""
+        logger.info(f"处理PDF文件: {source.name}")
+        
+        def sample_pages() -> Tuple[List[int], Dict[int, Dict[str, Any]]]:
+            with source.open_pdf() as doc:
+                return self._sample_pdf_pages(doc, result["metadata"])
+        
+        page_indices, page_skips = await asyncio.to_thread(sample_pages)
+        tracker = DuplicatePageTracker() if self.quality_checker else None
+        
+        async def handle(page_index: int) -> Dict[str, Any]:
+            _, img_data, scale = await self._arender_pdf_page(source, page_index)
+            page_name = f"{source.name} 第{page_index+1}页"
+            page = {
+                "page_number": page_index + 1,
+                "text": "",
+                "render_scale": scale,
+                "method": "vision_model"
+            }
+            if tracker is not None:
+                skip = await asyncio.to_thread(
+                    self.screen_pdf_page, img_data, page_index + 1, page_name, tracker, result["metadata"]
+                )
+                if skip:
+                    page.update(skip)
+                    return page
+            try:
+                page["text"] = await self._acall_vision_model(
+                    img_data, page_name, result["metadata"], timeout, semaphore, check_quality=False
+                )
+                logger.info(f"PDF第{page_index+1}页识别完成（渲染倍率 {scale}）")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                page["error"] = str(e)
+            return page
+        
+        pages = []
+        remaining = iter(page_indices)
+        
+        async def worker():
+            for page_index in remaining:
+                pages.append(await handle(page_index))
+        
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(page_indices)))))
+        pages += [{"page_number": index + 1, "text": "", "render_scale": 0.0, "method": "vision_model", **skip}
+                  for index, skip in page_skips.items()]
+        self._collect_pdf_pages(result, sorted(pages, key=lambda page: page["page_number"]))
+    
+    async def _arender_pdf_page(self, source: AttachmentSource, page_index: int) -> Tuple[int, bytes, float]:
+        """异步渲染PDF页面（本地文件优先使用渲染进程池）"""
+        if self.pdf_render_workers > 1 and source.path:
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._get_render_pool(), render_pdf_page, source.path, page_index, TARGET_LONG_EDGE
+                )
+            except (BrokenProcessPool, OSError) as e:
+                logger.warning(f"渲染进程池不可用，改为当前进程渲染: {e}")
+                self._shutdown_render_pool()
+        
+        def render() -> Tuple[int, bytes, float]:
+            with self._inprocess_render_lock, source.open_pdf() as doc:
+                img_data, scale = render_page(doc[page_index], TARGET_LONG_EDGE)
+            return page_index, img_data, scale
+        
+        return await asyncio.to_thread(render)
+    
+    async def _acall_vision_model(self, image_data: bytes, image_name: str,
+                                  metadata: Optional[Dict[str, Any]], timeout: Optional[float],
+                                  semaphore: asyncio.Semaphore, check_quality: bool = True) -> str:
+        """异步调用视觉大模型（缓存与预处理在线程中执行，请求本身为原生异步）"""
+        quality = None
+        if self.quality_checker and check_quality:
+            quality, _ = await asyncio.to_thread(self._check_quality, image_data, image_name, metadata)
+            if quality and quality["skip"]:
+                raise ImageSkipped(quality)
+        
+        profile = self._choose_profile(image_data, image_name, quality, metadata)
+        
+        cache_key = None
+        if self.cache:
+            cache_key = VisionCache.make_key(image_data, self.model, self._cache_version(profile))
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"命中识别缓存: {image_name}")
+                return self._finish_content(cached, image_name, metadata)
+        
+        image_hash = None
+        if self.phash_index:
+            image_hash, match = await asyncio.to_thread(self._lookup_similar, image_data, image_name, metadata,
+                                                        self._cache_version(profile))
+            if match:
+                return self._finish_content(match["content"], image_name, metadata)
+        
+        if self.ocr_tier:
+            text = await asyncio.to_thread(self._recognize_with_ocr, image_data, image_name, metadata)
+            if text is not None:
+                return text
+        
+        tiles = None
+        if self.tiler and profile != PROFILE_CLASSIFY:
+            tiles = await asyncio.to_thread(self._split_tiles, image_data, image_name)
+        
+        try:
+            if tiles:
+                content = await self._arecognize_tiles(tiles, image_name, metadata, timeout, semaphore)
+            else:
+                if self.preprocessor:
+                    image_data = await asyncio.to_thread(self._preprocess_image, image_data, image_name, metadata)
+                async with semaphore:
+                    logger.info(f"调用视觉模型识别: {image_name}（{profile}）")
+                    content = await self._acreate_completion(
+                        [self._image_part(image_data), {"type": "text", "text": self._profile_prompt(profile)}],
+                        image_name, timeout, MAX_TOKENS[profile]
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"视觉模型调用失败 ({image_name}): {e}")
+            raise
+        
+        await asyncio.to_thread(self._store_result, cache_key, image_hash, content, image_name,
+                                self._cache_version(profile))
+        return self._finish_content(content, image_name, metadata)
+    
+    async def _arecognize_tiles(self, tiles: List[bytes], image_name: str,
+                                metadata: Optional[Dict[str, Any]], timeout: Optional[float],
+                                semaphore: asyncio.Semaphore) -> str:
+        """异步并发识别长截图的各分块并合并"""
+        async def recognize(index: int) -> str:
+            label, content_parts = await asyncio.to_thread(self._tile_request, tiles, index, image_name, metadata)
+            async with semaphore:
+                logger.info(f"调用视觉模型识别: {label}")
+                return await self._acreate_completion(content_parts, label, timeout, TILE_MAX_TOKENS)
+        
+        texts = await asyncio.gather(*(recognize(i) for i in range(len(tiles))))
+        return self._merge_tiles(list(texts), metadata)
+    
+    async def _acreate_completion(self, content_parts: List[Dict[str, Any]], label: str,
+                                  timeout: Optional[float] = None,
+                                  max_tokens: int = MAX_TOKENS[PROFILE_FULL]) -> str:
+        """异步发送视觉模型请求并返回回答文本（经过容错层，每次尝试单独计算超时，None时使用 request_timeout）"""
+        if timeout is None:
+            timeout = self.request_timeout
+        return await self.resilience.acall(
+            lambda: asyncio.wait_for(
+                self._acomplete_once(content_parts, label, timeout, max_tokens, self.partial_callback), timeout
+            ),
+            label,
+            hedge_fn=lambda: asyncio.wait_for(self._acomplete_once(content_parts, label, timeout, max_tokens), timeout)
+        )
+    
+    async def _acomplete_once(self, content_parts: List[Dict[str, Any]], label: str,
+                              timeout: Optional[float],
+                              max_tokens: int = MAX_TOKENS[PROFILE_FULL],
+                              partial_callback: Optional[PartialCallback] = None) -> str:
+        """异步发送一次视觉模型请求（传入 partial_callback 时边接收边回调部分结果；对冲请求不传）"""
+        started = time.monotonic()
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": content_parts
+                }
+            ],
+            max_tokens=max_tokens,
+            timeout=timeout,
+            stream=self.stream
+        )
+        
+        if self.stream:
+            reporter = _PartialReporter(partial_callback, label, self.PARTIAL_INTERVAL, started)
+            # 超时取消、对冲或重试放弃本次尝试时同样关闭连接
+            try:
+                async for chunk in response:
+                    reporter.feed(chunk)
+            finally:
+                await response.close()
+            content = reporter.finish()
+        else:
+            content = response.choices[0].message.content.strip()
+        
+        logger.info(f"【调试】视觉模型识别结果 ({label}): {content[:200]}")
+        return content
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """获取异步客户端（与事件循环绑定，切换事件循环时重新创建）"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=self.client.api_key,
+                base_url=str(self.client.base_url),
+                max_retries=0
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+
+class _PartialReporter:
+    """累积流式回答片段，并按时间间隔节流地回调部分结果"""
+    
+    def __init__(self, callback: Optional[Callable[[str, str], None]], label: str,
+                 interval: float, started: float):
+        self.callback = callback
+        self.label = label
+        self.interval = interval
+        self.started = started
+        self.parts: List[str] = []
+        self.last_report = 0.0
+    
+    def feed(self, chunk):
+        """处理一个流式片段"""
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return
+        
+        now = time.monotonic()
+        if not self.parts:
+            logger.info(f"视觉模型首个输出 ({self.label})：{now - self.started:.2f}秒")
+        self.parts.append(delta)
+        
+        if self.callback and now - self.last_report >= self.interval:
+            self.last_report = now
+            try:
+                self.callback(self.label, "".join(self.parts))
+            except Exception as e:
+                logger.warning(f"部分结果回调失败: {e}")
+    
+    def finish(self) -> str:
+        """返回完整回答文本"""
+        return "".join(self.parts).strip()
@@ -0,0 +1,362 @@
+"""
+视觉模型调用的容错层
+对瞬时错误（超时、限流、连接中断、服务端5xx）做带抖动的指数退避重试，
+连续失败时熔断，可选在调用超过近期p95耗时后发出对冲请求，并统计每次调用的耗时分布
+"""
+import asyncio
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class VisionRequestError(RuntimeError):
+    """视觉模型调用失败（重试耗尽或不可重试的错误）"""
+
+
+class CircuitOpenError(VisionRequestError):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """判断是否为可重试的瞬时错误"""
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError, TimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class LatencyHistogram:
+    """调用耗时分布（固定分桶计数 + 最近样本窗口，用于计算分位数）"""
+
+    # 分桶上界（秒）
+    BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+    def __init__(self, window: int = 500):
+        """
+        Args:
+            window: 计算分位数使用的最近样本数
+        """
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """记录一次耗时"""
+        with self._lock:
+            self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+            self.max = max(self.max, seconds)
+            self.recent.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """最近样本的分位数（q取0-1），无样本时返回None"""
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def __len__(self) -> int:
+        return len(self.recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """耗时统计快照"""
+        with self._lock:
+            counts = list(self.counts)
+            total, total_sum, longest = self.total, self.sum, self.max
+
+        labels = [f"<={b}s" for b in self.BUCKETS] + [f">{self.BUCKETS[-1]}s"]
+        return {
+            'count': total,
+            'mean': round(total_sum / total, 3) if total else 0.0,
+            'p50': self._round(self.percentile(0.5)),
+            'p95': self._round(self.percentile(0.95)),
+            'p99': self._round(self.percentile(0.99)),
+            'max': round(longest, 3),
+            'buckets': {label: n for label, n in zip(labels, counts) if n},
+        }
+
+    @staticmethod
+    def _round(value: Optional[float]) -> Optional[float]:
+        return round(value, 3) if value is not None else None
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却期结束后放行一次试探调用"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断打开后的冷却时间（秒）
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """调用前检查，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(f"视觉模型服务熔断中，{remaining:.0f}秒后重试")
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("视觉模型服务熔断恢复中，等待试探调用结果")
+                self._probing = True
+
+    def record_success(self):
+        """记录成功调用"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("视觉模型服务恢复，熔断关闭")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """记录瞬时错误导致的失败"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"视觉模型连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """调用以非瞬时错误结束（不计入失败），释放试探名额"""
+        with self._lock:
+            self._probing = False
+
+
+class ResilientCaller:
+    """带重试、熔断、对冲请求和耗时统计的调用包装"""
+
+    # 对冲请求需要的最少历史样本数
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 hedge: bool = False,
+                 hedge_percentile: float = 0.95):
+        """
+        初始化
+
+        Args:
+            max_attempts: 每次调用的最大尝试次数（含首次）
+            base_delay: 退避基准时间（秒），第n次重试最多等待 base_delay * 2^(n-1)
+            max_delay: 单次退避的最长时间（秒）
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断冷却时间（秒）
+            hedge: 调用超过近期分位耗时后是否发出对冲请求（先返回的结果生效）
+            hedge_percentile: 触发对冲的耗时分位
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self.counters = {'calls': 0, 'retries': 0, 'failures': 0, 'hedged': 0, 'hedge_wins': 0}
+        self._lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+
+    def call(self, fn: Callable[[], Any], label: str = "",
+             hedge_fn: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        同步调用，瞬时错误按退避策略重试
+
+        Args:
+            fn: 调用
+            label: 调用名称（用于日志）
+            hedge_fn: 对冲请求使用的调用（默认与fn相同，如不回调部分结果的版本）
+
+        Raises:
+            CircuitOpenError: 熔断打开
+            VisionRequestError: 重试耗尽
+            Exception: 不可重试的错误原样抛出
+        """
+        self._count('calls')
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = self._call_hedged(fn, label, hedge_fn or fn)
+            except Exception as e:
+                delay = self._on_failure(e, attempt, label)
+                time.sleep(delay)
+                continue
+            self.latency.observe(time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], label: str = "",
+                    hedge_fn: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """异步调用，语义与 call 相同"""
+        self._count('calls')
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = await self._acall_hedged(fn, label, hedge_fn or fn)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                delay = self._on_failure(e, attempt, label)
+                await asyncio.sleep(delay)
+                continue
+            self.latency.observe(time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+
+    def _on_failure(self, error: Exception, attempt: int, label: str) -> float:
+        """处理一次失败：不可重试或重试耗尽时抛出，否则返回退避时间"""
+        if not is_transient_error(error):
+            self.breaker.release()
+            self._count('failures')
+            raise error
+
+        self.breaker.record_failure()
+        if attempt >= self.max_attempts:
+            self._count('failures')
+            raise VisionRequestError(f"重试{attempt}次后仍失败: {error}") from error
+
+        # 全抖动指数退避
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        self._count('retries')
+        logger.warning(f"视觉模型调用失败 ({label})，{delay:.1f}秒后第{attempt + 1}次尝试: {error}")
+        return delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        """触发对冲请求的等待时间，历史样本不足或未启用时返回None"""
+        if not self.hedge or len(self.latency) < self.HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _call_hedged(self, fn: Callable[[], Any], label: str, hedge_fn: Callable[[], Any]) -> Any:
+        """执行调用，超过对冲等待时间后并发发出第二个请求"""
+        delay = self._hedge_delay()
+        if delay is None:
+            return fn()
+
+        pool = self._get_hedge_pool()
+        primary = pool.submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count('hedged')
+        logger.info(f"视觉模型调用超过 {delay:.1f} 秒，发出对冲请求 ({label})")
+        backup = pool.submit(hedge_fn)
+        # 同步请求无法中途取消，落后的请求在后台自然结束
+        done, pending = wait([primary, backup], return_when=FIRST_COMPLETED)
+        first = done.pop()
+        if first.exception() is not None and pending:
+            first = pending.pop()
+            first.exception()  # 等待另一个请求完成
+        if first is backup and first.exception() is None:
+            self._count('hedge_wins')
+        return first.result()
+
+    async def _acall_hedged(self, fn: Callable[[], Awaitable[Any]], label: str,
+                            hedge_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """异步执行调用，超过对冲等待时间后并发发出第二个请求并取消落后的请求"""
+        delay = self._hedge_delay()
+        if delay is None:
+            return await fn()
+
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._count('hedged')
+            logger.info(f"视觉模型调用超过 {delay:.1f} 秒，发出对冲请求 ({label})")
+            backup = asyncio.ensure_future(hedge_fn())
+            tasks.add(backup)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count('hedge_wins')
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="vision-hedge")
+            return self._hedge_pool
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """调用统计：次数、重试、失败、对冲、熔断状态与耗时分布"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['breaker'] = self.breaker.state
+        stats['latency'] = self.latency.snapshot()
+        return stats
+
+
+# 进程内共享的调用包装（同一模型、同一参数共用熔断状态和耗时统计）
+_shared_callers: Dict[Tuple, ResilientCaller] = {}
+_shared_lock = threading.Lock()
+
+
+def get_resilient_caller(name: str, **settings) -> ResilientCaller:
+    """
+    获取进程内共享的调用包装（每个请求新建处理器时，熔断状态和耗时统计仍然延续）
+
+    Args:
+        name: 调用目标名称（如模型名）
+        **settings: ResilientCaller 的初始化参数
+    """
+    key = (name,) + tuple(sorted(settings.items()))
+    with _shared_lock:
+        if key not in _shared_callers:
+            _shared_callers[key] = ResilientCaller(**settings)
+        return _shared_callers[key]
@@ -0,0 +1,241 @@
+"""
+视觉识别结构化输出
+让视觉模型直接返回JSON对象（类型、摘要、号码、金额、日期、费用明细），校验后保存在识别结果中，
+下游提取器直接使用，不必再用正则反复扫描Markdown或再调用一次大模型转换为JSON。
+同时由JSON生成与原提示词相同格式的Markdown作为识别内容，保持结果结构不变
+"""
+import json
+from typing import Dict, Any, List, Optional
+
+from entity_scanner import PHONE_PATTERN
+from prompt_profiles import PROFILE_CLASSIFY, PROFILE_FULL, PROFILE_KEY_FIELDS
+
+# 内容类型
+CONTENT_TYPES = ('业务凭证', '账单明细', '记录查询', '沟通记录', '操作指引', '其他')
+
+# 布尔字段按字符串返回时视为真的取值
+TRUE_VALUES = ('true', '是', '1')
+
+# 号码角色
+PHONE_ROLES = ('业务号码', '联系号码', '疑似号码')
+
+# 费用明细的列（与原提示词中的月度费用表一致）
+FEE_COLUMNS = (
+    ('month', '月份'),
+    ('package_fee', '套餐费'),
+    ('other_fee', '其他费用'),
+    ('discount', '优惠减免'),
+    ('receivable', '应收'),
+    ('received', '实收'),
+)
+
+# 各字段的说明（按档位组合成提示词）
+_FIELD_SPECS = {
+    'type': '"type": 内容类型，取值之一：' + '、'.join(CONTENT_TYPES),
+    'is_operation_guide': '"is_operation_guide": APP截图、操作入口、知识库截图等与具体业务数据无关的图片为true，否则为false',
+    'summary': '"summary": 1-2句话概括图片的核心内容和意义（沟通记录请总结结论和用户态度）',
+    'text': '"text": 图片中识别到的主要文字内容',
+    'phones': '"phones": 手机号码列表，每项为 {"number": 独立的11位号码（不要从长数字串中截取）, '
+              '"role": 业务号码 / 联系号码 / 疑似号码}',
+    'packages': '"packages": 套餐名称、业务名称列表',
+    'amounts': '"amounts": 金额列表，每项为 {"value": "XX元", "item": 费用名称}',
+    'dates': '"dates": 关键日期列表，每项为 {"value": "YYYY-MM-DD", "item": 日期含义（办理/生效/到期等）}',
+    'fee_rows': '"fee_rows": 账单逐月费用明细，每项为 {' + ', '.join(
+        f'"{key}": {name}' for key, name in FEE_COLUMNS) + '}，不是账单时为空列表',
+}
+
+_PROFILE_FIELDS = {
+    PROFILE_FULL: ('type', 'is_operation_guide', 'summary', 'text', 'phones', 'packages', 'amounts', 'dates',
+                   'fee_rows'),
+    PROFILE_KEY_FIELDS: ('type', 'is_operation_guide', 'summary', 'phones', 'packages', 'amounts', 'dates'),
+    PROFILE_CLASSIFY: ('type', 'is_operation_guide', 'summary'),
+}
+
+STRUCTURED_PROMPT_TEMPLATE = """你是图片内容理解与信息提取专家。请分析这张图片，只输出一个JSON对象，不要输出其他说明或代码块标记。
+JSON包含以下字段（图片中没有的信息用空字符串或空列表）：
+{fields}"""
+
+
+def structured_prompt(profile: str = PROFILE_FULL) -> str:
+    """档位对应的结构化输出提示词"""
+    fields = _PROFILE_FIELDS.get(profile, _PROFILE_FIELDS[PROFILE_FULL])
+    return STRUCTURED_PROMPT_TEMPLATE.format(fields='\n'.join(f'- {_FIELD_SPECS[name]}' for name in fields))
+
+
+def parse_structured(text: str) -> Dict[str, Any]:
+    """
+    解析并校验视觉模型返回的JSON
+
+    Args:
+        text: 模型输出（允许包含```json代码块标记）
+
+    Returns:
+        规范化后的结构化结果（字段齐全，类型正确，无效的号码、空项被丢弃）
+
+    Raises:
+        ValueError: 输出不是JSON对象
+    """
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"结构化输出不是有效的JSON: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("结构化输出不是JSON对象")
+
+    content_type = _text(data.get('type')).strip('【】')
+    if content_type.startswith('操作指引'):
+        content_type = '操作指引'
+    if content_type not in CONTENT_TYPES:
+        content_type = '其他'
+
+    phones = []
+    seen = set()
+    for item in _list(data.get('phones')):
+        if isinstance(item, dict):
+            number, role = _text(item.get('number')), _text(item.get('role'))
+        else:
+            number, role = _text(item), ''
+        match = PHONE_PATTERN.search(number.replace(' ', '').replace('-', ''))
+        if not match or match.group(0) in seen:
+            continue
+        seen.add(match.group(0))
+        phones.append({'number': match.group(0), 'role': role if role in PHONE_ROLES else '疑似号码'})
+
+    fee_rows = []
+    for row in _list(data.get('fee_rows')):
+        if isinstance(row, dict):
+            fee_row = {key: _text(row.get(key)) for key, _ in FEE_COLUMNS}
+            if any(fee_row.values()):
+                fee_rows.append(fee_row)
+
+    return {
+        'type': content_type,
+        'is_operation_guide': _flag(data.get('is_operation_guide')) or content_type == '操作指引',
+        'summary': _text(data.get('summary')),
+        'text': _text(data.get('text')),
+        'phones': phones,
+        'packages': _unique(_text(item) for item in _list(data.get('packages'))),
+        'amounts': _labeled(data.get('amounts')),
+        'dates': _labeled(data.get('dates')),
+        'fee_rows': fee_rows,
+    }
+
+
+def render_markdown(data: Dict[str, Any]) -> str:
+    """由结构化结果生成与原提示词相同格式的识别内容"""
+    lines = ['【操作指引类-与具体业务数据无关】' if data['is_operation_guide'] else f"【{data['type']}】"]
+    if data['summary']:
+        lines.append(f"**内容摘要**：{data['summary']}")
+    if data['text']:
+        lines.append(f"**详细内容**：{data['text']}")
+
+    key_info = [f"{phone['number']}（{phone['role']}）" for phone in data['phones']]
+    key_info += data['packages']
+    key_info += [f"{item['value']}（{item['item']}）" if item['item'] else item['value'] for item in data['amounts']]
+    key_info += [f"{item['item']}：{item['value']}" if item['item'] else item['value'] for item in data['dates']]
+    if key_info:
+        lines.append(f"**关键信息**：{'；'.join(key_info)}")
+
+    if data['fee_rows']:
+        lines.append(render_fee_table(data['fee_rows']))
+    return '\n'.join(lines)
+
+
+def render_fee_table(fee_rows: List[Dict[str, str]]) -> str:
+    """费用明细的Markdown表格（与原提示词中的月度费用表格式相同）"""
+    lines = ['**费用明细**：',
+             '| ' + ' | '.join(name for _, name in FEE_COLUMNS) + ' |',
+             '|' + '------|' * len(FEE_COLUMNS)]
+    for row in fee_rows:
+        lines.append('| ' + ' | '.join(row.get(key, '') for key, _ in FEE_COLUMNS) + ' |')
+    return '\n'.join(lines)
+
+
+def merge_structured(items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    合并同一文件多个识别单元（如PDF各页）的结构化结果
+
+    Returns:
+        类型取出现最多的类型，摘要按顺序拼接，号码、套餐、金额、日期去重合并，费用明细按顺序拼接；
+        没有结构化结果时返回None
+    """
+    if not items:
+        return None
+    if len(items) == 1:
+        return items[0]
+
+    types = [item['type'] for item in items]
+    phones: Dict[str, Dict[str, str]] = {}
+    for item in items:
+        for phone in item['phones']:
+            # 同一号码在不同页角色不同时，以明确的角色为准
+            if phone['number'] not in phones or phones[phone['number']]['role'] == '疑似号码':
+                phones[phone['number']] = phone
+
+    return {
+        'type': max(types, key=types.count),
+        'is_operation_guide': all(item['is_operation_guide'] for item in items),
+        'summary': ' '.join(item['summary'] for item in items if item['summary']),
+        'text': '\n\n'.join(item['text'] for item in items if item['text']),
+        'phones': list(phones.values()),
+        'packages': _unique(package for item in items for package in item['packages']),
+        'amounts': _unique_dicts(amount for item in items for amount in item['amounts']),
+        'dates': _unique_dicts(date for item in items for date in item['dates']),
+        'fee_rows': [row for item in items for row in item['fee_rows']],
+    }
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return '、'.join(_text(item) for item in value if item)
+    return str(value).strip()
+
+
+def _flag(value: Any) -> bool:
+    """布尔字段：接受JSON布尔值，字符串只有 true/是/1 视为真（"false"、"否"、"0" 均为假）"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value == 1
+    return _text(value).lower() in TRUE_VALUES
+
+
+def _list(value: Any) -> List[Any]:
+    if value is None or value == '':
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _unique(values) -> List[str]:
+    result = []
+    for value in values:
+        if value and value not in result:
+            result.append(value)
+    return result
+
+
+def _labeled(value: Any) -> List[Dict[str, str]]:
+    """规范化 [{value, item}] 列表（也接受纯字符串项）"""
+    items = []
+    for entry in _list(value):
+        if isinstance(entry, dict):
+            item = {'value': _text(entry.get('value')), 'item': _text(entry.get('item'))}
+        else:
+            item = {'value': _text(entry), 'item': ''}
+        if item['value']:
+            items.append(item)
+    return _unique_dicts(items)
+
+
+def _unique_dicts(items) -> List[Dict[str, str]]:
+    result = []
+    for item in items:
+        if item not in result:
+            result.append(item)
+    return result
@@ -0,0 +1,5 @@
+"""测试公共配置：与 benchmarks 相同，直接从 src 目录导入模块"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
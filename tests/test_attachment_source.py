@@ -0,0 +1,27 @@
+"""附件暂存：未知或已释放的附件标识给出明确的错误"""
+import pytest
+
+pytest.importorskip('fitz')
+pytest.importorskip('PIL')
+
+from attachment_source import AttachmentNotFoundError, AttachmentSource, AttachmentStore
+
+
+def test_resolve_returns_stored_attachments_and_skips_missing_paths(tmp_path):
+    store = AttachmentStore()
+    token = store.add(AttachmentSource.from_bytes('a.png', b'data'))
+
+    sources = store.resolve([token, str(tmp_path / 'missing.png')])
+
+    assert [source.name for source in sources] == ['a.png']
+
+
+def test_resolve_unknown_token_raises():
+    store = AttachmentStore()
+    token = store.add(AttachmentSource.from_bytes('a.png', b'data'))
+    store.discard(token)
+
+    with pytest.raises(AttachmentNotFoundError, match='单进程'):
+        store.resolve([token])
+    with pytest.raises(AttachmentNotFoundError):
+        store.resolve(['mem://0123456789abcdef/b.png'])
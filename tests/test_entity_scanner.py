@@ -0,0 +1,71 @@
+"""关键信息扫描：手机号与金额的优先级、日期边界、扫描结果缓存"""
+import pytest
+
+from entity_scanner import ScanResult, clear_scan_cache, scan
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_scan_cache()
+    yield
+    clear_scan_cache()
+
+
+def entity_tuples(result: ScanResult):
+    return [(entity.kind, entity.text, entity.start, entity.end) for entity in result.entities]
+
+
+@pytest.mark.parametrize('text', [
+    '13812345678元',
+    '号码13812345678元',
+    '联系电话13812345678 元',
+])
+def test_standalone_mobile_number_is_not_an_amount(text):
+    result = scan(text)
+    assert result.phones == ['13812345678']
+    assert result.amounts == []
+
+
+def test_amount_next_to_mobile_number_is_still_found():
+    result = scan('办理号码13812345678，月费129.00元，实收¥258.00')
+    assert result.phones == ['13812345678']
+    assert result.amounts == ['129.00元', '¥258.00']
+
+
+def test_longer_digit_run_is_not_a_mobile_number():
+    result = scan('业务编号213812345678')
+    assert result.phones == []
+    assert result.long_numbers == ['213812345678']
+
+
+@pytest.mark.parametrize('text, dates', [
+    ('办理日期2024-03-15', ['2024-03-15']),
+    ('办理日期：2024年03月15日', ['2024年03月15日']),
+    ('2024.03.15', ['2024.03.15']),
+    ('编号12024-03-15', []),
+    ('流水号992024/03/15', []),
+])
+def test_date_requires_non_digit_before_it(text, dates):
+    assert scan(text).dates == dates
+
+
+def test_cached_scan_matches_uncached_scan():
+    text = ('办理号码：13812345678  联系电话：13987654321\n'
+            '套餐名称：5G畅享套餐129元档，月费129.00元\n'
+            '办理日期：2024年03月15日 10:30，业务编号 202403151234')
+    uncached = ScanResult(text)
+
+    first = scan(text)
+    second = scan(text)
+
+    assert second is first
+    for result in (first, second):
+        assert entity_tuples(result) == entity_tuples(uncached)
+        assert result.classify_phones() == uncached.classify_phones()
+        assert result.classify_phones() == (['13812345678'], ['13987654321'])
+
+
+def test_cache_is_keyed_by_text():
+    assert scan('号码13812345678').phones == ['13812345678']
+    assert scan('号码13987654321').phones == ['13987654321']
+    assert scan('').entities == ()
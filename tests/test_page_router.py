@@ -0,0 +1,103 @@
+"""PDF按页路由：合成的文字页/图片页混合PDF的路由决策和累加顺序"""
+import io
+import threading
+import time
+
+import pytest
+
+fitz = pytest.importorskip('fitz')
+Image = pytest.importorskip('PIL.Image')
+
+from page_router import ROUTE_TEXT, ROUTE_VISION, PDFPageRouter, route_page
+from pdf_text_extractor import PDFTextExtractor
+
+TEXT_LINES = {
+    1: '办理号码：13812345678，套餐名称：5G畅享套餐',
+    3: '办理日期：2024年03月15日，实收金额：258.00元',
+}
+VISION_TEXT = '联系电话：13987654321，受理渠道：营业厅，业务编号：A10023'
+
+
+class FakeVisionProcessor:
+    """只记录调用的视觉处理器：识别耗时较长，保证图片页在后面的文字页之后才识别完成"""
+
+    max_workers = 2
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def screen_pdf_page(self, image_data, page_number, image_name, tracker, metadata=None):
+        return None
+
+    def recognize_image(self, image_data, image_name, metadata=None, check_quality=True, partial_callback=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append(image_name)
+        if partial_callback:
+            partial_callback(image_name, VISION_TEXT[:10])
+        return VISION_TEXT
+
+    def collect_structured(self, metadata):
+        return None
+
+
+def image_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 560), (200, 220, 240)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def mixed_pdf(tmp_path):
+    """第1、3页为文字页，第2页为整页图片"""
+    doc = fitz.open()
+    for number in (1, 2, 3):
+        page = doc.new_page(width=400, height=560)
+        if number in TEXT_LINES:
+            page.insert_text((40, 80), TEXT_LINES[number], fontname='china-s', fontsize=10)
+        else:
+            page.insert_image(page.rect, stream=image_bytes())
+    path = tmp_path / 'mixed.pdf'
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_route_page_decisions(mixed_pdf):
+    with fitz.open(mixed_pdf) as doc:
+        routes = [route_page(page)['route'] for page in doc]
+    assert routes == [ROUTE_TEXT, ROUTE_VISION, ROUTE_TEXT]
+
+
+def test_extract_routes_each_page(mixed_pdf):
+    vision = FakeVisionProcessor()
+    partials = []
+    result = PDFPageRouter(vision_processor=vision).extract(
+        mixed_pdf, partial_callback=lambda label, text: partials.append(label))
+
+    assert result['status'] == 'success'
+    assert [route['route'] for route in result['metadata']['page_routes']] == [ROUTE_TEXT, ROUTE_VISION, ROUTE_TEXT]
+    assert [page['method'] for page in result['pages']] == ['direct_extraction', 'vision_model', 'direct_extraction']
+    assert vision.calls == ['mixed.pdf 第2页']
+    assert partials == ['mixed.pdf 第2页']
+
+
+def test_vision_pages_are_accumulated_in_page_order(mixed_pdf):
+    result = PDFPageRouter(vision_processor=FakeVisionProcessor()).extract(mixed_pdf)
+
+    content = result['content']
+    positions = [content.index(TEXT_LINES[1]), content.index(VISION_TEXT), content.index(TEXT_LINES[3])]
+    assert positions == sorted(positions)
+    assert result['key_info']['phone_numbers'] == ['13812345678', '13987654321']
+
+
+def test_low_memory_truncation_keeps_earlier_vision_page(mixed_pdf):
+    # 上限只够前两页：截断的应是第3页，而不是较晚识别完成的第2页
+    extractor = PDFTextExtractor(low_memory=True, max_filtered_chars=len(TEXT_LINES[1]) + len(VISION_TEXT) + 1)
+    result = PDFPageRouter(vision_processor=FakeVisionProcessor(), text_extractor=extractor).extract(mixed_pdf)
+
+    assert TEXT_LINES[1] in result['content']
+    assert VISION_TEXT in result['content']
+    assert TEXT_LINES[3] not in result['content']
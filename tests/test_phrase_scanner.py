@@ -0,0 +1,73 @@
+"""业务短语扫描：与原正则（findall）的结果一致，包括会让原正则反复回溯的输入"""
+import random
+import re
+
+import pytest
+
+from phrase_scanner import addresses, keyword_phrases, package_names
+
+# 原实现使用的正则
+LEGACY_BUSINESS_PATTERNS = [
+    r'[一-龥]*套餐[一-龥]*',
+    r'[一-龥]*资费[一-龥]*',
+    r'[一-龥]*业务[一-龥]*',
+]
+LEGACY_ADDRESS_PATTERN = r'[一-龥]{2,}省[一-龥]{2,}市[一-龥]{2,}[区县]?[一-龥]*'
+LEGACY_PACKAGE_PATTERN = r'[沃畅冰神]派?\d+元\d*套餐?|[沃畅冰神]派\w+套餐|\d+元套餐'
+
+BUSINESS_KEYWORDS = ('套餐', '资费', '业务')
+
+REPRESENTATIVE = [
+    '',
+    '客户于2024年3月15日办理沃派39元套餐，月费39元，另开通流量包业务。',
+    '套餐名称：畅爽冰激凌129元20GB套，资费标准见附件，神州行5元套餐已停用',
+    '沃派校园套餐与冰激凌套餐互斥；99元套餐、199元套餐可选',
+    '联系地址：广东省广州市天河区体育西路，邮寄地址：浙江省杭州市西湖区',
+    '省市区\n河北省石家庄市长安区\n省份省市市',
+    '沃派abc套餐def套餐 畅派_x套餐 冰派套餐',
+    '业务受理单 办理业务：套餐变更业务 资费：129元/月',
+]
+
+# 原正则在这些输入上为平方或立方时间，长度保持在原正则也能很快完成的范围
+ADVERSARIAL = {
+    'repeated_partial_keyword': '套' * 2000,
+    'long_run_before_keyword': '汉' * 2000 + '套餐',
+    'provinces_then_cities': '省' * 500 + '市' * 500,
+    'repeated_province': '广东省' * 200,
+    'brand_without_suffix': '沃派' + 'a' * 2000,
+    'repeated_brand': '沃派' * 1000 + '套餐',
+    'long_price': '1' * 2000 + '元',
+    'brand_with_long_number': '沃' + '1' * 2000,
+    'comma_separated_digits': '1,' * 1000,
+}
+
+
+def legacy_keyword_phrases(text):
+    return [match for pattern in LEGACY_BUSINESS_PATTERNS for match in re.findall(pattern, text) if len(match) > 2]
+
+
+def random_text(rng, length):
+    alphabet = '沃畅冰神派套餐资费业务省市区县汉字元0123456789abc_ ,\n'
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def check(text):
+    assert keyword_phrases(text, BUSINESS_KEYWORDS) == legacy_keyword_phrases(text)
+    assert addresses(text) == re.findall(LEGACY_ADDRESS_PATTERN, text)
+    assert package_names(text) == re.findall(LEGACY_PACKAGE_PATTERN, text)
+
+
+@pytest.mark.parametrize('text', REPRESENTATIVE)
+def test_matches_legacy_patterns_on_representative_text(text):
+    check(text)
+
+
+@pytest.mark.parametrize('name', sorted(ADVERSARIAL))
+def test_matches_legacy_patterns_on_adversarial_text(name):
+    check(ADVERSARIAL[name])
+
+
+def test_matches_legacy_patterns_on_random_text():
+    rng = random.Random(0)
+    for _ in range(500):
+        check(random_text(rng, rng.randint(0, 60)))
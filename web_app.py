@@ -16,9 +16,11 @@ from io import BytesIO
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from config import Config
+from attachment_source import AttachmentSource, AttachmentStore
 from logger import setup_logger
 from ocr_processor import OCRProcessor
 from vision_processor import VisionProcessor
+from page_router import PDFPageRouter, ROUTE_OCR
 from pdf_text_extractor import PDFTextExtractor
 from pdf_generator import MarkdownPDFGenerator
 from docx_parser import DocxParser
@@ -48,6 +50,10 @@ logger = logging.getLogger(__name__)
 # 加载配置
 config = Config()
 
+# 内存中暂存的上传附件（UPLOAD_IN_MEMORY=true 时使用）。附件只存在于本进程中，
+# 多工作进程部署时上传和审核可能落到不同进程，此时审核返回"附件已失效"，请关闭内存模式
+attachment_store = AttachmentStore(ttl_seconds=config.upload_memory_ttl)
+
 # 允许的文件扩展名
 ALLOWED_DOCX = {'docx', 'doc'}
 ALLOWED_ATTACHMENTS = {'pdf', 'png', 'jpg', 'jpeg', 'bmp', 'tiff', 'gif'}
@@ -58,6 +64,27 @@ def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 
+def create_page_router(vision_processor):
+    """创建PDF按页路由（数字页面直接提取文字，图片页交给视觉模型或本地OCR）"""
+    route_config = config.get_page_router_config()
+    ocr_processor = None
+    if route_config['image_route'] == ROUTE_OCR:
+        ocr_processor = OCRProcessor(tesseract_path=config.tesseract_path)
+    return PDFPageRouter(
+        vision_processor=vision_processor,
+        ocr_processor=ocr_processor,
+        text_extractor=PDFTextExtractor(**config.get_pdf_text_config()),
+        **route_config
+    )
+
+
+def release_attachments(attachment_paths):
+    """释放审核用过的内存暂存附件（上传目录中的文件不删除）"""
+    for att_path in attachment_paths:
+        if attachment_store.discard(att_path):
+            logger.info(f"已释放内存附件: {att_path}")
+
+
 def safe_filename(filename):
     """
     安全处理文件名，保留中文字符
@@ -150,13 +177,18 @@ def upload_files():
         docx_file.save(str(docx_path))
         logger.info(f"Word文档已保存: {docx_filename}")
         
-        # 保存附件（使用safe_filename保留中文）
+        # 保存附件（使用safe_filename保留中文）；内存模式下附件不写入上传目录，返回暂存标识
         attachment_files = request.files.getlist('attachments')
         attachment_paths = []
         
         for file in attachment_files:
             if file and file.filename and allowed_file(file.filename, ALLOWED_ATTACHMENTS):
                 filename = safe_filename(file.filename)
+                if config.upload_in_memory:
+                    source = AttachmentSource.from_stream(filename, file.stream, config.upload_spool_max_bytes)
+                    attachment_paths.append(attachment_store.add(source))
+                    logger.info(f"附件已读入内存: {filename}")
+                    continue
                 filepath = Path(app.config['UPLOAD_FOLDER']) / filename
                 file.save(str(filepath))
                 attachment_paths.append(str(filepath))
@@ -177,6 +209,7 @@ def upload_files():
 @app.route('/api/review', methods=['POST'])
 def review_document():
     """执行文档审核"""
+    attachment_paths = []
     try:
         data = request.json
         docx_path = data.get('docx_path')
@@ -189,19 +222,36 @@ def review_document():
         # 获取AI配置
         ai_config = config.get_ai_config()
         
-        # 1. 使用视觉大模型处理附件（跳过OCR）
+        # 1. 处理附件（PDF按页路由，图片使用视觉大模型）
         logger.info(f"[1/3] 视觉识别 {len(attachment_paths)} 个附件...")
         vision_processor = VisionProcessor(
             api_key=ai_config.get('api_key'),
-            model=ai_config.get('vl_model', 'qwen3-vl-plus')
+            model=ai_config.get('vl_model', 'qwen3-vl-plus'),
+            **config.get_vision_config()
         )
-        ocr_results = []
-        
-        for i, att_path in enumerate(attachment_paths):
-            if Path(att_path).exists():
-                result = vision_processor.process_file(att_path)
-                ocr_results.append(result)
-                yield f"data: {json.dumps({'type': 'progress', 'step': 'vision', 'current': i+1, 'total': len(attachment_paths), 'message': f'视觉识别: {Path(att_path).name}'}, ensure_ascii=False)}\n\n"
+        try:
+            page_router = create_page_router(vision_processor)
+            sources = attachment_store.resolve(attachment_paths)
+            ocr_results = [None] * len(sources)
+            pdf_indices = [i for i, source in enumerate(sources) if source.suffix == '.pdf']
+            image_indices = [i for i, source in enumerate(sources) if source.suffix != '.pdf']
+            done = 0
+        
+            # PDF按页路由：只有图片页调用视觉模型
+            for i in pdf_indices:
+                ocr_results[i] = page_router.extract(sources[i])
+                done += 1
+                file_name = sources[i].name
+                yield f"data: {json.dumps({'type': 'progress', 'step': 'vision', 'current': done, 'total': len(attachment_paths), 'message': f'PDF提取: {file_name}'}, ensure_ascii=False)}\n\n"
+        
+            # 图片并发识别，按完成顺序推送进度，结果按上传顺序保存
+            for j, result in vision_processor.iter_process_files([sources[i] for i in image_indices]):
+                ocr_results[image_indices[j]] = result
+                done += 1
+                file_name = result['file_name']
+                yield f"data: {json.dumps({'type': 'progress', 'step': 'vision', 'current': done, 'total': len(attachment_paths), 'message': f'视觉识别: {file_name}'}, ensure_ascii=False)}\n\n"
+        finally:
+            vision_processor.close()
         
         # 2. 解析Word文档
         logger.debug("解析Word文档...")
@@ -231,6 +281,8 @@ def review_document():
     except Exception as e:
         logger.error(f"审核失败: {str(e)}")
         yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    finally:
+        release_attachments(attachment_paths)
 
 
 @app.route('/api/review-stream', methods=['POST'])
@@ -257,28 +309,40 @@ def review_document_stream():
             
             vision_processor = VisionProcessor(
                 api_key=ai_config.get('api_key'),
-                model=ai_config.get('vl_model', 'qwen3-vl-plus')
+                model=ai_config.get('vl_model', 'qwen3-vl-plus'),
+                **config.get_vision_config()
             )
-            pdf_extractor = PDFTextExtractor()
-            ocr_results = []
+            try:
+                page_router = create_page_router(vision_processor)
             
-            for i, att_path in enumerate(attachment_paths):
-                if not Path(att_path).exists():
-                    continue
+                sources = attachment_store.resolve(attachment_paths)
+                ocr_results = [None] * len(sources)
+                image_count = sum(1 for source in sources if source.suffix != '.pdf')
                 
-                file_ext = Path(att_path).suffix.lower()
-                file_name = Path(att_path).name
-                current_step += 1
-                percent = int(10 + (current_step / total_steps) * 50)
-                
-                if file_ext == '.pdf':
-                    yield f"data: {json.dumps({'type': 'progress', 'step': 'attachment', 'current': i+1, 'total': len(attachment_paths), 'percent': percent, 'message': f'PDF文本提取: {file_name}'}, ensure_ascii=False)}\n\n"
-                    result = pdf_extractor.extract_from_pdf(att_path)
-                    ocr_results.append(result)
-                else:
-                    yield f"data: {json.dumps({'type': 'progress', 'step': 'attachment', 'current': i+1, 'total': len(attachment_paths), 'percent': percent, 'message': f'视觉识别: {file_name}'}, ensure_ascii=False)}\n\n"
-                    result = vision_processor.process_file(att_path)
-                    ocr_results.append(result)
+                # PDF按页路由：有文字层的页面直接提取（本地处理，速度快），图片页才调用视觉模型；
+                # 图片并发视觉识别。每完成一个推送一次进度，视觉识别中（含PDF图片页）推送部分结果
+                if image_count:
+                    yield f"data: {json.dumps({'type': 'progress', 'step': 'attachment', 'current': current_step, 'total': len(attachment_paths), 'percent': int(10 + (current_step / total_steps) * 50), 'message': f'视觉识别 {image_count} 张图片...'}, ensure_ascii=False)}\n\n"
+                for event in vision_processor.iter_process_events(sources, page_router=page_router):
+                    percent = int(10 + (current_step / total_steps) * 50)
+                    if event['type'] == 'partial':
+                        # 流式识别中的部分结果：只推送末尾一段，前端实时展示识别进度
+                        label = event['label']
+                        text = event['text']
+                        yield f"data: {json.dumps({'type': 'partial', 'step': 'attachment', 'file': label, 'chars': len(text), 'text': text[-200:], 'percent': percent, 'message': f'视觉识别中: {label}（已识别 {len(text)} 字）'}, ensure_ascii=False)}\n\n"
+                        continue
+                    source = sources[event['index']]
+                    ocr_results[event['index']] = event['result']
+                    current_step += 1
+                    percent = int(10 + (current_step / total_steps) * 50)
+                    message = f'PDF文本提取完成: {source.name}' if source.suffix == '.pdf' else f'视觉识别完成: {source.name}'
+                    yield f"data: {json.dumps({'type': 'progress', 'step': 'attachment', 'current': current_step, 'total': len(attachment_paths), 'percent': percent, 'message': message}, ensure_ascii=False)}\n\n"
+                if image_count and vision_processor.cache:
+                    logger.info(f"识别缓存统计: {vision_processor.cache_stats()}")
+                if image_count:
+                    logger.info(f"视觉模型调用统计: {vision_processor.request_stats()}")
+            finally:
+                vision_processor.close()
         
             # 2. 解析Word文档
             yield f"data: {json.dumps({'type': 'progress', 'step': 'parse', 'percent': 65, 'message': '解析Word文档...'}, ensure_ascii=False)}\n\n"
@@ -374,7 +438,9 @@ def review_document_stream():
                     Path(docx_path).unlink()
                     logger.info(f"已清理临时文件: {docx_path}")
                 for att_path in attachment_paths:
-                    if att_path and Path(att_path).exists():
+                    if attachment_store.discard(att_path):
+                        logger.info(f"已释放内存附件: {att_path}")
+                    elif att_path and Path(att_path).exists():
                         Path(att_path).unlink()
                         logger.info(f"已清理临时文件: {att_path}")
             except Exception as cleanup_error:
@@ -392,6 +458,7 @@ def review_document_stream():
 @app.route('/api/review-sync', methods=['POST'])
 def review_document_sync():
     """执行文档审核（同步版本，保留兼容）"""
+    attachment_paths = []
     try:
         data = request.json
         docx_path = data.get('docx_path')
@@ -404,31 +471,38 @@ def review_document_sync():
         # 获取AI配置
         ai_config = config.get_ai_config()
         
-        # 1. 处理附件（PDF用文本提取，图片用视觉识别）
+        # 1. 处理附件（PDF按页路由，图片用视觉识别）
         logger.info(f"[1/3] 处理 {len(attachment_paths)} 个附件...")
         vision_processor = VisionProcessor(
             api_key=ai_config.get('api_key'),
-            model=ai_config.get('vl_model', 'qwen3-vl-plus')
+            model=ai_config.get('vl_model', 'qwen3-vl-plus'),
+            **config.get_vision_config()
         )
-        pdf_extractor = PDFTextExtractor()
-        ocr_results = []
+        try:
+            page_router = create_page_router(vision_processor)
         
-        for att_path in attachment_paths:
-            if not Path(att_path).exists():
-                continue
-            
-            file_ext = Path(att_path).suffix.lower()
-            
-            if file_ext == '.pdf':
-                # PDF直接提取文本
-                logger.debug(f"PDF提取: {Path(att_path).name}")
-                result = pdf_extractor.extract_from_pdf(att_path)
-                ocr_results.append(result)
-            else:
-                # 图片使用视觉识别
-                logger.debug(f"视觉识别: {Path(att_path).name}")
-                result = vision_processor.process_file(att_path)
-                ocr_results.append(result)
+            sources = attachment_store.resolve(attachment_paths)
+            ocr_results = [None] * len(sources)
+            image_indices = []
+        
+            for i, source in enumerate(sources):
+                if source.suffix == '.pdf':
+                    # PDF按页路由提取
+                    logger.debug(f"PDF提取: {source.name}")
+                    ocr_results[i] = page_router.extract(source)
+                else:
+                    image_indices.append(i)
+        
+            # 图片使用视觉识别（并发）
+            image_results = vision_processor.process_files([sources[i] for i in image_indices])
+            for i, result in zip(image_indices, image_results):
+                ocr_results[i] = result
+            if image_indices and vision_processor.cache:
+                logger.info(f"识别缓存统计: {vision_processor.cache_stats()}")
+            if image_indices:
+                logger.info(f"视觉模型调用统计: {vision_processor.request_stats()}")
+        finally:
+            vision_processor.close()
         
         # 2. 解析Word文档
         logger.info("[2/3] 解析Word文档...")
@@ -524,6 +598,8 @@ def review_document_sync():
     except Exception as e:
         logger.error(f"审核失败: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
+    finally:
+        release_attachments(attachment_paths)
 
 
 @app.route('/api/download/<filename>')
@@ -591,6 +667,9 @@ def clear_files():
             if file.is_file():
                 file.unlink()
         
+        # 释放内存中暂存的附件
+        attachment_store.clear()
+        
         return jsonify({'success': True, 'message': '文件已清理'})
     
     except Exception as e: